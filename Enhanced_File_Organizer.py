@@ -4,7 +4,10 @@
 
 import tkinter as tk
 from tkinter import filedialog, ttk
-import os, shutil
+import os
+
+from file_organizer import (scan_folder, ScanFilter, OrganizeEngine, move_job, CategoryIndex,
+                            get_metrics, item_path, format_progress)
 
 # --------------------------
 # GUI Setup
@@ -37,55 +40,69 @@ TYPES = {
     "Audio": [".mp3", ".wav", ".aac"],
     "Code": [".py", ".md", ".html", ".js", ".css", ".java"]
 }
+# Frozen extension -> category lookup, rebuilt whenever TYPES changes
+category_index = CategoryIndex(TYPES)
+
+# Scan and moves run on a worker pool so the window never freezes
+engine = OrganizeEngine()
 
 # --------------------------
 # Organize Files Function
 # --------------------------
 def organize_files(event):
+    if engine.busy:
+        return
     folder = filedialog.askdirectory()
     if not folder:
         return
 
-    # Gather all files recursively
-    file_list = []
-    for root_dir, _, files in os.walk(folder):
-        for file in files:
-            file_list.append(os.path.join(root_dir, file))
-
-    total_files = len(file_list)
-    moved_count = 0
-
-    for idx, file_path in enumerate(file_list, 1):
-        ext = os.path.splitext(file_path)[1].lower()
-        moved = False
-
-        for category, extensions in TYPES.items():
-            if ext in extensions:
-                target_dir = os.path.join(folder, category)
-                os.makedirs(target_dir, exist_ok=True)
-
-                target_path = os.path.join(target_dir, os.path.basename(file_path))
-                # Avoid overwriting
-                if os.path.exists(target_path):
-                    base, extn = os.path.splitext(os.path.basename(file_path))
-                    i = 1
-                    while os.path.exists(os.path.join(target_dir, f"{base}_{i}{extn}")):
-                        i += 1
-                    target_path = os.path.join(target_dir, f"{base}_{i}{extn}")
-
-                try:
-                    shutil.move(file_path, target_path)
-                    moved_count += 1
-                    moved = True
-                except Exception as e:
-                    print(f"Error moving {file_path}: {e}")
-                break
-
-        # Update progress bar
-        progress_var.set((idx / total_files) * 100)
-        root.update_idletasks()
-
-    status_var.set(f"Moved {moved_count} files out of {total_files}")
+    index = category_index  # immutable, safe to share with the workers
+
+    def target_dir(rec):
+        category = index.classify(rec.name, rec.ext)
+        if category is None:
+            return None
+        return os.path.join(folder, category)
+
+    total_files = 0
+
+    def on_event(event):
+        nonlocal total_files
+        if event[0] == "scanned":
+            total_files = event[1]
+            status_var.set(f"Organizing {total_files} files...")
+        elif event[0] == "progress":
+            progress_var.set((event[1] / event[2]) * 100 if event[2] else 100)
+            status_var.set(format_progress(event[3]))
+        elif event[0] == "error":
+            get_metrics().error("move", event[2], item_path(event[1]))
+        elif event[0] == "done":
+            pause_btn.configure(text="Pause")
+            note = " (cancelled)" if event[2] else ""
+            status_var.set(f"Moved {len(event[1])} files out of {total_files}{note}")
+
+    progress_var.set(0)
+    status_var.set("Scanning...")
+    # Gather all files recursively on the worker thread, not the Tk thread
+    # Category folders from earlier runs are not walked again
+    scan_filter = ScanFilter(folder, TYPES, rules=("category",))
+    engine.start(lambda: scan_folder(folder, skip_dir=scan_filter.skip_dir, skip_file=scan_filter.skip_file),
+                 move_job(target_dir))
+    engine.poll(root, on_event)
+
+def toggle_pause(event=None):
+    if not engine.busy:
+        return
+    if engine.paused:
+        engine.resume()
+        pause_btn.configure(text="Pause")
+    else:
+        engine.pause()
+        pause_btn.configure(text="Resume")
+
+def cancel_job(event=None):
+    if engine.busy:
+        engine.cancel()
 
 # --------------------------
 # GUI Button
@@ -102,6 +119,24 @@ btn_widget = tk.Label(
 btn_widget.bind("<Button-1>", organize_files)
 btn_widget.pack()
 
+pause_btn = tk.Label(
+    frame, text="Pause",
+    font=("Arial", 12),
+    bg="#7F8C8D", fg="white",
+    relief="flat", padx=10, pady=5
+)
+pause_btn.bind("<Button-1>", toggle_pause)
+pause_btn.pack(side="left", padx=5, pady=10)
+
+cancel_btn = tk.Label(
+    frame, text="Cancel",
+    font=("Arial", 12),
+    bg="#E74C3C", fg="white",
+    relief="flat", padx=10, pady=5
+)
+cancel_btn.bind("<Button-1>", cancel_job)
+cancel_btn.pack(side="left", padx=5, pady=10)
+
 tk.Label(
     root, text="Sorts: Images, Docs, Videos, Audio, Code",
     bg="#000", fg="#555",
@@ -4,7 +4,11 @@
 
 import tkinter as tk
 from tkinter import filedialog, ttk, simpledialog, messagebox
-import os, shutil
+import os
+
+from file_organizer import (ScanStream, ScanFilter, move_back, OrganizeEngine, move_job, CategoryIndex,
+                            get_metrics, item_path, format_progress)
+from file_organizer.scanner import iter_dirs
 
 # --------------------------
 # GUI Setup
@@ -33,6 +37,8 @@ TYPES = {
     "Audio": [".mp3", ".wav", ".aac"],
     "Code": [".py", ".md", ".html", ".js", ".css", ".java"]
 }
+# Frozen extension -> category lookup, rebuilt whenever TYPES changes
+category_index = CategoryIndex(TYPES)
 
 # Undo history for multi-level undo
 undo_history = []
@@ -43,9 +49,19 @@ selected_folder = tk.StringVar(value="Drop folder here or click to select")
 # Files selected for moving
 file_selection = []
 
+# Background scan feeding the preview, while a folder is still being read
+preview_stream = None
+
+# Moves run on a worker pool so the window never freezes
+engine = OrganizeEngine()
+
 # --------------------------
 # Functions
 # --------------------------
+def rebuild_index():
+    global category_index
+    category_index = CategoryIndex(TYPES)
+
 def add_category():
     name = simpledialog.askstring("New Category", "Enter category name:")
     if not name: return
@@ -53,6 +69,7 @@ def add_category():
         messagebox.showinfo("Info", "Category already exists!")
         return
     TYPES[name] = []
+    rebuild_index()
     update_category_list()
     
 def add_extension():
@@ -65,6 +82,7 @@ def add_extension():
         messagebox.showinfo("Info", "Extension already exists!")
         return
     TYPES[cat_name].append(ext)
+    rebuild_index()
     update_category_list()
 
 def update_category_list():
@@ -79,17 +97,46 @@ def select_folder():
         preview_files(folder)
 
 def preview_files(folder):
-    global file_selection
-    file_selection = []
+    """Scan in the background; rows are added in batches from root.after."""
+    global file_selection, preview_stream
+    if preview_stream is not None:
+        preview_stream.cancel()
+    # Category folders from earlier runs are not listed again
+    scan_filter = ScanFilter(folder, TYPES, rules=("category",))
+    records = file_selection = []
     preview_listbox.delete(0, tk.END)
-    
-    for root_dir, _, files in os.walk(folder):
-        for file in files:
-            file_path = os.path.join(root_dir, file)
-            file_selection.append(file_path)
-            preview_listbox.insert(tk.END, file_path)
+    stream = preview_stream = ScanStream(
+        folder, source=lambda f: iter_dirs(f, skip_dir=scan_filter.skip_dir,
+                                           skip_file=scan_filter.skip_file)).start()
+
+    def on_batch(batch):
+        records.extend(batch)
+        # One Tk call per batch instead of one per file
+        preview_listbox.insert(tk.END, *[rec.path for rec in batch])
+
+    def on_done():
+        global preview_stream
+        preview_stream = None
+        if stream.error is not None:
+            get_metrics().error("scan", stream.error, folder)
+            status_var.set(f"Preview stopped: {stream.error}")
+
+    stream.poll(root, on_batch, on_done)
+
+def on_job_event(event, on_done):
+    if event[0] == "progress":
+        progress_var.set((event[1] / event[2]) * 100 if event[2] else 100)
+        status_var.set(format_progress(event[3]))
+    elif event[0] == "error":
+        get_metrics().error("move", event[2], item_path(event[1]))
+    elif event[0] == "done":
+        pause_btn.configure(text="Pause")
+        on_done(event[1], event[2])
 
 def organize_files():
+    if engine.busy:
+        messagebox.showinfo("Info", "A job is already running!")
+        return
     folder = selected_folder.get()
     if not folder or not os.path.exists(folder):
         messagebox.showwarning("Warning", "Please select a valid folder first!")
@@ -101,54 +148,59 @@ def organize_files():
         return
 
     total_files = len(selected_files)
-    moved_count = 0
-    moved_files = {}
-
-    for idx, file_path in enumerate(selected_files, 1):
-        ext = os.path.splitext(file_path)[1].lower()
-        for category, extensions in TYPES.items():
-            if ext in extensions:
-                target_dir = os.path.join(folder, category)
-                os.makedirs(target_dir, exist_ok=True)
-
-                target_path = os.path.join(target_dir, os.path.basename(file_path))
-                if os.path.exists(target_path):
-                    base, extn = os.path.splitext(os.path.basename(file_path))
-                    i = 1
-                    while os.path.exists(os.path.join(target_dir, f"{base}_{i}{extn}")):
-                        i += 1
-                    target_path = os.path.join(target_dir, f"{base}_{i}{extn}")
-
-                try:
-                    shutil.move(file_path, target_path)
-                    moved_files[file_path] = target_path
-                    moved_count += 1
-                except Exception as e:
-                    print(f"Error moving {file_path}: {e}")
-                break
-
-        progress_var.set((idx / total_files) * 100)
-        root.update_idletasks()
-
-    if moved_files:
-        undo_history.append(moved_files)
-    status_var.set(f"Moved {moved_count} files out of {total_files}")
-    preview_files(folder)  # refresh preview after moving
+    index = category_index  # immutable, safe to share with the workers
+
+    def target_dir(rec):
+        category = index.classify(rec.name, rec.ext)
+        if category is None:
+            return None
+        return os.path.join(folder, category)
+
+    def done(moved_files, cancelled):
+        if moved_files:
+            undo_history.append(moved_files)
+        note = " (cancelled)" if cancelled else ""
+        status_var.set(f"Moved {len(moved_files)} files out of {total_files}{note}")
+        preview_files(folder)  # refresh preview after moving
+
+    progress_var.set(0)
+    engine.start(selected_files, move_job(target_dir))
+    engine.poll(root, lambda event: on_job_event(event, done))
 
 def undo_move():
+    if engine.busy:
+        messagebox.showinfo("Undo", "Wait for the running job to finish!")
+        return
     if not undo_history:
         messagebox.showinfo("Undo", "Nothing to undo!")
         return
     last_move = undo_history.pop()
-    for orig, dest in last_move.items():
-        if os.path.exists(dest):
-            os.makedirs(os.path.dirname(orig), exist_ok=True)
-            try:
-                shutil.move(dest, orig)
-            except Exception as e:
-                print(f"Undo error: {e}")
-    status_var.set("Undo completed!")
-    preview_files(selected_folder.get())
+
+    def done(restored, cancelled):
+        if cancelled:
+            remaining = {o: d for o, d in last_move.items() if d not in restored}
+            if remaining:
+                undo_history.append(remaining)
+        status_var.set("Undo cancelled!" if cancelled else "Undo completed!")
+        preview_files(selected_folder.get())
+
+    progress_var.set(0)
+    engine.start(list(last_move.items()), lambda pair: move_back(pair[1], pair[0]))
+    engine.poll(root, lambda event: on_job_event(event, done))
+
+def toggle_pause():
+    if not engine.busy:
+        return
+    if engine.paused:
+        engine.resume()
+        pause_btn.configure(text="Pause")
+    else:
+        engine.pause()
+        pause_btn.configure(text="Resume")
+
+def cancel_job():
+    if engine.busy:
+        engine.cancel()
 
 # Drag-and-drop folder
 def drop_folder(event):
@@ -191,6 +243,9 @@ btn_frame.pack(pady=5)
 tk.Button(btn_frame, text="Add Category", command=add_category, bg="#F39c12", fg="white").grid(row=0, column=0, padx=5)
 tk.Button(btn_frame, text="Add Extension", command=add_extension, bg="#F39c12", fg="white").grid(row=0, column=1, padx=5)
 tk.Button(btn_frame, text="Undo Last Move", command=undo_move, bg="#E74C3C", fg="white").grid(row=0, column=2, padx=5)
+pause_btn = tk.Button(btn_frame, text="Pause", command=toggle_pause, bg="#7F8C8D", fg="white")
+pause_btn.grid(row=0, column=3, padx=5)
+tk.Button(btn_frame, text="Cancel", command=cancel_job, bg="#E74C3C", fg="white").grid(row=0, column=4, padx=5)
 
 # File preview and selective move
 tk.Label(root, text="File Preview & Select for Move:", bg="#111", fg="#0ff").pack(pady=5)
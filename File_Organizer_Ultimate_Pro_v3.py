@@ -4,40 +4,93 @@
 
 import tkinter as tk
 from tkinter import filedialog, ttk, simpledialog, messagebox
-import os, shutil
+import os
+import sys
 import datetime
+import queue
+import time
+
+from file_organizer import (ScanStream, OrganizeEngine, CategoryIndex, Journal, UndoLog, FileIndex,
+                            HashCache, DUPLICATE_POLICIES, ShardLayout, SHARD_MODES, target_dir_for,
+                            build_plan, prepare_plan, execute_job, watch_folder, ScanFilter,
+                            Metrics, set_metrics, get_metrics, item_path, FileTable, TableView,
+                            format_progress, RuleError, SniffCache, with_content_types,
+                            plan_roots, check_roots, PackLayout)
+from file_organizer.virtual_list import VirtualList
 
 # --------------------------
 # Config & Globals
 # --------------------------
-root = tk.Tk()
-root.title("File Organizer Ultimate Pro v3")
-root.geometry("800x700")
-
-# Default theme: dark
-THEMES = {"Dark": {"bg": "#111", "fg": "#0ff", "entry_bg": "#333"},
-          "Light": {"bg": "#eee", "fg": "#111", "entry_bg": "#fff"}}
-current_theme = "Dark"
-
-root.configure(bg=THEMES[current_theme]["bg"])
-
-status_var = tk.StringVar(value="Ready to Organize")
-progress_var = tk.DoubleVar(value=0)
-
-TYPES = {
-    "Images": [".jpg", ".jpeg", ".png", ".gif", ".tiff", ".bmp"],
-    "Docs": [".pdf", ".docx", ".txt", ".pages", ".xlsx", ".pptx"],
-    "Videos": [".mp4", ".mov", ".avi", ".flv", ".mkv"],
-    "Audio": [".mp3", ".wav", ".aac"],
-    "Code": [".py", ".md", ".html", ".js", ".css", ".java"]
-}
-
-undo_history = []
-selected_folder = tk.StringVar(value="Drop folder here or click to select")
-file_selection = []
-
-# Log file path
-LOG_FILE = "file_organizer_log.txt"
+# The window and its state are only set up when the script is run: worker
+# processes of the coordinator import it again and need only the package
+if __name__ == "__main__":
+    root = tk.Tk()
+    root.title("File Organizer Ultimate Pro v3")
+    root.geometry("800x700")
+
+    # Default theme: dark
+    THEMES = {"Dark": {"bg": "#111", "fg": "#0ff", "entry_bg": "#333"},
+              "Light": {"bg": "#eee", "fg": "#111", "entry_bg": "#fff"}}
+    current_theme = "Dark"
+
+    root.configure(bg=THEMES[current_theme]["bg"])
+
+    status_var = tk.StringVar(value="Ready to Organize")
+    progress_var = tk.DoubleVar(value=0)
+
+    TYPES = {
+        "Images": [".jpg", ".jpeg", ".png", ".gif", ".tiff", ".bmp"],
+        "Docs": [".pdf", ".docx", ".txt", ".pages", ".xlsx", ".pptx"],
+        "Videos": [".mp4", ".mov", ".avi", ".flv", ".mkv"],
+        "Audio": [".mp3", ".wav", ".aac"],
+        "Code": [".py", ".md", ".html", ".js", ".css", ".java"]
+    }
+    # Frozen extension -> category lookup, rebuilt whenever TYPES changes
+    category_index = CategoryIndex(TYPES)
+
+    # Globs (or "re:" regexes) of files and folders never scanned, e.g. "*.part"
+    EXCLUDE_PATTERNS = []
+
+    selected_folder = tk.StringVar(value="Drop folder here or click to select")
+    scanned_records = FileTable(category_index)  # every file from the last scan, as columns
+    file_selection = TableView(scanned_records)  # rows currently shown in the preview
+    preview_filter = {}    # FileTable.select filters applied as rows stream in
+    scan_stream = None     # ScanStream while a folder is still being read
+
+    # Log file path
+    LOG_FILE = "file_organizer_log.txt"
+    # One long-lived, batched writer instead of an open/append per move
+    journal = Journal(LOG_FILE)
+
+    # Undo batches live on disk so a crashed run can still be rolled back
+    UNDO_DIR = "file_organizer_undo"
+    undo_log = UndoLog(UNDO_DIR)
+
+    # Folders seen before are re-listed only where a directory changed
+    INDEX_FILE = "file_organizer_index.sqlite3"
+    file_index = FileIndex(INDEX_FILE, category_index)
+
+    # Content hashes of files checked for duplicates, keyed by inode and mtime
+    HASH_FILE = "file_organizer_hashes.sqlite3"
+    hash_cache = HashCache(HASH_FILE)
+    duplicates_var = tk.StringVar(value="rename")
+    # File types recognised by their first bytes, for files without a known extension
+    sniff_cache = SniffCache(HASH_FILE)
+    sniff_var = tk.BooleanVar(value=False)
+    # Fan huge target folders out into sub folders ("none", "hash" or "date")
+    shard_var = tk.StringVar(value="none")
+    # Append small files to a packed.tar in their target folder instead of moving each one
+    pack_var = tk.BooleanVar(value=False)
+
+    # Watch mode: new files are organized as they arrive (Linux only)
+    watcher = None
+    watch_results = queue.Queue()
+
+    # Moves run on a worker pool; the GUI only polls for progress
+    engine = OrganizeEngine()
+
+    # Metrics of the last organize/undo run, for Prometheus' textfile collector
+    METRICS_FILE = "file_organizer_metrics.prom"
 
 # --------------------------
 # Utility Functions
@@ -55,12 +108,19 @@ def toggle_theme():
     current_theme = "Light" if current_theme == "Dark" else "Dark"
     apply_theme()
 
+def rebuild_index():
+    global category_index
+    category_index = CategoryIndex(TYPES)
+    file_index.category_index = category_index
+    scanned_records.reclassify(category_index)
+
 def add_category():
     name = simpledialog.askstring("New Category", "Enter category name:")
     if not name or name in TYPES:
         messagebox.showinfo("Info", "Category already exists or invalid!")
         return
     TYPES[name] = []
+    rebuild_index()
     update_category_list()
 
 def add_extension():
@@ -70,8 +130,17 @@ def add_extension():
     ext = simpledialog.askstring("New Extension", f"Enter extension for {cat_name} (with dot):")
     if not ext or not ext.startswith(".") or ext in TYPES[cat_name]: return
     TYPES[cat_name].append(ext)
+    rebuild_index()
     update_category_list()
 
+def add_exclude():
+    pattern = simpledialog.askstring("Exclude", "Files/folders to skip (glob, or re:regex):")
+    if not pattern or pattern in EXCLUDE_PATTERNS: return
+    EXCLUDE_PATTERNS.append(pattern)
+    folder = selected_folder.get()
+    if os.path.isdir(folder):
+        preview_files(folder)
+
 def update_category_list():
     category_listbox.delete(0, tk.END)
     for cat, exts in TYPES.items():
@@ -83,150 +152,396 @@ def select_folder():
         selected_folder.set(folder)
         preview_files(folder)
 
+def record_filter(filter_type=None, date_from=None, date_to=None):
+    """Preview filters as keyword arguments for ``FileTable.select``."""
+    return {"exts": filter_type, "date_from": date_from, "date_to": date_to}
+
 def preview_files(folder, filter_type=None, date_from=None, date_to=None):
+    """Stream the scan into the preview as directories are read."""
+    global scanned_records, file_selection, preview_filter, scan_stream
+    if scan_stream is not None:
+        scan_stream.cancel()
+    preview_filter = record_filter(filter_type, date_from, date_to)
+    scanned_records = FileTable(category_index)
+    file_selection = TableView(scanned_records)
+    preview_listbox.set_items(file_selection)
+    progress_var.set(0)
+    # Folders earlier runs sorted into are not walked again
+    scan_filter = ScanFilter(folder, TYPES, EXCLUDE_PATTERNS)
+    if filter_type or date_from or date_to:
+        # Refresh the index, then let SQLite answer the filters
+        def source(folder):
+            file_index.refresh(folder, skip_dir=scan_filter.skip_dir, skip_file=scan_filter.skip_file)
+            return file_index.query(folder, filter_type, date_from, date_to, scan_filter=scan_filter)
+    else:
+        def source(folder):
+            return file_index.iter_dirs(folder, skip_dir=scan_filter.skip_dir,
+                                        skip_file=scan_filter.skip_file)
+    stream = scan_stream = ScanStream(folder, source=source).start()
+
+    def on_batch(batch):
+        added = scanned_records.extend(batch)
+        file_selection.extend(scanned_records.select(rows=added, **preview_filter))
+        preview_listbox.items_added()
+        # Discovered (walked) vs processed (listed in the preview)
+        status_var.set(f"Scanning... {stream.discovered} found, {len(scanned_records)} listed")
+        progress_var.set(len(scanned_records) / stream.discovered * 100)
+
+    def on_done():
+        global scan_stream
+        scan_stream = None
+        progress_var.set(100)
+        if stream.error is not None:
+            get_metrics().error("scan", stream.error, folder)
+            status_var.set(f"Scan stopped: {stream.error} ({len(scanned_records)} files listed)")
+            return
+        status_var.set(f"Found {len(scanned_records)} files in {stream.dirs} folders")
+
+    stream.poll(root, on_batch, on_done)
+
+def format_row(rec):
+    # Called only for the rows currently on screen
+    mod_time = datetime.datetime.fromtimestamp(rec.mtime)
+    return f"{rec.path} | {mod_time.strftime('%Y-%m-%d %H:%M')}"
+
+def show_records():
     global file_selection
-    file_selection = []
-    preview_listbox.delete(0, tk.END)
-    
-    for root_dir, _, files in os.walk(folder):
-        for file in files:
-            file_path = os.path.join(root_dir, file)
-            ext = os.path.splitext(file)[1].lower()
-            mod_time = datetime.datetime.fromtimestamp(os.path.getmtime(file_path))
-            
-            # Filter by type/extension
-            if filter_type and ext not in filter_type: 
-                continue
-            # Filter by date range
-            if date_from and mod_time < date_from:
-                continue
-            if date_to and mod_time > date_to:
-                continue
-            
-            file_selection.append(file_path)
-            preview_listbox.insert(tk.END, f"{file_path} | {mod_time.strftime('%Y-%m-%d %H:%M')}")
+    file_selection = TableView(scanned_records, scanned_records.select(**preview_filter))
+    preview_listbox.set_items(file_selection)
+
+def relocate_records(moves, actions=None):
+    """Point scanned records at their new paths instead of re-scanning."""
+    scanned_records.relocate(moves, actions)
+    show_records()
+
+def note_actions(moved, actions):
+    """Remember the files linked, deleted or packed instead of moved."""
+    for src, _, action in moved if isinstance(moved, list) else (moved,):
+        if action != "move":
+            actions[src] = action
+
+def new_run_metrics():
+    """Fresh metrics for a job; call before building its work function."""
+    metrics = Metrics(sys.stderr)
+    set_metrics(metrics)
+    return metrics
+
+def start_job(items, work, on_done, op="move"):
+    """Run a move job on the engine and report back through root.after.
+
+    ``on_done(results, cancelled, failed)`` gets the items that raised.
+    """
+    progress_var.set(0)
+    metrics = get_metrics()
+    engine.start(items, work)
+    failed = []
+
+    def on_event(event):
+        kind = event[0]
+        if kind == "progress":
+            # Throttled by the engine: a few updates a second, not one per file
+            progress_var.set((event[1] / event[2]) * 100 if event[2] else 100)
+            status_var.set(format_progress(event[3]))
+        elif kind == "error":
+            failed.append(event[1])
+            metrics.error(op, event[2], item_path(event[1]))
+        elif kind == "done":
+            journal.flush()
+            pause_btn.configure(text="Pause")
+            on_done(event[1], event[2], failed)
+            # The full report is in METRICS_FILE; the status line gets the gist
+            metrics.write_prometheus(METRICS_FILE)
+            note = f", {len(failed)} failed" if failed else ""
+            status_var.set(f"{status_var.get()} ({time.time() - metrics.started:.1f}s{note})")
+
+    engine.poll(root, on_event)
 
 def organize_files(rule="category"):
+    if engine.busy:
+        messagebox.showinfo("Info", "A job is already running!")
+        return
     folder = selected_folder.get()
     if not folder or not os.path.exists(folder):
         messagebox.showwarning("Warning", "Please select a valid folder first!")
         return
+    if scan_stream is not None:
+        messagebox.showinfo("Info", "Still scanning the folder, please wait!")
+        return
+    folder = os.path.abspath(folder)  # scan records carry absolute paths
 
-    selected_files = [file_selection[i] for i in preview_listbox.curselection()]
-    if not selected_files:
+    selected_records = preview_listbox.selected_items()
+    if not selected_records:
         messagebox.showinfo("Info", "No files selected for organizing!")
         return
 
-    total_files = len(selected_files)
-    moved_count = 0
-    moved_files = {}
-
-    for idx, file_path in enumerate(selected_files, 1):
-        ext = os.path.splitext(file_path)[1].lower()
-        target_dir = folder
-
-        # Determine folder based on rule
-        if rule == "category":
-            for category, extensions in TYPES.items():
-                if ext in extensions:
-                    target_dir = os.path.join(folder, category)
-                    break
-        elif rule == "date":
-            date_folder = datetime.datetime.fromtimestamp(os.path.getmtime(file_path)).strftime("%Y-%m-%d")
-            target_dir = os.path.join(folder, date_folder)
-        elif rule == "size":
-            size = os.path.getsize(file_path)
-            if size < 1024*1024:
-                size_folder = "Small (<1MB)"
-            elif size < 10*1024*1024:
-                size_folder = "Medium (1-10MB)"
-            else:
-                size_folder = "Large (>10MB)"
-            target_dir = os.path.join(folder, size_folder)
-
-        os.makedirs(target_dir, exist_ok=True)
-        target_path = os.path.join(target_dir, os.path.basename(file_path))
-
-        if os.path.exists(target_path):
-            base, extn = os.path.splitext(os.path.basename(file_path))
-            i = 1
-            while os.path.exists(os.path.join(target_dir, f"{base}_{i}{extn}")):
-                i += 1
-            target_path = os.path.join(target_dir, f"{base}_{i}{extn}")
-
-        try:
-            shutil.move(file_path, target_path)
-            moved_files[file_path] = target_path
-            moved_count += 1
-            # Log move
-            with open(LOG_FILE, "a") as f:
-                f.write(f"{datetime.datetime.now()} | {file_path} -> {target_path}\n")
-        except Exception as e:
-            print(f"Error moving {file_path}: {e}")
-
-        progress_var.set((idx / total_files) * 100)
-        root.update_idletasks()
-
-    if moved_files:
-        undo_history.append(moved_files)
-    status_var.set(f"Moved {moved_count} files using '{rule}' rule")
-    preview_files(folder)
+    # The index is immutable, so edits made while the job runs cannot race the workers
+    layout = ShardLayout(shard_var.get()) if shard_var.get() != "none" else None
+    target_dir = target_dir_for(folder, rule, category_index, layout is not None and layout.nested_dates)
+    duplicates = duplicates_var.get()
+    sniff = sniff_var.get()
+    pack = PackLayout() if pack_var.get() else None
+    new_run_metrics()
+    batch = undo_log.begin(root=folder, rule=rule)
+    execute = execute_job(batch)
+
+    def plan():
+        # Phase 1 on the worker thread: decide every destination, create folders once
+        targets = target_dir
+        if sniff:
+            targets = with_content_types(target_dir, selected_records, category_index, engine.jobs, sniff_cache)
+        return prepare_plan(build_plan(selected_records, targets, rule, folder,
+                                       duplicates, engine.jobs, hash_cache, layout, pack))
+
+    actions = {}
+
+    def work(move):
+        moved = execute(move)
+        journal.record_result(moved)
+        note_actions(moved, actions)
+        return moved
+
+    def done(moved_files, cancelled, failed):
+        if moved_files:
+            batch.commit()
+        else:
+            batch.discard()
+        note = " (cancelled)" if cancelled else ""
+        status_var.set(f"Moved {len(moved_files)} files using '{rule}' rule{note}")
+        relocate_records(moved_files, actions)
+
+    status_var.set(f"Organizing {len(selected_records)} files by {rule}...")
+    start_job(plan, work, done)
+
+def organize_by_rule_spec():
+    spec = simpledialog.askstring(
+        "Custom Rules", "Folder template, e.g. category/{year}/{size_bucket}\n"
+                        "or with conditions: ext:.jpg size>10MB => Photos/{year}; category")
+    if not spec: return
+    try:
+        target_dir_for(selected_folder.get(), spec, category_index)
+    except RuleError as e:
+        messagebox.showerror("Custom Rules", str(e))
+        return
+    organize_files(spec)
+
+def organize_many_folders():
+    """Organize several folders by category as one job and one undo batch."""
+    if engine.busy:
+        messagebox.showinfo("Info", "A job is already running!")
+        return
+    roots = []
+    while True:
+        folder = filedialog.askdirectory(title=f"Folder {len(roots) + 1} (Cancel when done)")
+        if not folder: break
+        roots.append(folder)
+    if not roots: return
+    try:
+        roots = check_roots(roots)
+    except ValueError as e:
+        messagebox.showerror("Several Folders", str(e))
+        return
+
+    # Snapshot the categories: scans run in worker processes while the window stays editable
+    types = {cat: list(exts) for cat, exts in TYPES.items()}
+    layout = ShardLayout(shard_var.get()) if shard_var.get() != "none" else None
+    duplicates = duplicates_var.get()
+    sniff = sniff_var.get()
+    pack = PackLayout() if pack_var.get() else None
+    exclude = list(EXCLUDE_PATTERNS)
+    new_run_metrics()
+    batch = undo_log.begin(root=roots, rule="category")
+    execute = execute_job(batch)
+
+    def plan():
+        # One huge folder is split by its top-level sub folders instead
+        return prepare_plan(plan_roots(roots, "category", types, split=len(roots) == 1,
+                                       duplicates=duplicates, jobs=engine.jobs, hash_cache=hash_cache,
+                                       layout=layout, exclude=exclude, sniff=sniff,
+                                       sniff_cache=sniff_cache, pack=pack))
+
+    actions = {}
+
+    def work(move):
+        moved = execute(move)
+        journal.record_result(moved)
+        note_actions(moved, actions)
+        return moved
+
+    def done(moved_files, cancelled, failed):
+        if moved_files:
+            batch.commit()
+        else:
+            batch.discard()
+        note = " (cancelled)" if cancelled else ""
+        status_var.set(f"Moved {len(moved_files)} files from {len(roots)} folders by category{note}")
+        relocate_records(moved_files, actions)
+
+    status_var.set(f"Scanning {len(roots)} folders...")
+    start_job(plan, work, done)
 
 def undo_move():
-    if not undo_history:
+    if engine.busy:
+        messagebox.showinfo("Info", "Wait for the running job to finish!")
+        return
+    batches = undo_log.committed()
+    if not batches:
         messagebox.showinfo("Undo", "Nothing to undo!")
         return
-    last_move = undo_history.pop()
-    for orig, dest in last_move.items():
-        if os.path.exists(dest):
-            os.makedirs(os.path.dirname(orig), exist_ok=True)
-            try:
-                shutil.move(dest, orig)
-                with open(LOG_FILE, "a") as f:
-                    f.write(f"{datetime.datetime.now()} | Undo: {dest} -> {orig}\n")
-            except Exception as e:
-                print(f"Undo error: {e}")
-    status_var.set("Undo completed!")
-    preview_files(selected_folder.get())
+    batch_id = batches[-1]
+    _, entries, _ = undo_log.read(batch_id)
+    undo_log.prepare(entries)
+    metrics = new_run_metrics()
+
+    def work(entry):
+        with metrics.timer("op_seconds", op="restore"):
+            restored = undo_log.restore(entry)
+        if restored:
+            journal.record("undo", entry.dst, entry.src)
+        return restored
+
+    def done(restored, cancelled, failed):
+        if cancelled:
+            # Keep whatever was not restored so it can still be undone
+            undo_log.finish_rollback(batch_id, restored)
+        else:
+            undo_log.finish_rollback(batch_id, {e.key for e in entries} - {e.key for e in failed})
+        status_var.set("Undo cancelled!" if cancelled else "Undo completed!")
+        relocate_records(restored, {e.key: e.action for e in entries if e.action != "move"})
+
+    start_job(entries, work, done, op="undo")
+
+def recover_interrupted():
+    """Offer to roll back organize runs that never finished (e.g. a crash)."""
+    for batch_id in undo_log.interrupted():
+        info, entries, _ = undo_log.read(batch_id)
+        if not entries:
+            undo_log.finish_rollback(batch_id, ())
+            continue
+        if messagebox.askyesno(
+                "Interrupted organize",
+                f"An organize of '{info.get('root', '?')}' stopped after {len(entries)} moves.\n"
+                "Roll it back now? (No keeps the files where they are; Undo stays available.)"):
+            restored = undo_log.rollback(batch_id, engine.jobs)
+            for dst, src in restored.items():
+                journal.record("undo", dst, src)
+            status_var.set(f"Rolled back {len(restored)} files from an interrupted run")
+        else:
+            undo_log.commit(batch_id)
+
+def toggle_pause():
+    if not engine.busy:
+        return
+    if engine.paused:
+        engine.resume()
+        pause_btn.configure(text="Pause")
+    else:
+        engine.pause()
+        pause_btn.configure(text="Resume")
+
+def cancel_job():
+    if engine.busy:
+        engine.cancel()
+
+def toggle_watch():
+    global watcher
+    if watcher is not None:
+        watcher.stop()
+        watcher = None
+        watch_btn.configure(text="Watch")
+        status_var.set("Stopped watching")
+        return
+    folder = selected_folder.get()
+    if not folder or not os.path.isdir(folder):
+        messagebox.showwarning("Warning", "Please select a valid folder first!")
+        return
+    layout = ShardLayout(shard_var.get()) if shard_var.get() != "none" else None
+    try:
+        # Moves happen on the watcher thread; results come back through a queue
+        watcher = watch_folder(folder, "category", TYPES, engine.jobs, journal, undo_log,
+                               watch_results.put, duplicates_var.get(), layout,
+                               exclude=EXCLUDE_PATTERNS, sniff=sniff_var.get())
+    except (NotImplementedError, OSError) as e:
+        messagebox.showwarning("Watch", f"Cannot watch this folder: {e}")
+        return
+    watch_btn.configure(text="Stop Watch")
+    status_var.set(f"Watching {folder} for new files...")
+    root.after(200, poll_watch)
+
+def poll_watch():
+    try:
+        while True:
+            moved = watch_results.get_nowait()
+            journal.flush()
+            status_var.set(f"Watch: moved {len(moved)} new files by category")
+    except queue.Empty:
+        pass
+    if watcher is not None:
+        root.after(200, poll_watch)
 
 # --------------------------
 # GUI Elements
 # --------------------------
-tk.Label(root, textvariable=status_var, bg=THEMES[current_theme]["bg"],
-         fg=THEMES[current_theme]["fg"], font=("Arial", 16, "bold")).pack(pady=5)
-ttk.Progressbar(root, maximum=100, variable=progress_var).pack(fill="x", padx=20, pady=5)
-
-folder_label = tk.Label(root, textvariable=selected_folder, bg=THEMES[current_theme]["entry_bg"],
-                        fg=THEMES[current_theme]["fg"], font=("Arial", 12), width=80, height=2)
-folder_label.pack(pady=5)
-folder_label.bind("<Button-1>", lambda e: select_folder())
-
-frame = tk.Frame(root, bg=THEMES[current_theme]["bg"])
-frame.pack(pady=5)
-
-tk.Label(frame, text="Categories & Extensions:", bg=THEMES[current_theme]["bg"], fg=THEMES[current_theme]["fg"]).pack()
-category_listbox = tk.Listbox(frame, width=70, height=6)
-category_listbox.pack(pady=5)
-update_category_list()
-
-btn_frame = tk.Frame(frame, bg=THEMES[current_theme]["bg"])
-btn_frame.pack(pady=5)
-tk.Button(btn_frame, text="Add Category", command=add_category, bg="#F39c12", fg="white").grid(row=0, column=0, padx=5)
-tk.Button(btn_frame, text="Add Extension", command=add_extension, bg="#F39c12", fg="white").grid(row=0, column=1, padx=5)
-tk.Button(btn_frame, text="Undo", command=undo_move, bg="#E74C3C", fg="white").grid(row=0, column=2, padx=5)
-tk.Button(btn_frame, text="Toggle Theme", command=toggle_theme, bg="#3498DB", fg="white").grid(row=0, column=3, padx=5)
-
-tk.Label(root, text="File Preview & Select for Move:", bg=THEMES[current_theme]["bg"], fg=THEMES[current_theme]["fg"]).pack(pady=5)
-preview_listbox = tk.Listbox(root, selectmode=tk.MULTIPLE, width=100, height=15)
-preview_listbox.pack(pady=5)
-
-# Organize buttons with rules
-rule_frame = tk.Frame(root, bg=THEMES[current_theme]["bg"])
-rule_frame.pack(pady=5)
-tk.Button(rule_frame, text="Organize by Category", command=lambda: organize_files("category"), bg="#27AE60", fg="white").grid(row=0, column=0, padx=5)
-tk.Button(rule_frame, text="Organize by Date", command=lambda: organize_files("date"), bg="#2980B9", fg="white").grid(row=0, column=1, padx=5)
-tk.Button(rule_frame, text="Organize by Size", command=lambda: organize_files("size"), bg="#8E44AD", fg="white").grid(row=0, column=2, padx=5)
-
-tk.Label(root, text="Drag-and-drop folder OR click label to select. Logs saved in 'file_organizer_log.txt'", bg=THEMES[current_theme]["bg"], fg="#555").pack(side="bottom", pady=5)
-
-root.mainloop()
+if __name__ == "__main__":
+    tk.Label(root, textvariable=status_var, bg=THEMES[current_theme]["bg"],
+             fg=THEMES[current_theme]["fg"], font=("Arial", 16, "bold")).pack(pady=5)
+    ttk.Progressbar(root, maximum=100, variable=progress_var).pack(fill="x", padx=20, pady=5)
+
+    folder_label = tk.Label(root, textvariable=selected_folder, bg=THEMES[current_theme]["entry_bg"],
+                            fg=THEMES[current_theme]["fg"], font=("Arial", 12), width=80, height=2)
+    folder_label.pack(pady=5)
+    folder_label.bind("<Button-1>", lambda e: select_folder())
+
+    frame = tk.Frame(root, bg=THEMES[current_theme]["bg"])
+    frame.pack(pady=5)
+
+    tk.Label(frame, text="Categories & Extensions:", bg=THEMES[current_theme]["bg"], fg=THEMES[current_theme]["fg"]).pack()
+    category_listbox = tk.Listbox(frame, width=70, height=6)
+    category_listbox.pack(pady=5)
+    update_category_list()
+
+    btn_frame = tk.Frame(frame, bg=THEMES[current_theme]["bg"])
+    btn_frame.pack(pady=5)
+    tk.Button(btn_frame, text="Add Category", command=add_category, bg="#F39c12", fg="white").grid(row=0, column=0, padx=5)
+    tk.Button(btn_frame, text="Add Extension", command=add_extension, bg="#F39c12", fg="white").grid(row=0, column=1, padx=5)
+    tk.Button(btn_frame, text="Undo", command=undo_move, bg="#E74C3C", fg="white").grid(row=0, column=2, padx=5)
+    tk.Button(btn_frame, text="Toggle Theme", command=toggle_theme, bg="#3498DB", fg="white").grid(row=0, column=3, padx=5)
+    tk.Button(btn_frame, text="Add Exclude", command=add_exclude, bg="#7F8C8D", fg="white").grid(row=0, column=4, padx=5)
+
+    tk.Label(root, text="File Preview & Select for Move:", bg=THEMES[current_theme]["bg"], fg=THEMES[current_theme]["fg"]).pack(pady=5)
+    # Only the visible rows are formatted and handed to Tk
+    preview_listbox = VirtualList(root, formatter=format_row, width=100, height=15)
+    preview_listbox.pack(pady=5)
+    select_frame = tk.Frame(root, bg=THEMES[current_theme]["bg"])
+    select_frame.pack()
+    tk.Button(select_frame, text="Select All", command=preview_listbox.select_all, bg="#7F8C8D", fg="white").grid(row=0, column=0, padx=5)
+    tk.Button(select_frame, text="Clear Selection", command=preview_listbox.clear_selection, bg="#7F8C8D", fg="white").grid(row=0, column=1, padx=5)
+    tk.Label(select_frame, text="Duplicates:", bg=THEMES[current_theme]["bg"], fg=THEMES[current_theme]["fg"]).grid(row=0, column=2, padx=5)
+    tk.OptionMenu(select_frame, duplicates_var, *DUPLICATE_POLICIES).grid(row=0, column=3, padx=5)
+    tk.Label(select_frame, text="Shards:", bg=THEMES[current_theme]["bg"], fg=THEMES[current_theme]["fg"]).grid(row=0, column=4, padx=5)
+    tk.OptionMenu(select_frame, shard_var, *SHARD_MODES).grid(row=0, column=5, padx=5)
+    tk.Checkbutton(select_frame, text="Sniff content", variable=sniff_var, bg=THEMES[current_theme]["bg"], fg=THEMES[current_theme]["fg"]).grid(row=0, column=6, padx=5)
+    tk.Checkbutton(select_frame, text="Pack small files", variable=pack_var, bg=THEMES[current_theme]["bg"], fg=THEMES[current_theme]["fg"]).grid(row=0, column=7, padx=5)
+
+    # Organize buttons with rules
+    rule_frame = tk.Frame(root, bg=THEMES[current_theme]["bg"])
+    rule_frame.pack(pady=5)
+    tk.Button(rule_frame, text="Organize by Category", command=lambda: organize_files("category"), bg="#27AE60", fg="white").grid(row=0, column=0, padx=5)
+    tk.Button(rule_frame, text="Organize by Date", command=lambda: organize_files("date"), bg="#2980B9", fg="white").grid(row=0, column=1, padx=5)
+    tk.Button(rule_frame, text="Organize by Size", command=lambda: organize_files("size"), bg="#8E44AD", fg="white").grid(row=0, column=2, padx=5)
+    pause_btn = tk.Button(rule_frame, text="Pause", command=toggle_pause, bg="#7F8C8D", fg="white")
+    pause_btn.grid(row=0, column=3, padx=5)
+    tk.Button(rule_frame, text="Cancel", command=cancel_job, bg="#E74C3C", fg="white").grid(row=0, column=4, padx=5)
+    watch_btn = tk.Button(rule_frame, text="Watch", command=toggle_watch, bg="#16A085", fg="white")
+    watch_btn.grid(row=0, column=5, padx=5)
+    tk.Button(rule_frame, text="Custom Rules", command=organize_by_rule_spec, bg="#D35400", fg="white").grid(row=1, column=0, columnspan=3, pady=5)
+    tk.Button(rule_frame, text="Several Folders", command=organize_many_folders, bg="#D35400", fg="white").grid(row=1, column=3, columnspan=3, pady=5)
+
+    tk.Label(root, text="Drag-and-drop folder OR click label to select. Logs saved in 'file_organizer_log.txt'", bg=THEMES[current_theme]["bg"], fg="#555").pack(side="bottom", pady=5)
+
+    recover_interrupted()
+    root.mainloop()
+    if watcher is not None:
+        watcher.stop()
+    journal.close()
+    hash_cache.close()
+    sniff_cache.close()
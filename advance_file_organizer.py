@@ -4,7 +4,10 @@
 
 import tkinter as tk
 from tkinter import filedialog, ttk, simpledialog, messagebox
-import os, shutil
+import os
+
+from file_organizer import (scan_folder, ScanFilter, move_back, OrganizeEngine, move_job, CategoryIndex,
+                            get_metrics, item_path, format_progress)
 
 # --------------------------
 # GUI Setup
@@ -33,13 +36,23 @@ TYPES = {
     "Audio": [".mp3", ".wav", ".aac"],
     "Code": [".py", ".md", ".html", ".js", ".css", ".java"]
 }
+# Frozen extension -> category lookup, rebuilt whenever TYPES changes
+category_index = CategoryIndex(TYPES)
 
 # History for undo
 undo_history = []
 
+# Scan and moves run on a worker pool so the window never freezes
+engine = OrganizeEngine()
+job_total = [0]
+
 # --------------------------
 # Functions
 # --------------------------
+def rebuild_index():
+    global category_index
+    category_index = CategoryIndex(TYPES)
+
 def add_category():
     name = simpledialog.askstring("New Category", "Enter category name:")
     if not name: return
@@ -47,6 +60,7 @@ def add_category():
         messagebox.showinfo("Info", "Category already exists!")
         return
     TYPES[name] = []
+    rebuild_index()
     update_category_list()
     
 def add_extension():
@@ -58,6 +72,7 @@ def add_extension():
         messagebox.showinfo("Info", "Extension already exists!")
         return
     TYPES[cat].append(ext)
+    rebuild_index()
     update_category_list()
 
 def update_category_list():
@@ -65,65 +80,81 @@ def update_category_list():
     for cat, exts in TYPES.items():
         category_listbox.insert(tk.END, f"{cat}: {', '.join(exts)}")
 
+def on_job_event(event, on_done):
+    if event[0] == "scanned":
+        job_total[0] = event[1]
+    elif event[0] == "progress":
+        progress_var.set((event[1] / event[2]) * 100 if event[2] else 100)
+        status_var.set(format_progress(event[3]))
+    elif event[0] == "error":
+        get_metrics().error("move", event[2], item_path(event[1]))
+    elif event[0] == "done":
+        pause_btn.configure(text="Pause")
+        on_done(event[1], event[2])
+
 def undo_move():
+    if engine.busy:
+        messagebox.showinfo("Undo", "Wait for the running job to finish!")
+        return
     if not undo_history:
         messagebox.showinfo("Undo", "Nothing to undo!")
         return
-    for orig, dest in undo_history.pop().items():
-        if os.path.exists(dest):
-            os.makedirs(os.path.dirname(orig), exist_ok=True)
-            try:
-                shutil.move(dest, orig)
-            except Exception as e:
-                print(f"Undo error: {e}")
-    status_var.set("Undo completed!")
+    last_move = undo_history.pop()
+
+    def done(restored, cancelled):
+        if cancelled:
+            remaining = {o: d for o, d in last_move.items() if d not in restored}
+            if remaining:
+                undo_history.append(remaining)
+        status_var.set("Undo cancelled!" if cancelled else "Undo completed!")
+
+    progress_var.set(0)
+    engine.start(list(last_move.items()), lambda pair: move_back(pair[1], pair[0]))
+    engine.poll(root, lambda event: on_job_event(event, done))
 
 def organize_files(event):
+    if engine.busy:
+        return
     folder = filedialog.askdirectory()
     if not folder:
         return
 
-    file_list = []
-    for root_dir, _, files in os.walk(folder):
-        for file in files:
-            file_list.append(os.path.join(root_dir, file))
-
-    total_files = len(file_list)
-    moved_count = 0
-    moved_files = {}  # for undo
-
-    for idx, file_path in enumerate(file_list, 1):
-        ext = os.path.splitext(file_path)[1].lower()
-        moved = False
-
-        for category, extensions in TYPES.items():
-            if ext in extensions:
-                target_dir = os.path.join(folder, category)
-                os.makedirs(target_dir, exist_ok=True)
-
-                target_path = os.path.join(target_dir, os.path.basename(file_path))
-                if os.path.exists(target_path):
-                    base, extn = os.path.splitext(os.path.basename(file_path))
-                    i = 1
-                    while os.path.exists(os.path.join(target_dir, f"{base}_{i}{extn}")):
-                        i += 1
-                    target_path = os.path.join(target_dir, f"{base}_{i}{extn}")
-
-                try:
-                    shutil.move(file_path, target_path)
-                    moved_files[file_path] = target_path
-                    moved_count += 1
-                    moved = True
-                except Exception as e:
-                    print(f"Error moving {file_path}: {e}")
-                break
-
-        progress_var.set((idx / total_files) * 100)
-        root.update_idletasks()
-
-    if moved_files:
-        undo_history.append(moved_files)
-    status_var.set(f"Moved {moved_count} files out of {total_files}")
+    index = category_index  # immutable, safe to share with the workers
+
+    def target_dir(rec):
+        category = index.classify(rec.name, rec.ext)
+        if category is None:
+            return None
+        return os.path.join(folder, category)
+
+    def done(moved_files, cancelled):
+        if moved_files:
+            undo_history.append(moved_files)
+        note = " (cancelled)" if cancelled else ""
+        status_var.set(f"Moved {len(moved_files)} files out of {job_total[0]}{note}")
+
+    progress_var.set(0)
+    status_var.set("Scanning...")
+    # The recursive walk runs on the worker thread as well
+    # Category folders from earlier runs are not walked again
+    scan_filter = ScanFilter(folder, TYPES, rules=("category",))
+    engine.start(lambda: scan_folder(folder, skip_dir=scan_filter.skip_dir, skip_file=scan_filter.skip_file),
+                 move_job(target_dir))
+    engine.poll(root, lambda event: on_job_event(event, done))
+
+def toggle_pause():
+    if not engine.busy:
+        return
+    if engine.paused:
+        engine.resume()
+        pause_btn.configure(text="Pause")
+    else:
+        engine.pause()
+        pause_btn.configure(text="Resume")
+
+def cancel_job():
+    if engine.busy:
+        engine.cancel()
 
 # --------------------------
 # GUI Buttons & Listbox
@@ -144,6 +175,9 @@ btn_frame.pack(pady=5)
 tk.Button(btn_frame, text="Add Category", command=add_category, bg="#F39c12", fg="white").grid(row=0, column=0, padx=5)
 tk.Button(btn_frame, text="Add Extension", command=add_extension, bg="#F39c12", fg="white").grid(row=0, column=1, padx=5)
 tk.Button(btn_frame, text="Undo Last Move", command=undo_move, bg="#E74C3C", fg="white").grid(row=0, column=2, padx=5)
+pause_btn = tk.Button(btn_frame, text="Pause", command=toggle_pause, bg="#7F8C8D", fg="white")
+pause_btn.grid(row=0, column=3, padx=5)
+tk.Button(btn_frame, text="Cancel", command=cancel_job, bg="#E74C3C", fg="white").grid(row=0, column=4, padx=5)
 
 sort_btn = tk.Label(root, text="Select Folder & Organize",
                     font=("Arial", 14, "bold"), bg="#27AE60", fg="white", relief="flat", padx=20, pady=10)
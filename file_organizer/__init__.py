@@ -0,0 +1,45 @@
+# ================================
+# File Organizer - shared engine
+# ================================
+"""Shared, GUI-independent building blocks used by the File Organizer scripts."""
+
+from .scanner import FileRecord, scan_folder, iter_scan, ScanStream
+from .categories import CategoryIndex
+from .mover import (move_into, move_back, rename_noreplace, copy_noreplace, configure_copies,
+                    NameIndex)
+from .file_index import FileIndex
+from .file_table import FileTable, TableView
+from .duplicates import HashCache, find_duplicates, DUPLICATE_POLICIES
+from .sharding import ShardLayout, SHARD_MODES
+from .prune import ScanFilter
+from .sniff import SniffCache, sniff_file, sniff_records, with_content_types
+from .packing import PackLayout, PACK_FORMATS, read_member
+from .journal import Journal
+from .undo_log import UndoLog, UndoBatch, UndoEntry
+from .metrics import Metrics, get_metrics, set_metrics, profiled, item_path
+from .progress import Progress, ProgressMeter, ProgressLine, format_progress
+from .throttle import IOBudget, TokenBucket, get_budget, set_budget, lower_priority
+from .engine import OrganizeEngine, move_job, DEFAULT_JOBS
+from .rules import RULES, DEFAULT_TYPES, RuleError, compile_rules, target_dir_for
+from .plan import MovePlan, PlannedMove, build_plan, prepare_plan, execute_job
+from .organize import organize_folder, plan_moves, execute_plan
+from .coordinator import plan_roots, organize_roots, split_roots, merge_plans, check_roots
+from .watch import FolderWatcher, watch_folder
+
+__all__ = ["FileRecord", "scan_folder", "iter_scan", "ScanStream", "CategoryIndex",
+           "move_into", "move_back", "rename_noreplace", "copy_noreplace",
+           "configure_copies", "NameIndex",
+           "FileIndex", "FileTable", "TableView", "HashCache", "find_duplicates", "DUPLICATE_POLICIES",
+           "ShardLayout", "SHARD_MODES", "ScanFilter",
+           "SniffCache", "sniff_file", "sniff_records", "with_content_types",
+           "PackLayout", "PACK_FORMATS", "read_member",
+           "Journal", "UndoLog", "UndoBatch", "UndoEntry",
+           "Metrics", "get_metrics", "set_metrics", "profiled", "item_path",
+           "Progress", "ProgressMeter", "ProgressLine", "format_progress",
+           "IOBudget", "TokenBucket", "get_budget", "set_budget", "lower_priority",
+           "OrganizeEngine", "move_job", "DEFAULT_JOBS",
+           "RULES", "DEFAULT_TYPES", "RuleError", "compile_rules", "target_dir_for",
+           "MovePlan", "PlannedMove", "build_plan", "prepare_plan", "execute_job",
+           "organize_folder", "plan_moves", "execute_plan",
+           "plan_roots", "organize_roots", "split_roots", "merge_plans", "check_roots",
+           "FolderWatcher", "watch_folder"]
@@ -0,0 +1,209 @@
+# ================================
+# Benchmark
+# ================================
+"""Time the organize pipeline on a reproducible synthetic tree.
+
+:func:`make_tree` builds a folder tree from a seed (depth, fan-out, file
+count, extension mix, name-collision rate, size range). :func:`run_benchmark`
+then times each phase v3 goes through: scan, preview (file index, cold and
+warm, then loading and filtering the compact file table), classification,
+planning with collision resolution, move and undo. Each phase reports
+files/s, I/O syscalls per file and peak RSS, and the result is plain JSON
+so runs can be diffed.
+
+Syscalls are the read/write class counted by the kernel in
+``/proc/self/io`` (``syscr + syscw``); ``None`` where that is not
+available. Peak RSS is the process high-water mark after the phase.
+"""
+
+import json
+import math
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+from .categories import CategoryIndex
+from .engine import DEFAULT_JOBS
+from .file_index import FileIndex
+from .file_table import FileTable
+from .journal import Journal
+from .organize import execute_plan
+from .plan import build_plan
+from .rules import DEFAULT_TYPES, target_dir_for
+from .scanner import scan_folder
+from .undo_log import UndoLog
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Extension -> weight; ".bin" is not in any category
+DEFAULT_EXT_MIX = {".jpg": 30, ".png": 10, ".pdf": 10, ".txt": 15, ".docx": 5, ".mp4": 3,
+                   ".mp3": 5, ".py": 10, ".md": 5, ".bin": 7}
+
+
+# --------------------------
+# Synthetic tree
+# --------------------------
+def make_tree(root, files=10000, depth=3, fanout=4, ext_mix=None, collision_rate=0.1,
+              min_size=0, max_size=64 * 1024, seed=0):
+    """Create a reproducible tree of ``files`` files below ``root``.
+
+    Folders form a ``fanout``-ary tree ``depth`` levels deep and files are
+    spread over all of them. ``collision_rate`` of the files reuse the name of
+    an earlier file, so they collide once sorted into one category folder.
+    Sizes are log-uniform between ``min_size`` and ``max_size``.
+    """
+    rng = random.Random(seed)
+    ext_mix = ext_mix or DEFAULT_EXT_MIX
+    exts, weights = list(ext_mix), list(ext_mix.values())
+    dirs = [root]
+    level = [root]
+    for d in range(depth):
+        level = [os.path.join(parent, f"d{d}_{i}") for parent in level for i in range(fanout)]
+        dirs.extend(level)
+    for path in dirs:
+        os.makedirs(path, exist_ok=True)
+
+    # Content from the seeded generator too, so the same seed gives the same
+    # bytes (Random.randbytes needs 3.9)
+    n = max(1, max_size)
+    names, chunk = [], rng.getrandbits(8 * n).to_bytes(n, "little")
+    lo, hi = math.log(min_size + 1), math.log(max_size + 1)
+    for i in range(files):
+        if names and rng.random() < collision_rate:
+            name = rng.choice(names)
+        else:
+            name = f"file_{i}{rng.choices(exts, weights)[0]}"
+            names.append(name)
+        folder = rng.choice(dirs)
+        path = os.path.join(folder, name)
+        if os.path.exists(path):
+            # Same name twice in one folder is impossible; keep the count exact
+            path = os.path.join(folder, f"c{i}_{name}")
+        size = int(math.exp(rng.uniform(lo, hi))) - 1
+        with open(path, "wb") as f:
+            f.write(chunk[:size])
+    return dirs
+
+
+# --------------------------
+# Measuring
+# --------------------------
+def _io_syscalls():
+    try:
+        with open("/proc/self/io") as f:
+            fields = dict(line.split(":", 1) for line in f)
+        return int(fields["syscr"]) + int(fields["syscw"])
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+def _peak_rss_kb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Bytes on macOS, KiB elsewhere
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+
+class _Phase:
+    def __init__(self, results, name, files):
+        self.results = results
+        self.name = name
+        self.files = files
+
+    def __enter__(self):
+        self._sys = _io_syscalls()
+        self._t = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        seconds = time.perf_counter() - self._t
+        calls = _io_syscalls()
+        files = self.files
+        self.results[self.name] = {
+            "seconds": round(seconds, 6),
+            "files": files,
+            "files_per_s": round(files / seconds, 1) if seconds > 0 else None,
+            "io_syscalls_per_file": (round((calls - self._sys) / files, 3)
+                                     if calls is not None and self._sys is not None and files else None),
+            "peak_rss_kb": _peak_rss_kb(),
+        }
+
+
+def default_bench_dir():
+    """tmpfs when there is one, so disk speed does not dominate."""
+    return "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+
+
+def run_benchmark(files=10000, depth=3, fanout=4, collision_rate=0.1, min_size=0,
+                  max_size=64 * 1024, seed=0, base_dir=None, jobs=DEFAULT_JOBS, rule="category",
+                  keep=False):
+    """Build a tree, run every phase once and return the results as a dict."""
+    work = tempfile.mkdtemp(prefix="file_organizer_bench_", dir=base_dir or default_bench_dir())
+    tree = os.path.join(work, "tree")
+    phases = {}
+    try:
+        t = time.perf_counter()
+        make_tree(tree, files, depth, fanout, None, collision_rate, min_size, max_size, seed)
+        setup = time.perf_counter() - t
+
+        with _Phase(phases, "scan", files):
+            records = scan_folder(tree)
+        index = FileIndex(os.path.join(work, "index.sqlite3"))
+        with _Phase(phases, "preview_cold", files):
+            sum(len(batch) for batch in index.iter_dirs(tree))
+        with _Phase(phases, "preview_warm", files):
+            sum(len(batch) for batch in index.iter_dirs(tree))
+
+        category_index = CategoryIndex(DEFAULT_TYPES)
+        with _Phase(phases, "table", files):
+            table = FileTable(category_index)
+            table.extend(records)
+        with _Phase(phases, "filter", files):
+            table.select(exts=[".jpg", ".png"], category="Images")
+        with _Phase(phases, "classify", files):
+            classify = category_index.classify
+            for rec in records:
+                classify(rec.name, rec.ext)
+
+        with _Phase(phases, "plan", files):
+            plan = build_plan(records, target_dir_for(tree, rule, category_index), rule, tree)
+        undo_log = UndoLog(os.path.join(work, "undo"))
+        with Journal(os.path.join(work, "log.txt")) as journal:
+            with _Phase(phases, "move", len(plan)):
+                moved = execute_plan(plan, jobs, journal, undo_log)
+        batch_id = undo_log.committed()[-1] if moved else None
+        with _Phase(phases, "undo", len(moved)):
+            restored = undo_log.rollback(batch_id, jobs) if batch_id else {}
+
+        return {
+            "params": {"files": files, "depth": depth, "fanout": fanout,
+                       "collision_rate": collision_rate, "min_size": min_size,
+                       "max_size": max_size, "seed": seed, "jobs": jobs, "rule": rule},
+            "env": {"python": platform.python_version(), "platform": platform.platform(),
+                    "dir": work, "cpus": os.cpu_count()},
+            "setup_seconds": round(setup, 3),
+            "planned": len(plan), "conflicts": len(plan.conflicts),
+            "moved": len(moved), "restored": len(restored),
+            "table_bytes": table.nbytes(),
+            "phases": phases,
+        }
+    finally:
+        if not keep:
+            shutil.rmtree(work, ignore_errors=True)
+
+
+def dump(result, path=None):
+    text = json.dumps(result, indent=2)
+    if path:
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
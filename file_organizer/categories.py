@@ -0,0 +1,56 @@
+# ================================
+# Category Index
+# ================================
+"""Extension -> category lookup compiled from a ``TYPES`` dict.
+
+The scripts keep ``TYPES`` as an editable ``{category: [ext, ...]}`` dict.
+Scanning it for every file is a loop over categories plus a list search, so
+it is compiled once into a frozen hash index and only rebuilt when
+``add_category``/``add_extension`` change it.
+"""
+
+from types import MappingProxyType
+
+
+class CategoryIndex:
+    __slots__ = ("by_ext", "_compound")
+
+    def __init__(self, types):
+        by_ext = {}
+        compound = {}
+        for category, extensions in types.items():
+            for ext in extensions:
+                key = ext.lower()
+                # First category wins, like the old ``for ... break`` loop
+                by_ext.setdefault(key, category)
+                if key.count(".") > 1:
+                    # ".tar.gz" is looked up only for names ending in ".gz"
+                    tail = key[key.rindex("."):]
+                    compound.setdefault(tail, []).append(key)
+        for keys in compound.values():
+            keys.sort(key=len, reverse=True)
+        self.by_ext = MappingProxyType(by_ext)
+        self._compound = MappingProxyType({t: tuple(k) for t, k in compound.items()})
+
+    def classify(self, name, ext):
+        """Return the category for a file name and its lower-cased last suffix.
+
+        ``ext`` is the value scan records already carry, so the common case
+        is a single dict lookup with no new strings.
+        """
+        keys = self._compound.get(ext)
+        if keys is not None:
+            for key in keys:
+                n = len(key)
+                if len(name) > n and name[-n:].lower() == key:
+                    return self.by_ext[key]
+        return self.by_ext.get(ext)
+
+    def classify_record(self, rec):
+        return self.classify(rec.name, rec.ext)
+
+    def __contains__(self, ext):
+        return ext.lower() in self.by_ext
+
+    def __len__(self):
+        return len(self.by_ext)
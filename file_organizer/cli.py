@@ -0,0 +1,359 @@
+# ================================
+# Command Line
+# ================================
+"""``file-organizer`` command line entry point.
+
+Nothing here imports tkinter; the windows are the File_Organizer scripts.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+from .duplicates import DUPLICATE_POLICIES, HashCache
+from .engine import DEFAULT_JOBS
+from .journal import Journal
+from .metrics import Metrics, PROFILERS, get_metrics, set_metrics, profiled
+from .mover import configure_copies
+from .coordinator import plan_roots
+from .organize import plan_moves, execute_plan
+from .packing import PACK_FORMATS, PACK_MAX_SIZE, PackLayout
+from .plan import MovePlan
+from .progress import ProgressLine
+from .rules import RULES, RuleError, parse_rules
+from .sharding import SHARD_MODES, DEFAULT_MAX_ENTRIES, ShardLayout
+from .sniff import SniffCache
+from .throttle import IOBudget, set_budget, lower_priority, parse_bytes
+from .undo_log import UndoLog
+from .watch import watch_folder
+
+LOG_FILE = "file_organizer_log.txt"
+UNDO_DIR = "file_organizer_undo"
+HASH_CACHE = "file_organizer_hashes.sqlite3"
+
+
+def rule_arg(value):
+    """``--rule``: a classic rule name or a rule spec, checked up front."""
+    if value not in RULES:
+        try:
+            parse_rules(value)
+        except RuleError as e:
+            raise argparse.ArgumentTypeError(str(e)) from None
+    return value
+
+
+def run_plan(plan, args):
+    errors = []
+    progress = ProgressLine()
+
+    def on_event(event):
+        if event[0] == "progress":
+            progress.update(event[3])
+        elif event[0] == "error":
+            # execute_plan has counted and logged it already
+            errors.append(event)
+
+    journal = Journal(args.log, fmt=args.log_format) if args.log else None
+    try:
+        moved = execute_plan(plan, args.jobs, journal, UndoLog(args.undo_dir), on_event,
+                             args.device_jobs)
+    finally:
+        progress.finish()
+        if journal is not None:
+            journal.close()
+    print(f"Moved {len(moved)} files using '{plan.rule}' rule")
+    return 1 if errors else 0
+
+
+def cmd_organize(args):
+    for folder in args.folder:
+        if not os.path.isdir(folder):
+            print(f"Not a folder: {folder}", file=sys.stderr)
+            return 2
+    hash_cache = sniff_cache = None
+    if args.duplicates != "rename":
+        hash_cache = HashCache(args.hash_cache or None)
+    if args.sniff:
+        sniff_cache = SniffCache(args.hash_cache or None)
+    layout = pack = None
+    if args.shard != "none":
+        layout = ShardLayout(args.shard, args.shard_max)
+    if args.pack:
+        pack = PackLayout(args.pack, args.pack_max_size, args.pack_only)
+    try:
+        if len(args.folder) > 1 or args.split or args.processes is not None:
+            plan = plan_roots(args.folder, args.rule, split=args.split, processes=args.processes,
+                              duplicates=args.duplicates, jobs=args.jobs, hash_cache=hash_cache,
+                              layout=layout, exclude=args.exclude, prune=not args.no_prune,
+                              sniff=args.sniff, sniff_cache=sniff_cache, pack=pack)
+        else:
+            plan = plan_moves(args.folder[0], args.rule, duplicates=args.duplicates, jobs=args.jobs,
+                              hash_cache=hash_cache, layout=layout, exclude=args.exclude,
+                              prune=not args.no_prune, sniff=args.sniff, sniff_cache=sniff_cache,
+                              pack=pack)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 2
+    finally:
+        if hash_cache is not None:
+            hash_cache.close()
+        if sniff_cache is not None:
+            sniff_cache.close()
+    if args.save_plan:
+        plan.save(args.save_plan)
+    if args.dry_run:
+        for move in plan:
+            if move.action == "delete":
+                print(f"{move.rec.path} -> deleted, same as {move.keep}")
+                continue
+            note = "  (renamed: name taken)" if move.conflict else ""
+            if move.action == "link":
+                note += f"  (hard link to {move.keep})"
+            elif move.action == "pack":
+                note += "  (packed)"
+            print(f"{move.rec.path} -> {move.dst}{note}")
+        for target_dir, (_, levels) in plan.shards.items():
+            print(f"{target_dir}: sharded {levels} level(s) deep")
+        print(f"Would move {len(plan)} files using '{args.rule}' rule, "
+              f"{len(plan.conflicts)} renamed to avoid conflicts, "
+              f"{len(plan.duplicates)} duplicates ({args.duplicates}), "
+              f"{len(plan.packed)} packed")
+        return 0
+    return run_plan(plan, args)
+
+
+def cmd_apply(args):
+    return run_plan(MovePlan.load(args.plan), args)
+
+
+def cmd_undo(args):
+    undo_log = UndoLog(args.undo_dir)
+    interrupted = undo_log.interrupted()
+    if args.accept:
+        for batch_id in interrupted:
+            undo_log.commit(batch_id)
+        print(f"Kept {len(interrupted)} interrupted runs as they are")
+        return 0
+    if args.interrupted:
+        batches = interrupted
+    else:
+        batches = undo_log.committed()[-1:]
+        if interrupted:
+            print(f"Interrupted organize runs: {len(interrupted)} (roll them back with "
+                  "'undo --interrupted' or keep them with 'undo --accept')", file=sys.stderr)
+    if not batches:
+        print("Nothing to undo!")
+        return 0
+    restored = {}
+    with get_metrics().timer("phase_seconds", phase="undo"):
+        for batch_id in reversed(batches):
+            restored.update(undo_log.rollback(batch_id, args.jobs))
+    if args.log:
+        with Journal(args.log, fmt=args.log_format) as journal:
+            for dst, src in restored.items():
+                journal.record("undo", dst, src)
+    print(f"Restored {len(restored)} files")
+    return 0
+
+
+def cmd_watch(args):
+    if not os.path.isdir(args.folder):
+        print(f"Not a folder: {args.folder}", file=sys.stderr)
+        return 2
+    layout = ShardLayout(args.shard, args.shard_max) if args.shard != "none" else None
+    journal = Journal(args.log, fmt=args.log_format) if args.log else None
+
+    def on_moved(moved):
+        if journal is not None:
+            journal.flush()
+        if args.metrics:
+            get_metrics().write_prometheus(args.metrics)
+        print(f"Moved {len(moved)} files using '{args.rule}' rule", flush=True)
+
+    try:
+        watcher = watch_folder(args.folder, args.rule, jobs=args.jobs, journal=journal,
+                               undo_log=UndoLog(args.undo_dir), on_moved=on_moved,
+                               duplicates=args.duplicates, layout=layout,
+                               recursive=args.recursive, settle=args.settle,
+                               exclude=args.exclude, sniff=args.sniff)
+    except NotImplementedError as e:
+        print(e, file=sys.stderr)
+        return 2
+    print(f"Watching {os.path.abspath(args.folder)} (Ctrl+C to stop)", flush=True)
+    try:
+        while watcher.running:
+            time.sleep(0.5)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.stop()
+        if journal is not None:
+            journal.close()
+    return 0
+
+
+def cmd_bench(args):
+    from .bench import run_benchmark, dump
+    result = run_benchmark(args.files, args.depth, args.fanout, args.collisions, args.min_size,
+                           args.max_size, args.seed, args.dir, args.jobs, args.rule, args.keep)
+    dump(result, args.output)
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="file-organizer", description="Organize files by category, date or size.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    def add_scan_options(p):
+        p.add_argument("--sniff", action="store_true",
+                       help="classify files with an unknown or missing extension by their first bytes")
+        p.add_argument("--exclude", action="append", default=[], metavar="PATTERN",
+                       help="skip files and folders matching a glob, or a regex as 're:...' "
+                            "(repeatable)")
+
+    def add_metrics(p):
+        p.add_argument("--metrics", metavar="FILE",
+                       help="write run metrics to FILE in Prometheus text format")
+        p.add_argument("--summary", action="store_true",
+                       help="print per-phase timings and counters when done")
+        p.add_argument("--profile", choices=PROFILERS, help="profile the run")
+        p.add_argument("--profile-out", metavar="FILE",
+                       help="profile output (default: file_organizer.prof / "
+                            "file_organizer_tracemalloc.txt)")
+
+    def add_io_budget(p):
+        p.add_argument("--io-bytes", type=parse_bytes, metavar="RATE",
+                       help="max bytes/s read or written per device, e.g. 50M (default: unlimited)")
+        p.add_argument("--io-ops", type=float, metavar="N",
+                       help="max file operations/s per device (default: unlimited)")
+        p.add_argument("--io-in-flight", type=int, metavar="N",
+                       help="max operations running at once per device (default: unlimited)")
+        p.add_argument("--low-priority", action="store_true",
+                       help="run with lower CPU (nice) and, on Linux, I/O (ioprio) priority")
+
+    def add_common(p):
+        p.add_argument("--jobs", "-j", type=int, default=DEFAULT_JOBS, help="worker threads (default: %(default)s)")
+        p.add_argument("--undo-dir", default=UNDO_DIR, help="where undo batches are kept")
+        p.add_argument("--log", default=LOG_FILE, help="move log file ('' to disable)")
+        p.add_argument("--log-format", choices=("text", "jsonl"), default="text")
+        p.add_argument("--copy-streams", type=int, default=4,
+                       help="cross-device copies running at once (default: %(default)s)")
+        p.add_argument("--range-streams", type=int, default=1,
+                       help="parallel ranges per large cross-device file (default: %(default)s)")
+        add_io_budget(p)
+        add_metrics(p)
+
+    def add_device_jobs(p):
+        p.add_argument("--device-jobs", type=int, metavar="N",
+                       help="moves running at once per source device (default: no limit)")
+
+    p = sub.add_parser("organize", help="move the files of one or more folders into sub folders")
+    p.add_argument("folder", nargs="+",
+                   help="folders to organize; several are planned together and undone as one run")
+    p.add_argument("--split", action="store_true",
+                   help="scan each top-level sub folder as a separate unit of work")
+    p.add_argument("--processes", type=int, metavar="N",
+                   help="processes scanning and classifying (default: one per CPU with several "
+                        "folders or --split, else scan in this process; 0 for none)")
+    p.add_argument("--rule", type=rule_arg, default="category", metavar="RULE",
+                   help=f"one of {', '.join(RULES)}, or a rule spec such as "
+                        "'category/{year}/{size_bucket}' (default: %(default)s)")
+    p.add_argument("--dry-run", "-n", action="store_true", help="only print what would be moved")
+    p.add_argument("--save-plan", metavar="FILE", help="write the move plan (JSON lines) to FILE")
+    p.add_argument("--duplicates", choices=DUPLICATE_POLICIES, default="rename",
+                   help="what to do with files identical to one already in the target folder "
+                        "(default: %(default)s)")
+    p.add_argument("--hash-cache", default=HASH_CACHE,
+                   help="content hash and type cache database ('' to keep it in memory)")
+    p.add_argument("--shard", choices=SHARD_MODES, default="none",
+                   help="fan large target folders out into hash-prefix sub folders; "
+                        "'date' also nests the date rule as YYYY/MM/DD")
+    p.add_argument("--shard-max", type=int, default=DEFAULT_MAX_ENTRIES, metavar="N",
+                   help="files per folder before it is sharded (default: %(default)s)")
+    p.add_argument("--no-prune", action="store_true",
+                   help="also rescan category, size and date folders made by earlier runs")
+    p.add_argument("--pack", choices=PACK_FORMATS,
+                   help="append small files to a packed.tar / packed.zip archive in their "
+                        "target folder instead of moving them one by one")
+    p.add_argument("--pack-max-size", type=parse_bytes, default=PACK_MAX_SIZE, metavar="SIZE",
+                   help="files smaller than this are packed (default: 64k)")
+    p.add_argument("--pack-only", action="append", default=[], metavar="FOLDER",
+                   help="only pack into these target folders, e.g. Docs (repeatable)")
+    add_scan_options(p)
+    add_device_jobs(p)
+    add_common(p)
+    p.set_defaults(func=cmd_organize)
+
+    p = sub.add_parser("watch", help="organize new files as they arrive (Linux)")
+    p.add_argument("folder")
+    p.add_argument("--rule", type=rule_arg, default="category", metavar="RULE")
+    p.add_argument("--duplicates", choices=DUPLICATE_POLICIES, default="rename")
+    p.add_argument("--shard", choices=SHARD_MODES, default="none")
+    p.add_argument("--shard-max", type=int, default=DEFAULT_MAX_ENTRIES, metavar="N")
+    p.add_argument("--recursive", "-r", action="store_true", help="also watch sub folders")
+    p.add_argument("--settle", type=float, default=0.2, metavar="SECONDS",
+                   help="quiet time before a batch of new files is organized (default: %(default)s)")
+    add_scan_options(p)
+    add_common(p)
+    p.set_defaults(func=cmd_watch)
+
+    p = sub.add_parser("apply", help="apply a plan saved with --save-plan")
+    p.add_argument("plan")
+    add_device_jobs(p)
+    add_common(p)
+    p.set_defaults(func=cmd_apply)
+
+    p = sub.add_parser("undo", help="undo the last organize run")
+    group = p.add_mutually_exclusive_group()
+    group.add_argument("--interrupted", action="store_true",
+                       help="roll back the runs that stopped before finishing (e.g. a crash)")
+    group.add_argument("--accept", action="store_true",
+                       help="keep interrupted runs as they are; they can still be undone later")
+    add_common(p)
+    p.set_defaults(func=cmd_undo)
+
+    p = sub.add_parser("bench", help="time scan, preview, classify, plan, move and undo "
+                                     "on a synthetic tree (JSON output)")
+    p.add_argument("--files", type=int, default=10000)
+    p.add_argument("--depth", type=int, default=3)
+    p.add_argument("--fanout", type=int, default=4)
+    p.add_argument("--collisions", type=float, default=0.1, metavar="RATE",
+                   help="share of files reusing an earlier name (default: %(default)s)")
+    p.add_argument("--min-size", type=int, default=0)
+    p.add_argument("--max-size", type=int, default=64 * 1024)
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--rule", type=rule_arg, default="category", metavar="RULE")
+    p.add_argument("--jobs", "-j", type=int, default=DEFAULT_JOBS)
+    p.add_argument("--dir", help="where to build the tree (default: /dev/shm when available)")
+    p.add_argument("--output", "-o", metavar="FILE", help="write JSON here instead of stdout")
+    p.add_argument("--keep", action="store_true", help="keep the generated tree")
+    p.set_defaults(func=cmd_bench)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if hasattr(args, "copy_streams"):
+        configure_copies(args.copy_streams, args.range_streams)
+        set_budget(IOBudget(args.io_bytes, args.io_ops, args.io_in_flight))
+        if args.low_priority:
+            # Before any worker starts: threads inherit nice and ioprio
+            lower_priority()
+    if not hasattr(args, "metrics"):
+        return args.func(args)
+    # One set of metrics per run; errors are reported on stderr as JSON lines
+    metrics = Metrics(sys.stderr)
+    set_metrics(metrics)
+    try:
+        with profiled(args.profile, args.profile_out):
+            return args.func(args)
+    finally:
+        if args.metrics:
+            metrics.write_prometheus(args.metrics)
+        if args.summary:
+            print(metrics.summary(), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
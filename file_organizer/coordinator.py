@@ -0,0 +1,208 @@
+# ================================
+# Multi-Root Coordinator
+# ================================
+"""Organize several roots, or one huge root, with a pool of processes.
+
+Scanning and classifying are CPU bound in Python (``scandir`` entries,
+record tuples, rule lookups), so threads do not make them faster. The
+coordinator splits the work into scan units, one per root or, with
+``split``, one per top-level sub folder plus one for the files directly in
+the root, and runs the units on a process pool. Each unit comes back as
+``(record, target folder)`` pairs; the parent then builds one
+:class:`~file_organizer.plan.MovePlan` per root (names, duplicates and
+shards are decided there, so they stay consistent within a root) and
+merges them.
+
+Roots may not overlap, so no two roots can plan the same destination, and
+within a root :class:`~file_organizer.mover.NameIndex` hands out every
+destination once. The merged plan runs on the usual engine as a single
+undo batch, with at most ``device_jobs`` moves in flight per device, so a
+slow disk does not take every worker while another one sits idle.
+"""
+
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+
+from .categories import CategoryIndex
+from .engine import DEFAULT_JOBS
+from .metrics import get_metrics
+from .organize import execute_plan
+from .plan import MovePlan, build_plan
+from .prune import ScanFilter
+from .rules import RULES, DEFAULT_TYPES, target_dir_for
+from .scanner import iter_dirs
+from .sniff import with_content_types
+from .throttle import IOBudget, get_budget, set_budget
+
+
+def check_roots(roots):
+    """Absolute, de-duplicated roots; ``ValueError`` if one lies inside another."""
+    result = []
+    for root in roots:
+        root = os.path.abspath(root)
+        if not os.path.isdir(root):
+            raise ValueError(f"Not a folder: {root}")
+        if root not in result:
+            result.append(root)
+    ordered = sorted(os.path.normcase(os.path.join(r, "")) for r in result)
+    for outer, inner in zip(ordered, ordered[1:]):
+        if inner.startswith(outer):
+            raise ValueError(f"Overlapping roots: {outer.rstrip(os.sep)} contains {inner.rstrip(os.sep)}")
+    return result
+
+
+def split_roots(roots, split=False, scan_filters=None):
+    """Return the scan units as ``(root, folder, recursive)`` tuples.
+
+    Without ``split`` every root is one unit. With it, each top-level sub
+    folder the scan would enter is a unit of its own and the root's own
+    files are one more, non-recursive, unit.
+    """
+    units = []
+    for root in roots:
+        if not split:
+            units.append((root, root, True))
+            continue
+        scan_filter = (scan_filters or {}).get(root)
+        units.append((root, root, False))
+        try:
+            with os.scandir(root) as it:
+                subdirs = [entry.path for entry in it if entry.is_dir(follow_symlinks=False)]
+        except OSError as e:
+            get_metrics().error("scan", e, root)
+            continue
+        units.extend((root, d, True) for d in subdirs
+                     if scan_filter is None or not scan_filter.skip_dir(d))
+    return units
+
+
+# --------------------------
+# Worker side
+# --------------------------
+def _init_worker(limits):
+    # Each process gets an equal share of the parent's I/O budget
+    set_budget(IOBudget(*limits) if limits is not None else None)
+
+
+def _scan_unit(unit, rule, types, exclude, prune, nested_dates):
+    """Scan and classify one unit; return ``(pairs, errors)``."""
+    root, folder, recursive = unit
+    scan_filter = ScanFilter(root, types, exclude, prune, RULES + (rule,))
+    target_dir = target_dir_for(root, rule, CategoryIndex(types), nested_dates)
+    errors = []
+    skip_dir = scan_filter.skip_dir if recursive else (lambda path: True)
+    pairs = []
+    for records in iter_dirs(folder, errors.append, skip_dir, scan_filter.skip_file):
+        pairs.extend((rec, target_dir(rec)) for rec in records)
+    # OSError subclasses pickle, but keep only what the parent reports
+    return pairs, [(e.errno, e.strerror, e.filename) for e in errors]
+
+
+def _pool(processes, units, limits):
+    if processes == 0 or len(units) < 2:
+        return ThreadPoolExecutor(max_workers=1)
+    processes = min(processes or os.cpu_count() or 1, len(units))
+    # Not fork: the parent may be running Tk or worker threads. Spawned
+    # workers import the main script again, so it must be guarded by
+    # ``if __name__ == "__main__"``
+    context = multiprocessing.get_context("spawn")
+    if limits is not None:
+        bytes_per_s, ops_per_s, in_flight = limits
+        limits = (bytes_per_s and bytes_per_s / processes, ops_per_s and ops_per_s / processes,
+                  in_flight and max(1, in_flight // processes))
+    return ProcessPoolExecutor(max_workers=processes, mp_context=context,
+                               initializer=_init_worker, initargs=(limits,))
+
+
+# --------------------------
+# Planning
+# --------------------------
+def plan_roots(roots, rule="category", types=None, split=False, processes=None,
+               duplicates="rename", jobs=DEFAULT_JOBS, hash_cache=None, layout=None,
+               exclude=(), prune=True, sniff=False, sniff_cache=None, pack=None, on_unit=None):
+    """Scan ``roots`` on a process pool and return one merged :class:`MovePlan`.
+
+    ``processes`` defaults to the CPU count; 0 scans in this process.
+    ``on_unit(done, total)`` is called as scan units finish. The merged
+    plan's ``root`` is the list of roots. Other arguments are as for
+    :func:`~file_organizer.organize.plan_moves`.
+    """
+    roots = check_roots(roots)
+    types = types or DEFAULT_TYPES
+    nested_dates = layout is not None and layout.nested_dates
+    metrics = get_metrics()
+    filters = {root: ScanFilter(root, types, exclude, prune, RULES + (rule,)) for root in roots}
+    units = split_roots(roots, split, filters)
+    budget = get_budget()
+    limits = (budget.bytes_per_s, budget.ops_per_s, budget.in_flight) if budget.limited else None
+
+    results = [None] * len(units)
+    start = time.perf_counter()
+    with _pool(processes, units, limits) as pool:
+        futures = {pool.submit(_scan_unit, unit, rule, types, exclude, prune, nested_dates): i
+                   for i, unit in enumerate(units)}
+        for done, future in enumerate(as_completed(futures), 1):
+            unit_pairs, errors = results[futures[future]] = future.result()
+            for code, message, filename in errors:
+                metrics.error("scan", OSError(code, message, filename), filename)
+            if on_unit is not None:
+                on_unit(done, len(units))
+    metrics.observe("phase_seconds", time.perf_counter() - start, phase="scan")
+
+    # Merge in unit order, which is the order a single scan lists the
+    # files in, so renames on collision come out the same as without a pool
+    pairs = {root: [] for root in roots}
+    for (root, _, _), (unit_pairs, _) in zip(units, results):
+        pairs[root].extend(unit_pairs)
+
+    plans = []
+    for root in roots:
+        records = [rec for rec, _ in pairs[root]]
+        metrics.inc("files_total", len(records), phase="scan")
+        target_dir = _known_targets(root, pairs[root], rule, types, nested_dates)
+        if sniff:
+            with metrics.timer("phase_seconds", phase="sniff"):
+                target_dir = with_content_types(target_dir, records, CategoryIndex(types),
+                                                jobs, sniff_cache)
+        plans.append(build_plan(records, target_dir, rule, root, duplicates, jobs, hash_cache,
+                                layout, pack))
+    return merge_plans(plans)
+
+
+def _known_targets(root, pairs, rule, types, nested_dates):
+    """``target_dir_for`` answering from the workers' results."""
+    targets = {rec.path: (rec, target) for rec, target in pairs}
+    classify = []
+
+    def target_dir(rec):
+        hit = targets.get(rec.path)
+        if hit is not None and hit[0] is rec:
+            return hit[1]
+        # A record re-typed by sniffing: classify it here
+        if not classify:
+            classify.append(target_dir_for(root, rule, CategoryIndex(types), nested_dates))
+        return classify[0](rec)
+    return target_dir
+
+
+def merge_plans(plans):
+    """Join per-root plans into one; ``root`` becomes the list of roots."""
+    if len(plans) == 1:
+        return plans[0]
+    moves, shards = [], {}
+    for plan in plans:
+        moves.extend(plan.moves)
+        shards.update(plan.shards)
+    return MovePlan([plan.root for plan in plans], plans[0].rule if plans else None, moves, shards)
+
+
+def organize_roots(roots, rule="category", types=None, split=False, processes=None,
+                   jobs=DEFAULT_JOBS, device_jobs=None, journal=None, undo_log=None,
+                   on_event=None, duplicates="rename", layout=None, exclude=(), prune=True,
+                   sniff=False, pack=None):
+    """Plan ``roots`` together and move their files as one undo batch; return ``{src: dst}``."""
+    plan = plan_roots(roots, rule, types, split, processes, duplicates, jobs, layout=layout,
+                      exclude=exclude, prune=prune, sniff=sniff, pack=pack)
+    return execute_plan(plan, jobs, journal, undo_log, on_event, device_jobs)
@@ -0,0 +1,209 @@
+# ================================
+# Duplicate Detection
+# ================================
+"""Find byte-identical files among scan records.
+
+Work is cut down in stages: group by size, then by a hash of the first and
+last ``EDGE`` bytes, and only files still tied get a full streaming hash.
+Hashing runs on a thread pool. Hashes are cached by
+``(dev, inode, size, mtime)``, so an unchanged file is never read twice,
+and with a database path the cache survives between runs.
+"""
+
+import hashlib
+import mmap
+import os
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from .throttle import get_budget
+
+EDGE = 4096                    # bytes hashed at each end for the partial hash
+MMAP_MIN = 1024 * 1024         # files at least this big are hashed through mmap
+READ_CHUNK = 1024 * 1024
+
+DUPLICATE_POLICIES = ("rename", "skip", "hardlink", "delete")
+
+
+# --------------------------
+# Hashing
+# --------------------------
+def _digest():
+    return hashlib.blake2b(digest_size=20)
+
+
+def partial_hash(path, size):
+    h = _digest()
+    with open(path, "rb") as f:
+        if size <= 2 * EDGE:
+            h.update(f.read())
+        else:
+            h.update(f.read(EDGE))
+            f.seek(size - EDGE)
+            h.update(f.read(EDGE))
+    return h.hexdigest()
+
+
+def full_hash(path, size):
+    h = _digest()
+    with open(path, "rb") as f:
+        # Go by the size now, not the scanned one: a file emptied since the
+        # scan cannot be mapped
+        if os.fstat(f.fileno()).st_size >= MMAP_MIN:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                view = memoryview(mm)
+                try:
+                    for start in range(0, len(mm), READ_CHUNK):
+                        h.update(view[start:start + READ_CHUNK])
+                finally:
+                    view.release()
+        else:
+            for chunk in iter(lambda: f.read(READ_CHUNK), b""):
+                h.update(chunk)
+    return h.hexdigest()
+
+
+# --------------------------
+# Cache
+# --------------------------
+class HashCache:
+    """``(dev, ino, size, mtime) -> (partial, full)``, optionally in SQLite.
+
+    Only touched from the thread calling :func:`find_duplicates`; workers
+    just compute hashes.
+    """
+
+    def __init__(self, db_path=None):
+        self.db_path = db_path
+        self._mem = {}
+        self._dirty = set()
+        self._db = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(rec):
+        return (rec.dev, rec.ino, rec.size, rec.mtime)
+
+    def _conn(self):
+        if self._db is None and self.db_path:
+            import sqlite3  # only when a persistent cache is used
+            self._db = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS hashes (dev INTEGER, ino INTEGER, size INTEGER, "
+                "mtime REAL, partial TEXT, full TEXT, PRIMARY KEY (dev, ino, size, mtime)) WITHOUT ROWID")
+        return self._db
+
+    def get(self, rec):
+        key = self.key(rec)
+        with self._lock:
+            hit = self._mem.get(key)
+            if hit is None and self.db_path:
+                row = self._conn().execute(
+                    "SELECT partial, full FROM hashes WHERE dev = ? AND ino = ? AND size = ? AND mtime = ?",
+                    key).fetchone()
+                hit = self._mem[key] = (row[0], row[1]) if row else (None, None)
+            return hit or (None, None)
+
+    def put(self, rec, partial=None, full=None):
+        key = self.key(rec)
+        with self._lock:
+            old_partial, old_full = self._mem.get(key) or (None, None)
+            self._mem[key] = (partial or old_partial, full or old_full)
+            self._dirty.add(key)
+
+    def flush(self):
+        with self._lock:
+            if not self._dirty or not self.db_path:
+                self._dirty.clear()
+                return
+            db = self._conn()
+            db.executemany("INSERT OR REPLACE INTO hashes VALUES (?, ?, ?, ?, ?, ?)",
+                           [k + self._mem[k] for k in self._dirty])
+            db.commit()
+            self._dirty.clear()
+
+    def close(self):
+        self.flush()
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+
+# --------------------------
+# Detection
+# --------------------------
+def _hash_all(records, which, cache, jobs):
+    """Return ``{record: hash}`` using the cache, hashing misses in parallel."""
+    result, missing = {}, []
+    for rec in records:
+        cached = cache.get(rec)[0 if which == "partial" else 1]
+        if cached is not None:
+            result[rec] = cached
+        else:
+            missing.append(rec)
+    func = partial_hash if which == "partial" else full_hash
+    budget = get_budget()
+
+    def run(rec):
+        if os.path.islink(rec.path):
+            # Records carry the link's own size; its target is not its content
+            return rec, None
+        nbytes = min(rec.size, 2 * EDGE) if which == "partial" else rec.size
+        try:
+            with budget.op(rec.dev, nbytes):
+                return rec, func(rec.path, rec.size)
+        except (OSError, ValueError):
+            # ValueError: mmap of a file truncated while it was being mapped
+            return rec, None
+
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as pool:
+        for rec, digest in pool.map(run, missing):
+            if digest is None:
+                continue
+            result[rec] = digest
+            if which == "partial":
+                # For small files the partial hash covers every byte
+                cache.put(rec, partial=digest, full=digest if rec.size <= 2 * EDGE else None)
+            else:
+                cache.put(rec, full=digest)
+    return result
+
+
+def find_duplicates(records, jobs=8, cache=None, key=None):
+    """Return groups (lists) of records with identical content.
+
+    ``key(rec)`` narrows what may be compared, e.g. the target folder;
+    it is combined with the size. Empty files are ignored.
+    """
+    if cache is None:
+        cache = HashCache()
+    by_size = defaultdict(list)
+    for rec in records:
+        if rec.size > 0:
+            by_size[(key(rec) if key else None, rec.size)].append(rec)
+    tied = [rec for group in by_size.values() if len(group) > 1 for rec in group]
+    if not tied:
+        return []
+
+    partials = _hash_all(tied, "partial", cache, jobs)
+    by_partial = defaultdict(list)
+    for rec, digest in partials.items():
+        by_partial[(key(rec) if key else None, rec.size, digest)].append(rec)
+
+    groups, need_full = [], []
+    for (_, size, _), group in by_partial.items():
+        if len(group) < 2:
+            continue
+        if size <= 2 * EDGE:
+            groups.append(group)
+        else:
+            need_full.extend(group)
+    if need_full:
+        fulls = _hash_all(need_full, "full", cache, jobs)
+        by_full = defaultdict(list)
+        for rec, digest in fulls.items():
+            by_full[(key(rec) if key else None, rec.size, digest)].append(rec)
+        groups.extend(g for g in by_full.values() if len(g) > 1)
+    cache.flush()
+    return groups
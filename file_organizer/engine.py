@@ -0,0 +1,199 @@
+# ================================
+# Background Organize Engine
+# ================================
+"""Runs scan and move work off the Tk thread on a bounded worker pool.
+
+Workers never touch Tk. Everything the GUI needs to know is put on
+``engine.events`` and drained on the Tk thread by :meth:`OrganizeEngine.poll`,
+which reschedules itself with ``root.after``. Progress is throttled in the
+engine and coalesced again by ``poll``, so the GUI redraws a few times a
+second however fast files are moved.
+
+Events are tuples:
+
+* ``("scanned", total)``          – the work list is known
+* ``("progress", done, total, stats)`` – at most ``progress_hz`` times a
+  second and once at the end; ``stats`` is a
+  :class:`~file_organizer.progress.Progress` with throughput and ETA
+* ``("error", item, exc)``        – an item raised
+* ``("done", results, cancelled)`` – ``results`` maps source -> destination
+"""
+
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from .mover import move_into, NameIndex
+from .progress import PROGRESS_HZ, ProgressMeter, item_size
+
+# Moves are I/O bound, so more workers than cores is fine; renames inside
+# one filesystem are cheap metadata operations that parallelise well.
+DEFAULT_JOBS = min(32, (os.cpu_count() or 1) + 4)
+
+
+def move_job(target_dir_for, undo_batch=None):
+    """Wrap ``target_dir_for(record) -> dir or None`` into an engine work function.
+
+    Each call builds one :class:`NameIndex`, so every target folder is listed
+    once per run no matter how many files land in it. With an ``undo_batch``
+    every move is recorded in the persistent undo log before it happens.
+    """
+    names = NameIndex()
+
+    def work(rec):
+        target_dir = target_dir_for(rec)
+        # Files already sitting in their target folder stay where they are
+        if target_dir is None or target_dir == os.path.dirname(rec.path):
+            return None
+        before_move = None
+        if undo_batch is not None:
+            before_move = lambda target_path: undo_batch.intent(rec, target_path)
+        return rec.path, move_into(rec.path, target_dir, rec.name, names, before_move)
+    return work
+
+
+class OrganizeEngine:
+    def __init__(self, jobs=DEFAULT_JOBS, progress_hz=PROGRESS_HZ):
+        self.jobs = max(1, int(jobs))
+        self.progress_hz = progress_hz
+        self.events = queue.Queue()
+        self._cancel = threading.Event()
+        self._running = threading.Event()
+        self._running.set()
+        self._thread = None
+
+    # --------------------------
+    # Control (called from the Tk thread)
+    # --------------------------
+    @property
+    def busy(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    @property
+    def paused(self):
+        return not self._running.is_set()
+
+    def start(self, items, work):
+        """Run ``work(item)`` for every item in the background.
+
+        ``items`` may be a zero-argument callable (e.g. a folder scan); it is
+        then called on the background thread so the walk does not block Tk.
+        ``work`` returns ``(src, dst)`` for a completed move or ``None``;
+        an item standing for several files (a ``files`` attribute) returns a
+        list of them, and counts as that many files in progress events.
+        """
+        if self.busy:
+            raise RuntimeError("An organize job is already running")
+        self._cancel.clear()
+        self._running.set()
+        self.events = queue.Queue()
+        self._thread = threading.Thread(target=self._run, args=(items, work), daemon=True)
+        self._thread.start()
+
+    def pause(self):
+        self._running.clear()
+
+    def resume(self):
+        self._running.set()
+
+    def cancel(self):
+        self._cancel.set()
+        self._running.set()  # wake paused workers so they can exit
+
+    def wait(self, timeout=None):
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    # --------------------------
+    # Tk side
+    # --------------------------
+    def poll(self, widget, on_event, interval=50):
+        """Drain events on the Tk thread every ``interval`` ms until ``done``.
+
+        Of several progress events waiting in one tick only the latest is
+        delivered.
+        """
+        events = self.events
+
+        def tick():
+            latest = None
+            while True:
+                try:
+                    event = events.get_nowait()
+                except queue.Empty:
+                    break
+                if event[0] == "progress":
+                    latest = event
+                    continue
+                if latest is not None:
+                    on_event(latest)
+                    latest = None
+                on_event(event)
+                if event[0] == "done":
+                    return
+            if latest is not None:
+                on_event(latest)
+            widget.after(interval, tick)
+
+        widget.after(interval, tick)
+
+    # --------------------------
+    # Worker side
+    # --------------------------
+    def _checkpoint(self):
+        """Block while paused; return False once cancelled."""
+        self._running.wait()
+        return not self._cancel.is_set()
+
+    def _call(self, work, item):
+        if not self._checkpoint():
+            return None
+        return work(item)
+
+    def _run(self, items, work):
+        events = self.events
+        results = {}
+        try:
+            if callable(items):
+                items = items()
+            items = list(items)
+            total = sum(getattr(item, "files", 1) for item in items)
+            events.put(("scanned", total))
+            meter = ProgressMeter(total, self.progress_hz)
+            # Bound the queue of submitted-but-unfinished items so a huge
+            # folder does not turn into millions of pending futures.
+            window = self.jobs * 4
+            pending = {}
+
+            def collect(finished):
+                for fut in finished:
+                    item = pending.pop(fut)
+                    try:
+                        result = fut.result()
+                    except Exception as e:
+                        events.put(("error", item, e))
+                    else:
+                        if isinstance(result, list):
+                            results.update((r[0], r[1]) for r in result)
+                        elif result is not None:
+                            results[result[0]] = result[1]
+                    if meter.add(getattr(item, "files", 1), item_size(item)):
+                        events.put(("progress", meter.done, total, meter.snapshot()))
+
+            with ThreadPoolExecutor(max_workers=self.jobs) as pool:
+                for item in items:
+                    if not self._checkpoint():
+                        break
+                    if len(pending) >= window:
+                        finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                        collect(finished)
+                    pending[pool.submit(self._call, work, item)] = item
+                finished, _ = wait(pending)
+                collect(finished)
+            events.put(("progress", meter.done, total, meter.snapshot()))
+        except Exception as e:
+            events.put(("error", None, e))
+        finally:
+            # Whatever happened, the consumer waiting for "done" must get it
+            events.put(("done", results, self._cancel.is_set()))
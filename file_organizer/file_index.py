@@ -0,0 +1,289 @@
+# ================================
+# Persistent File Index
+# ================================
+"""SQLite index of scanned folders with incremental rescans.
+
+Each directory row remembers the ``st_mtime_ns``/``st_ino``/``st_dev`` it had
+when it was last listed. A rescan stats every directory once; a directory
+whose stat is unchanged has had no entries added, removed or renamed, so its
+files come straight from the database instead of being listed and stat'ed
+again. Only changed directories are re-listed.
+
+A file rewritten in place does not touch its directory's mtime, so its
+cached size/mtime can go stale; ``refresh(..., full=True)`` re-lists
+everything.
+"""
+
+import os
+import threading
+import time
+
+from .scanner import FileRecord
+from .packing import PACK_FILES, pack_files
+from .sharding import SHARD_MARKER
+from .throttle import get_budget
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS dirs (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    parent INTEGER,
+    mtime_ns INTEGER,
+    ino INTEGER,
+    dev INTEGER
+);
+CREATE INDEX IF NOT EXISTS dirs_parent ON dirs(parent);
+CREATE TABLE IF NOT EXISTS files (
+    dir INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    ext TEXT NOT NULL,
+    size INTEGER,
+    mtime REAL,
+    ino INTEGER,
+    dev INTEGER,
+    category TEXT,
+    PRIMARY KEY (dir, name)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS files_mtime ON files(mtime);
+CREATE INDEX IF NOT EXISTS files_ext ON files(ext);
+CREATE INDEX IF NOT EXISTS files_category ON files(category);
+"""
+
+# A directory modified this recently may change again within the same
+# mtime tick, so it is never trusted as unchanged on the next rescan.
+RACY_SECONDS = 2.0
+
+
+class FileIndex:
+    def __init__(self, db_path, category_index=None):
+        self.db_path = db_path
+        self.category_index = category_index
+        self._local = threading.local()
+
+    @property
+    def db(self):
+        # sqlite3 connections are per thread; scans run on worker threads
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            import sqlite3  # only when an index is actually used
+            conn = sqlite3.connect(self.db_path)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(SCHEMA)
+            self._local.conn = conn
+        return conn
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    # --------------------------
+    # Categories
+    # --------------------------
+    def _category(self, name, ext):
+        if self.category_index is None:
+            return None
+        return self.category_index.classify(name, ext)
+
+    def _sync_categories(self):
+        """Re-classify cached rows when TYPES changed since they were stored."""
+        if self.category_index is None:
+            return
+        db = self.db
+        signature = repr(sorted(self.category_index.by_ext.items()))
+        row = db.execute("SELECT value FROM meta WHERE key = 'types'").fetchone()
+        if row is not None and row[0] == signature:
+            return
+        rows = db.execute("SELECT dir, name, ext FROM files").fetchall()
+        db.executemany("UPDATE files SET category = ? WHERE dir = ? AND name = ?",
+                       [(self._category(name, ext), d, name) for d, name, ext in rows])
+        db.execute("INSERT OR REPLACE INTO meta VALUES ('types', ?)", (signature,))
+        db.commit()
+
+    # --------------------------
+    # Incremental scan
+    # --------------------------
+    def _drop_subtree(self, dir_id):
+        db = self.db
+        ids = [r[0] for r in db.execute(
+            "WITH RECURSIVE sub(id) AS (SELECT ? UNION ALL "
+            "SELECT d.id FROM dirs d JOIN sub ON d.parent = sub.id) SELECT id FROM sub",
+            (dir_id,))]
+        db.executemany("DELETE FROM files WHERE dir = ?", [(i,) for i in ids])
+        db.executemany("DELETE FROM dirs WHERE id = ?", [(i,) for i in ids])
+
+    def _cached_files(self, dir_id, path):
+        join = os.path.join
+        return [FileRecord(join(path, name), name, ext, size, mtime, ino, dev)
+                for name, ext, size, mtime, ino, dev in self.db.execute(
+                    "SELECT name, ext, size, mtime, ino, dev FROM files WHERE dir = ?", (dir_id,))]
+
+    def _relist(self, path, parent_id, dir_id, st):
+        """List one directory, store it, and return ``(records, subdirs)``."""
+        db = self.db
+        records, subdirs, pack_names = [], [], []
+        with os.scandir(path) as it:
+            for entry in it:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirs.append(entry.path)
+                        continue
+                    if not entry.is_file() or entry.name == SHARD_MARKER:
+                        continue
+                    if entry.name in PACK_FILES:
+                        pack_names.append(entry.name)
+                    fst = entry.stat(follow_symlinks=False)
+                except OSError:
+                    continue
+                name = entry.name
+                records.append(FileRecord(entry.path, name, os.path.splitext(name)[1].lower(),
+                                          fst.st_size, fst.st_mtime, fst.st_ino, fst.st_dev))
+        if pack_names:
+            packed = pack_files(pack_names)
+            records = [r for r in records if r.name not in packed]
+        mtime_ns = st.st_mtime_ns
+        if time.time() - st.st_mtime < RACY_SECONDS:
+            mtime_ns = -1
+        if dir_id is None:
+            dir_id = db.execute(
+                "INSERT INTO dirs (path, parent, mtime_ns, ino, dev) VALUES (?, ?, ?, ?, ?)",
+                (path, parent_id, mtime_ns, st.st_ino, st.st_dev)).lastrowid
+        else:
+            db.execute("UPDATE dirs SET parent = ?, mtime_ns = ?, ino = ?, dev = ? WHERE id = ?",
+                       (parent_id, mtime_ns, st.st_ino, st.st_dev, dir_id))
+            db.execute("DELETE FROM files WHERE dir = ?", (dir_id,))
+            # Child folders that disappeared take their whole subtree with them
+            keep = set(subdirs)
+            for child_id, child_path in db.execute(
+                    "SELECT id, path FROM dirs WHERE parent = ?", (dir_id,)).fetchall():
+                if child_path not in keep:
+                    self._drop_subtree(child_id)
+        # Every child folder gets a row, also those this scan skips, so a
+        # later scan that does enter them finds them from the cached parent.
+        # No stamp yet: they are listed when first visited.
+        db.executemany("INSERT OR IGNORE INTO dirs (path, parent) VALUES (?, ?)",
+                       [(p, dir_id) for p in subdirs])
+        db.executemany("UPDATE dirs SET parent = ? WHERE path = ?", [(dir_id, p) for p in subdirs])
+        category = self._category
+        db.executemany(
+            "INSERT INTO files (dir, name, ext, size, mtime, ino, dev, category) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            [(dir_id, r.name, r.ext, r.size, r.mtime, r.ino, r.dev, category(r.name, r.ext))
+             for r in records])
+        return dir_id, records, subdirs
+
+    def iter_dirs(self, root, full=False, skip_dir=None, skip_file=None):
+        """Bring ``root`` up to date, yielding each directory's records.
+
+        Drop-in replacement for :func:`scanner.iter_dirs`: unchanged
+        directories cost one ``stat`` and a database read. Skipped folders
+        are neither entered nor refreshed; what the index already knows
+        about them is kept.
+        """
+        root = os.path.abspath(root)
+        db = self.db
+        self._sync_categories()
+        try:
+            yield from self._walk([(root, None)], full, skip_dir, skip_file)
+        finally:
+            db.commit()
+
+    def _walk(self, stack, full, skip_dir=None, skip_file=None):
+        db = self.db
+        budget = get_budget()
+        dirty = 0
+        while stack:
+            path, parent_id = stack.pop()
+            row = db.execute("SELECT id, mtime_ns, ino, dev, parent FROM dirs WHERE path = ?",
+                             (path,)).fetchone()
+            dir_id = row[0] if row else None
+            try:
+                st = os.stat(path)
+            except OSError:
+                if dir_id is not None:
+                    self._drop_subtree(dir_id)
+                continue
+            budget.take_ops(st.st_dev)
+            if (not full and row is not None and row[1] == st.st_mtime_ns
+                    and row[2] == st.st_ino and row[3] == st.st_dev):
+                if row[4] != parent_id and parent_id is not None:
+                    # First indexed as a root of its own, now seen from above
+                    db.execute("UPDATE dirs SET parent = ? WHERE id = ?", (parent_id, dir_id))
+                records = self._cached_files(dir_id, path)
+                subdirs = [p for (p,) in db.execute("SELECT path FROM dirs WHERE parent = ?", (dir_id,))]
+            else:
+                try:
+                    dir_id, records, subdirs = self._relist(path, parent_id, dir_id, st)
+                except OSError:
+                    continue
+                budget.take_ops(st.st_dev, 1 + len(records))
+                dirty += 1
+                if dirty >= 64:
+                    db.commit()
+                    dirty = 0
+            if skip_file is not None:
+                records = [r for r in records if not skip_file(r.path)]
+            if skip_dir is not None:
+                subdirs = [p for p in subdirs if not skip_dir(p)]
+            yield records
+            stack.extend((p, dir_id) for p in sorted(subdirs, reverse=True))
+
+    def refresh(self, root, full=False, skip_dir=None, skip_file=None):
+        """Update the index for ``root``; return the number of files."""
+        return sum(len(records) for records in self.iter_dirs(root, full, skip_dir, skip_file))
+
+    # --------------------------
+    # Queries
+    # --------------------------
+    def query(self, root, exts=None, date_from=None, date_to=None, category=None, batch_size=5000,
+              scan_filter=None):
+        """Yield lists of records under ``root`` matching the filters.
+
+        ``date_from``/``date_to`` are datetimes and ``exts`` lower-case
+        extensions, as taken by v3's ``preview_files``. All of them are
+        answered from the indexes on ``files``. Rows below folders a
+        :class:`~file_organizer.prune.ScanFilter` skips are left out.
+        """
+        root = os.path.abspath(root)
+        # Everything at or below root, as a range scan on the path index
+        sql = ["SELECT d.path, f.name, f.ext, f.size, f.mtime, f.ino, f.dev "
+               "FROM files f JOIN dirs d ON d.id = f.dir "
+               "WHERE (d.path = ? OR (d.path > ? AND d.path < ?))"]
+        prefix = root.rstrip(os.sep) + os.sep
+        args = [root, prefix, prefix[:-1] + chr(ord(os.sep) + 1)]
+        if exts:
+            exts = list(exts)
+            sql.append(f"AND f.ext IN ({', '.join('?' * len(exts))})")
+            args.extend(exts)
+        if date_from is not None:
+            sql.append("AND f.mtime >= ?")
+            args.append(date_from.timestamp())
+        if date_to is not None:
+            sql.append("AND f.mtime <= ?")
+            args.append(date_to.timestamp())
+        if category is not None:
+            sql.append("AND f.category = ?")
+            args.append(category)
+        cursor = self.db.execute(" ".join(sql), args)
+        join = os.path.join
+        skipped = {}  # dir path -> pruned, worked out once per folder
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                return
+            records = [FileRecord(join(path, name), name, ext, size, mtime, ino, dev)
+                       for path, name, ext, size, mtime, ino, dev in rows]
+            if scan_filter is not None:
+                kept = []
+                for rec in records:
+                    parent = os.path.dirname(rec.path)
+                    if parent not in skipped:
+                        skipped[parent] = scan_filter.skip_tree(parent)
+                    if skipped[parent] or (scan_filter.skip_file is not None
+                                           and scan_filter.skip_file(rec.path)):
+                        continue
+                    kept.append(rec)
+                records = kept
+            yield records
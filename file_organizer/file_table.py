@@ -0,0 +1,299 @@
+# ================================
+# Compact File Table
+# ================================
+"""Columnar, array-backed storage for very large scans.
+
+A list of :class:`FileRecord` costs a few hundred bytes per file, mostly
+in per-object overhead and one full path string each. :class:`FileTable`
+keeps one row per file in typed ``array`` columns instead:
+
+* the parent folder as an id into a table of directory paths
+* the name as UTF-8 bytes in one shared buffer
+* extension and category as small ids into interned tables
+* size, mtime and inode as plain numbers; the device is kept per folder
+
+That is about 50 bytes plus the name per file, so 10M files fit in a few
+hundred MB. A record, and its path, is only rebuilt when a row is read.
+:meth:`FileTable.select` filters whole columns at once, through NumPy when
+it is installed and with plain loops over the arrays otherwise.
+"""
+
+import os
+from array import array
+from collections.abc import Sequence
+
+from .scanner import FileRecord
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+NO_CATEGORY = -1
+
+
+class FileTable(Sequence):
+    def __init__(self, category_index=None):
+        self.category_index = category_index
+        self._dirs = []                 # dir id -> path
+        self._dir_ids = {}
+        self._dir_dev = array("Q")      # dir id -> st_dev
+        self._exts = []                 # ext id -> ".jpg"
+        self._ext_ids = {}
+        self._categories = []           # category id -> name
+        self._category_ids = {}
+        self._names = bytearray()
+        self._name_start = array("Q")
+        self._name_end = array("Q")
+        self.dir_id = array("I")
+        self.ext_id = array("I")
+        self.category = array("h")
+        self.size = array("q")
+        self.mtime = array("d")
+        self.ino = array("Q")
+        self.gone = set()               # rows deleted or packed since they were scanned
+
+    # --------------------------
+    # Interning
+    # --------------------------
+    def _dir(self, path, dev):
+        dir_id = self._dir_ids.get(path)
+        if dir_id is None:
+            dir_id = self._dir_ids[path] = len(self._dirs)
+            self._dirs.append(path)
+            self._dir_dev.append(dev)
+        return dir_id
+
+    def _ext(self, ext):
+        ext_id = self._ext_ids.get(ext)
+        if ext_id is None:
+            ext_id = self._ext_ids[ext] = len(self._exts)
+            self._exts.append(ext)
+        return ext_id
+
+    def _category(self, name, ext):
+        if self.category_index is None:
+            return NO_CATEGORY
+        category = self.category_index.classify(name, ext)
+        if category is None:
+            return NO_CATEGORY
+        category_id = self._category_ids.get(category)
+        if category_id is None:
+            category_id = self._category_ids[category] = len(self._categories)
+            self._categories.append(category)
+        return category_id
+
+    # --------------------------
+    # Writing
+    # --------------------------
+    def extend(self, records):
+        """Append records (e.g. one scan batch); return the new rows' ``range``."""
+        start = len(self.size)
+        split = os.path.split
+        for rec in records:
+            parent, name = split(rec.path)
+            self.dir_id.append(self._dir(parent, rec.dev))
+            self._name_start.append(len(self._names))
+            self._names += name.encode("utf-8", "surrogateescape")
+            self._name_end.append(len(self._names))
+            self.ext_id.append(self._ext(rec.ext))
+            self.category.append(self._category(name, rec.ext))
+            self.size.append(rec.size)
+            self.mtime.append(rec.mtime)
+            self.ino.append(rec.ino)
+        return range(start, len(self.size))
+
+    def relocate(self, moves, actions=None):
+        """Point rows at new paths from ``{old_path: new_path}``; return how many moved.
+
+        ``actions`` maps old paths to what happened when it was not a plain
+        rename, as in :func:`~file_organizer.plan.execute_job` results or
+        undo entries. A deleted or packed file is no longer a file of its
+        own: its row stays at the old path, in :attr:`gone`, and drops out
+        of :meth:`select`. A link, a copy to another device or a file put
+        back by undo is a new inode, so those rows are stat'ed again.
+        """
+        actions = actions or {}
+        wanted = {}
+        for old, new in moves.items():
+            parent, name = os.path.split(old)
+            dir_id = self._dir_ids.get(parent)
+            if dir_id is not None:
+                wanted.setdefault(dir_id, {})[name] = new
+        if not wanted:
+            return 0
+        devices = {}
+        moved = 0
+        for row in self._rows_in_dirs(wanted):
+            old_dir = self.dir_id[row]
+            old = os.path.join(self._dirs[old_dir], self.name(row))
+            new = wanted[old_dir].get(self.name(row))
+            if new is None:
+                continue
+            action = actions.get(old)
+            if action in ("delete", "pack") and new != old:
+                self.gone.add(row)
+                continue
+            parent, name = os.path.split(new)
+            dev = devices.get(parent)
+            if dev is None:
+                dev = devices[parent] = self._device(parent, self._dir_dev[old_dir])
+            if action is not None or row in self.gone or dev != self._dir_dev[old_dir]:
+                try:
+                    self.ino[row] = os.lstat(new).st_ino
+                except OSError:
+                    pass
+            self.gone.discard(row)
+            self.dir_id[row] = self._dir(parent, dev)
+            if name != self.name(row):
+                self._rename(row, name)
+            moved += 1
+        return moved
+
+    def _device(self, path, default):
+        dir_id = self._dir_ids.get(path)
+        if dir_id is not None:
+            return self._dir_dev[dir_id]
+        try:
+            return os.stat(path).st_dev
+        except OSError:
+            return default
+
+    def _rename(self, row, name):
+        # Names are append-only: the old bytes stay, the row points past them
+        self._name_start[row] = len(self._names)
+        self._names += name.encode("utf-8", "surrogateescape")
+        self._name_end[row] = len(self._names)
+
+    def reclassify(self, category_index):
+        """Recompute the category column after the categories changed."""
+        self.category_index = category_index
+        self._categories, self._category_ids = [], {}
+        exts = self._exts
+        for row in range(len(self.size)):
+            self.category[row] = self._category(self.name(row), exts[self.ext_id[row]])
+
+    # --------------------------
+    # Reading
+    # --------------------------
+    def __len__(self):
+        return len(self.size)
+
+    def name(self, row):
+        return self._names[self._name_start[row]:self._name_end[row]].decode("utf-8", "surrogateescape")
+
+    def path(self, row):
+        return os.path.join(self._dirs[self.dir_id[row]], self.name(row))
+
+    def category_of(self, row):
+        category_id = self.category[row]
+        return None if category_id == NO_CATEGORY else self._categories[category_id]
+
+    def __getitem__(self, row):
+        if isinstance(row, slice):
+            return [self[i] for i in range(*row.indices(len(self)))]
+        if row < 0:
+            row += len(self)
+        dir_id = self.dir_id[row]
+        name = self.name(row)
+        return FileRecord(os.path.join(self._dirs[dir_id], name), name, self._exts[self.ext_id[row]],
+                          self.size[row], self.mtime[row], self.ino[row], self._dir_dev[dir_id])
+
+    def nbytes(self):
+        """Approximate memory held by the columns and the name buffer."""
+        columns = (self.dir_id, self.ext_id, self.category, self.size, self.mtime, self.ino,
+                   self._name_start, self._name_end, self._dir_dev)
+        return (sum(c.itemsize * len(c) for c in columns) + len(self._names)
+                + sum(len(d) + 49 for d in self._dirs))
+
+    # --------------------------
+    # Column filters
+    # --------------------------
+    def select(self, exts=None, date_from=None, date_to=None, category=None, rows=None):
+        """Return the row numbers matching every given filter as an ``array``.
+
+        ``exts`` are lower-case extensions, ``date_from``/``date_to``
+        datetimes (compared as timestamps, no per-file datetime) and
+        ``category`` a category name. ``rows`` limits the search to a
+        ``range`` of rows, e.g. the batch just added.
+        """
+        if rows is None:
+            rows = range(len(self))
+        ext_ids = None
+        if exts:
+            ext_ids = {self._ext_ids[e] for e in exts if e in self._ext_ids}
+            if not ext_ids:
+                return array("Q")
+        category_id = None
+        if category is not None:
+            category_id = self._category_ids.get(category)
+            if category_id is None:
+                return array("Q")
+        ts_from = date_from.timestamp() if date_from else None
+        ts_to = date_to.timestamp() if date_to else None
+        if numpy is not None:
+            selected = self._select_numpy(rows, ext_ids, ts_from, ts_to, category_id)
+            return self._present(selected)
+
+        selected = rows
+        if ext_ids is not None:
+            column = self.ext_id
+            selected = [i for i in selected if column[i] in ext_ids]
+        if category_id is not None:
+            column = self.category
+            selected = [i for i in selected if column[i] == category_id]
+        if ts_from is not None:
+            column = self.mtime
+            selected = [i for i in selected if column[i] >= ts_from]
+        if ts_to is not None:
+            column = self.mtime
+            selected = [i for i in selected if column[i] <= ts_to]
+        return self._present(array("Q", selected))
+
+    def _present(self, rows):
+        gone = self.gone
+        return array("Q", (r for r in rows if r not in gone)) if gone else rows
+
+    def _select_numpy(self, rows, ext_ids, ts_from, ts_to, category_id):
+        start, stop = rows.start, rows.stop
+        mask = numpy.ones(stop - start, dtype=bool)
+        if ext_ids is not None:
+            column = numpy.frombuffer(self.ext_id, dtype=numpy.uint32)[start:stop]
+            mask &= numpy.isin(column, numpy.fromiter(ext_ids, dtype=numpy.uint32))
+        if category_id is not None:
+            mask &= numpy.frombuffer(self.category, dtype=numpy.int16)[start:stop] == category_id
+        if ts_from is not None or ts_to is not None:
+            column = numpy.frombuffer(self.mtime, dtype=numpy.float64)[start:stop]
+            if ts_from is not None:
+                mask &= column >= ts_from
+            if ts_to is not None:
+                mask &= column <= ts_to
+        # Copy out so no NumPy view keeps the columns from growing
+        return array("Q", (numpy.flatnonzero(mask) + start).astype(numpy.uint64).tobytes())
+
+    def _rows_in_dirs(self, dir_ids):
+        if numpy is not None and len(self):
+            column = numpy.frombuffer(self.dir_id, dtype=numpy.uint32)
+            found = numpy.flatnonzero(numpy.isin(column, numpy.fromiter(dir_ids, dtype=numpy.uint32)))
+            return [int(i) for i in found]
+        column = self.dir_id
+        return [i for i in range(len(column)) if column[i] in dir_ids]
+
+
+class TableView(Sequence):
+    """Selected rows of a :class:`FileTable`, read as records on demand."""
+
+    def __init__(self, table, rows=None):
+        self.table = table
+        self.rows = rows if rows is not None else array("Q")
+
+    def extend(self, rows):
+        self.rows.extend(rows)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self.table[r] for r in self.rows[index]]
+        return self.table[self.rows[index]]
@@ -0,0 +1,113 @@
+# ================================
+# Operation Journal
+# ================================
+"""Buffered move log with one long-lived file handle.
+
+Records are collected in memory and written in batches, so logging a move no
+longer costs an open/write/close. How hard the journal pushes data to disk is
+set by the ``fsync`` policy:
+
+* ``"none"``     – leave it to the OS (fastest)
+* ``"batch"``    – fsync after every batch written
+* ``"interval"`` – fsync at most once every ``fsync_interval_ms``
+"""
+
+import datetime
+import json
+import os
+import threading
+import time
+
+from .metrics import get_metrics
+
+FORMATS = ("text", "jsonl")
+FSYNC_POLICIES = ("none", "batch", "interval")
+
+
+def format_text(ts, op, src, dst):
+    """The classic ``file_organizer_log.txt`` line."""
+    when = datetime.datetime.fromtimestamp(ts)
+    if op == "undo":
+        return f"{when} | Undo: {src} -> {dst}\n"
+    if op == "link":
+        return f"{when} | Linked duplicate: {src} -> {dst}\n"
+    if op == "delete":
+        return f"{when} | Deleted duplicate: {src} (kept {dst})\n"
+    return f"{when} | {src} -> {dst}\n"
+
+
+def format_jsonl(ts, op, src, dst):
+    return json.dumps({"ts": ts, "op": op, "src": src, "dst": dst}, ensure_ascii=False) + "\n"
+
+
+_FORMATTERS = {"text": format_text, "jsonl": format_jsonl}
+
+
+class Journal:
+    def __init__(self, path, fmt="text", fsync="none", batch_size=1024,
+                 flush_interval=0.5, fsync_interval_ms=1000):
+        if fmt not in FORMATS:
+            raise ValueError(f"Unknown journal format {fmt!r}, expected one of {FORMATS}")
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"Unknown fsync policy {fsync!r}, expected one of {FSYNC_POLICIES}")
+        self.path = path
+        self.fsync = fsync
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.fsync_interval = fsync_interval_ms / 1000.0
+        self._format = _FORMATTERS[fmt]
+        self._pending = []
+        self._lock = threading.Lock()
+        self._file = None
+        self._last_flush = self._last_fsync = time.monotonic()
+
+    def record(self, op, src, dst):
+        """Queue one operation; safe to call from worker threads."""
+        entry = (time.time(), op, src, dst)
+        with self._lock:
+            self._pending.append(entry)
+            if (len(self._pending) >= self.batch_size
+                    or time.monotonic() - self._last_flush >= self.flush_interval):
+                self._flush_locked()
+
+    def record_result(self, result):
+        """Queue what an engine work function returned: one ``(src, dst, op)``
+        or, for a packed chunk, a list of them."""
+        for src, dst, op in result if isinstance(result, list) else (result,):
+            self.record(op, src, dst)
+
+    def flush(self):
+        with self._lock:
+            self._flush_locked()
+
+    def close(self):
+        with self._lock:
+            self._flush_locked()
+            if self._file is not None:
+                if self.fsync != "none":
+                    os.fsync(self._file.fileno())
+                self._file.close()
+                self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _flush_locked(self):
+        now = time.monotonic()
+        self._last_flush = now
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, []
+        with get_metrics().timer("journal_flush_seconds"):
+            if self._file is None:
+                self._file = open(self.path, "a", encoding="utf-8", buffering=1 << 16)
+            fmt = self._format
+            self._file.write("".join(fmt(*entry) for entry in batch))
+            self._file.flush()
+            if self.fsync == "batch" or (
+                    self.fsync == "interval" and now - self._last_fsync >= self.fsync_interval):
+                os.fsync(self._file.fileno())
+                self._last_fsync = now
@@ -0,0 +1,269 @@
+# ================================
+# Run Metrics
+# ================================
+"""Counters, latency histograms and error events for organize runs.
+
+The engine modules report into the *active* :class:`Metrics` (see
+:func:`set_metrics`); a run installs a fresh one and reads it afterwards as
+an end-of-run :meth:`~Metrics.summary` or a Prometheus text file. Errors are
+structured events counted by operation and errno instead of bare prints.
+
+:func:`profiled` wraps a run in cProfile (every thread) or tracemalloc.
+"""
+
+import bisect
+import errno as errno_names
+import json
+import math
+import os
+import sys
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+# Seconds; the last bucket is +Inf
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+           0.25, 0.5, 1.0, 2.5, 5.0, 10.0, math.inf)
+MAX_EVENTS = 1000
+PREFIX = "file_organizer_"
+
+
+class Histogram:
+    __slots__ = ("counts", "total", "count")
+
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(BUCKETS, value)] += 1
+        self.total += value
+        self.count += 1
+
+    def quantile(self, q):
+        """Upper bucket bound holding the ``q`` quantile."""
+        if not self.count:
+            return 0.0
+        seen, target = 0, q * self.count
+        for bound, n in zip(BUCKETS, self.counts):
+            seen += n
+            if seen >= target:
+                return bound
+        return math.inf
+
+
+def _labels(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Metrics:
+    """Thread-safe metrics of one run.
+
+    ``event_stream`` (e.g. ``sys.stderr``) gets every error event as a JSON
+    line as it happens.
+    """
+
+    def __init__(self, event_stream=None):
+        self.event_stream = event_stream
+        self.started = time.time()
+        self._lock = threading.Lock()
+        self._counters = defaultdict(float)
+        self._histograms = {}
+        self.events = []
+
+    # --------------------------
+    # Recording
+    # --------------------------
+    def inc(self, name, value=1, **labels):
+        with self._lock:
+            self._counters[(name, _labels(labels))] += value
+
+    def observe(self, name, seconds, **labels):
+        key = (name, _labels(labels))
+        with self._lock:
+            hist = self._histograms.get(key)
+            if hist is None:
+                hist = self._histograms[key] = Histogram()
+            hist.observe(seconds)
+
+    @contextmanager
+    def timer(self, name, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def error(self, op, exc, path=None):
+        """Count a failure by operation and errno and keep it as an event."""
+        code = getattr(exc, "errno", None)
+        name = errno_names.errorcode.get(code, "") if code else ""
+        event = {"ts": time.time(), "op": op, "path": path, "errno": name or None,
+                 "error": type(exc).__name__, "message": str(exc)}
+        self.inc("errors_total", op=op, errno=name or type(exc).__name__)
+        with self._lock:
+            if len(self.events) < MAX_EVENTS:
+                self.events.append(event)
+        if self.event_stream is not None:
+            self.event_stream.write(json.dumps(event, ensure_ascii=False) + "\n")
+            self.event_stream.flush()
+        return event
+
+    # --------------------------
+    # Reading
+    # --------------------------
+    def counter(self, name, **labels):
+        with self._lock:
+            if labels:
+                return self._counters.get((name, _labels(labels)), 0)
+            return sum(v for (n, _), v in self._counters.items() if n == name)
+
+    def summary(self):
+        """Human readable end-of-run report."""
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted(self._histograms.items())
+        lines = [f"Run took {time.time() - self.started:.2f}s"]
+        for (name, labels), value in counters:
+            label = ",".join(f"{k}={v}" for k, v in labels)
+            shown = f"{value / (1024 * 1024):.1f} MiB" if name.startswith("bytes") else f"{value:g}"
+            lines.append(f"  {name}{'{' + label + '}' if label else ''}: {shown}")
+        for (name, labels), hist in histograms:
+            label = ",".join(f"{k}={v}" for k, v in labels)
+            lines.append(f"  {name}{'{' + label + '}' if label else ''}: n={hist.count} "
+                         f"total={hist.total:.3f}s p50<={hist.quantile(0.5) * 1000:g}ms "
+                         f"p99<={hist.quantile(0.99) * 1000:g}ms")
+        return "\n".join(lines)
+
+    def prometheus(self):
+        """The metrics in Prometheus text exposition format."""
+        def fmt(labels, extra=()):
+            items = list(labels) + list(extra)
+            if not items:
+                return ""
+            return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in items) + "}"
+
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted(self._histograms.items())
+        out, typed = [], set()
+        for (name, labels), value in counters:
+            metric = PREFIX + name
+            if metric not in typed:
+                typed.add(metric)
+                out.append(f"# TYPE {metric} counter")
+            out.append(f"{metric}{fmt(labels)} {value:g}")
+        for (name, labels), hist in histograms:
+            metric = PREFIX + name
+            if metric not in typed:
+                typed.add(metric)
+                out.append(f"# TYPE {metric} histogram")
+            seen = 0
+            for bound, n in zip(BUCKETS, hist.counts):
+                seen += n
+                le = "+Inf" if bound == math.inf else f"{bound:g}"
+                out.append(f"{metric}_bucket{fmt(labels, [('le', le)])} {seen}")
+            out.append(f"{metric}_sum{fmt(labels)} {hist.total:.6f}")
+            out.append(f"{metric}_count{fmt(labels)} {hist.count}")
+        return "\n".join(out) + "\n"
+
+    def write_prometheus(self, path):
+        """Write the text file atomically (for node_exporter's textfile collector)."""
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(self.prometheus())
+        os.replace(tmp, path)
+
+
+def item_path(item):
+    """Best path to report for an engine work item (record, move, undo entry)."""
+    path = getattr(item, "path", None) or getattr(item, "dst", None)
+    return path if path is not None else (None if item is None else str(item))
+
+
+# --------------------------
+# Active metrics
+# --------------------------
+# Errors go to stderr as JSON lines, where the scripts used to print them
+_active = Metrics(sys.stderr)
+
+
+def get_metrics():
+    return _active
+
+
+def set_metrics(metrics):
+    """Make ``metrics`` the one the engine reports into; return the previous one."""
+    global _active
+    previous, _active = _active, metrics
+    return previous
+
+
+# --------------------------
+# Profiling
+# --------------------------
+PROFILERS = ("cprofile", "tracemalloc")
+
+
+@contextmanager
+def profiled(kind=None, path=None):
+    """Profile the enclosed run; ``kind`` is ``None``, ``cprofile`` or ``tracemalloc``.
+
+    cProfile also covers threads started inside the block (the worker pool);
+    the stats go to ``path`` (pstats format). tracemalloc writes the top
+    allocation sites as text.
+    """
+    if kind is None:
+        yield
+        return
+    if kind == "cprofile":
+        import cProfile
+        import pstats
+        profiles = [cProfile.Profile()]
+        # From 3.12 cProfile runs on sys.monitoring, which is process wide:
+        # the one profiler already sees every thread, and a second one
+        # cannot be enabled. Before that each thread needs its own.
+        per_thread = sys.version_info < (3, 12)
+
+        def start_thread(*_):
+            # First profile event in a new thread: give it its own profiler
+            profile = cProfile.Profile()
+            profiles.append(profile)
+            sys.setprofile(None)
+            profile.enable()
+
+        if per_thread:
+            threading.setprofile(start_thread)
+        profiles[0].enable()
+        try:
+            yield
+        finally:
+            profiles[0].disable()
+            if per_thread:
+                threading.setprofile(None)
+            stats = pstats.Stats(profiles[0])
+            for profile in profiles[1:]:
+                profile.disable()
+                stats.add(profile)
+            stats.dump_stats(path or "file_organizer.prof")
+    elif kind == "tracemalloc":
+        import tracemalloc
+        tracemalloc.start(25)
+        try:
+            yield
+        finally:
+            snapshot = tracemalloc.take_snapshot()
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            with open(path or "file_organizer_tracemalloc.txt", "w", encoding="utf-8") as f:
+                f.write(f"Peak traced memory: {peak / 1024:.1f} KiB\n")
+                for stat in snapshot.statistics("lineno")[:50]:
+                    f.write(f"{stat}\n")
+    else:
+        raise ValueError(f"Unknown profiler {kind!r}, expected one of {PROFILERS}")
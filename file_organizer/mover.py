@@ -0,0 +1,280 @@
+# ================================
+# Mover
+# ================================
+"""Collision-safe moves that can run from several worker threads at once."""
+
+import ctypes
+import ctypes.util
+import errno
+import os
+import shutil
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from .metrics import get_metrics
+from .throttle import BYTES_CHUNK, get_budget
+
+# --------------------------
+# No-clobber rename
+# --------------------------
+_RENAME_NOREPLACE = 1
+_AT_FDCWD = -100
+_renameat2 = None
+
+if sys.platform.startswith("linux"):
+    try:
+        _libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        _renameat2 = _libc.renameat2
+        _renameat2.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_int, ctypes.c_char_p, ctypes.c_uint]
+        _renameat2.restype = ctypes.c_int
+    except (OSError, AttributeError):
+        _renameat2 = None
+
+
+# --------------------------
+# Cross-device copies
+# --------------------------
+COPY_CHUNK = 64 * 1024 * 1024       # bytes per copy syscall
+PARALLEL_COPY_MIN = 256 * 1024 * 1024  # files this big are split into ranges
+
+# Errors meaning "this kernel/filesystem cannot do that copy call"
+_FALLBACK_ERRNOS = {errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP,
+                    errno.ENOTSUP, errno.EBADF, errno.EPERM}
+
+_copy_streams = 4
+_range_streams = 1
+_copy_slots = threading.BoundedSemaphore(_copy_streams)
+
+
+def configure_copies(streams=None, range_streams=None):
+    """Set how many cross-device copies run at once, and into how many
+    concurrent ranges a single large file is split (1 = sequential)."""
+    global _copy_streams, _range_streams, _copy_slots
+    if streams is not None:
+        _copy_streams = max(1, int(streams))
+        _copy_slots = threading.BoundedSemaphore(_copy_streams)
+    if range_streams is not None:
+        _range_streams = max(1, int(range_streams))
+
+
+def _write_all(fd, data, offset):
+    view = memoryview(data)
+    while view:
+        n = os.pwrite(fd, view, offset)
+        view = view[n:]
+        offset += n
+
+
+def _copy_range(infd, outfd, offset, end, charge=None):
+    """Copy ``[offset, end)`` in the kernel where possible.
+
+    ``charge(n)`` is called after every chunk when an I/O budget is set.
+    """
+    chunk = COPY_CHUNK if charge is None else BYTES_CHUNK
+    if hasattr(os, "copy_file_range"):
+        try:
+            while offset < end:
+                n = os.copy_file_range(infd, outfd, min(chunk, end - offset), offset, offset)
+                if n == 0:
+                    return
+                offset += n
+                if charge is not None:
+                    charge(n)
+            return
+        except OSError as e:
+            if e.errno not in _FALLBACK_ERRNOS:
+                raise
+    while offset < end:
+        data = os.pread(infd, min(1 << 20, end - offset), offset)
+        if not data:
+            return
+        _write_all(outfd, data, offset)
+        offset += len(data)
+        if charge is not None:
+            charge(len(data))
+
+
+def _copy_stream(infd, outfd, charge=None):
+    """Plain read/write loop for platforms without ``pread``."""
+    while True:
+        data = os.read(infd, 1 << 20)
+        if not data:
+            return
+        view = memoryview(data)
+        while view:
+            view = view[os.write(outfd, view):]
+        if charge is not None:
+            charge(len(data))
+
+
+def copy_data(infd, outfd, size):
+    budget = get_budget()
+    charge = None
+    if budget.bytes_per_s:
+        # Bytes are read on one device and written on the other
+        devs = {os.fstat(infd).st_dev, os.fstat(outfd).st_dev}
+
+        def charge(n):
+            for dev in devs:
+                budget.take_bytes(dev, n)
+    if not hasattr(os, "pread"):
+        _copy_stream(infd, outfd, charge)
+        return
+    if _range_streams > 1 and size >= PARALLEL_COPY_MIN:
+        # Several streams on one big file; each range uses explicit offsets
+        os.ftruncate(outfd, size)
+        step = -(-size // _range_streams)
+        with ThreadPoolExecutor(max_workers=_range_streams) as pool:
+            for f in [pool.submit(_copy_range, infd, outfd, start, min(size, start + step), charge)
+                      for start in range(0, size, step)]:
+                f.result()
+        return
+    # Open-ended, so a file that grew since it was stat'ed is copied whole
+    _copy_range(infd, outfd, 0, sys.maxsize, charge)
+
+
+def copy_noreplace(src, dst, remove_source=True):
+    """Copy ``src`` to a new ``dst`` with a kernel copy, then remove ``src``.
+
+    The destination is created with ``O_EXCL``, so an existing file raises
+    ``FileExistsError`` instead of being overwritten. At most
+    ``streams`` copies (see :func:`configure_copies`) run at once.
+    """
+    with _copy_slots:
+        infd = os.open(src, os.O_RDONLY | getattr(os, "O_BINARY", 0))
+        try:
+            size = os.fstat(infd).st_size
+            outfd = os.open(dst, os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, "O_BINARY", 0), 0o666)
+            try:
+                copy_data(infd, outfd, size)
+            except BaseException:
+                os.close(outfd)
+                os.unlink(dst)
+                raise
+            os.close(outfd)
+        finally:
+            os.close(infd)
+    shutil.copystat(src, dst)
+    if remove_source:
+        os.unlink(src)
+
+
+def rename_noreplace(src, dst):
+    """Move a file to ``dst``, raising ``FileExistsError`` instead of overwriting."""
+    global _renameat2
+    if os.name == "nt":
+        try:
+            os.rename(src, dst)  # already refuses to replace an existing file
+        except OSError as e:
+            if getattr(e, "winerror", None) != 17:  # ERROR_NOT_SAME_DEVICE
+                raise
+            copy_noreplace(src, dst)
+        return
+    if _renameat2 is not None:
+        if _renameat2(_AT_FDCWD, os.fsencode(src), _AT_FDCWD, os.fsencode(dst), _RENAME_NOREPLACE) == 0:
+            return
+        err = ctypes.get_errno()
+        if err == errno.EXDEV:
+            copy_noreplace(src, dst)
+            return
+        if err not in (errno.EINVAL, errno.ENOSYS):
+            raise OSError(err, os.strerror(err), src, None, dst)
+        # Kernel or filesystem without RENAME_NOREPLACE: use link + unlink
+        if err == errno.ENOSYS:
+            _renameat2 = None
+    try:
+        os.link(src, dst)
+    except OSError as e:
+        if e.errno == errno.EXDEV:
+            copy_noreplace(src, dst)
+            return
+        if e.errno == errno.EEXIST:
+            raise
+        # Filesystem without hard links: best effort check, then rename
+        if os.path.lexists(dst):
+            raise FileExistsError(errno.EEXIST, os.strerror(errno.EEXIST), dst) from None
+        os.rename(src, dst)
+        return
+    os.unlink(src)
+
+
+# --------------------------
+# Destination name index
+# --------------------------
+class NameIndex:
+    """Names present in each target directory, loaded once per organize run.
+
+    Collisions are resolved against the in-memory set, with the next free
+    ``_{i}`` suffix remembered per name, so picking a target costs no
+    ``os.path.exists`` probes. Missing target directories are created the
+    first time they are seen, unless ``create_dirs`` is off (planning).
+    """
+
+    def __init__(self, create_dirs=True):
+        self.create_dirs = create_dirs
+        self._dirs = {}
+        self._lock = threading.Lock()
+
+    def _load(self, target_dir):
+        entry = self._dirs.get(target_dir)
+        if entry is None:
+            try:
+                with get_metrics().timer("dir_listing_seconds"):
+                    names = {os.path.normcase(n) for n in os.listdir(target_dir)}
+            except FileNotFoundError:
+                if self.create_dirs:
+                    with get_metrics().timer("mkdir_seconds"):
+                        os.makedirs(target_dir, exist_ok=True)
+                names = set()
+            entry = self._dirs[target_dir] = (names, {})
+        return entry
+
+    def claim(self, target_dir, name):
+        """Return a free path in ``target_dir`` for ``name`` and mark it taken."""
+        with self._lock:
+            names, next_suffix = self._load(target_dir)
+            key = os.path.normcase(name)
+            if key not in names:
+                names.add(key)
+                return os.path.join(target_dir, name)
+            base, extn = os.path.splitext(name)
+            i = next_suffix.get(key, 1)
+            while os.path.normcase(f"{base}_{i}{extn}") in names:
+                i += 1
+            next_suffix[key] = i + 1
+            candidate = f"{base}_{i}{extn}"
+            names.add(os.path.normcase(candidate))
+            return os.path.join(target_dir, candidate)
+
+
+def move_into(src, target_dir, name=None, names=None, before_move=None):
+    """Move ``src`` into ``target_dir`` without overwriting; return the new path.
+
+    ``names`` is the run's :class:`NameIndex`; a throwaway one is used when
+    moving a single file. ``before_move(target_path)`` is called right before
+    the rename, e.g. to write an undo intent record.
+    """
+    if names is None:
+        names = NameIndex()
+    name = name or os.path.basename(src)
+    while True:
+        target_path = names.claim(target_dir, name)
+        if before_move is not None:
+            before_move(target_path)
+        try:
+            rename_noreplace(src, target_path)
+        except FileExistsError:
+            # Someone else created it after we listed the folder; the name is
+            # now marked taken in the index, so the next claim moves past it
+            continue
+        return target_path
+
+
+def move_back(dest, orig):
+    """Undo a single move; return ``(dest, orig)`` or ``None`` if ``dest`` is gone."""
+    if not os.path.exists(dest):
+        return None
+    os.makedirs(os.path.dirname(orig), exist_ok=True)
+    shutil.move(dest, orig)
+    return dest, orig
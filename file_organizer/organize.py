@@ -0,0 +1,128 @@
+# ================================
+# Headless Organize
+# ================================
+"""Organize a folder without any GUI, e.g. from cron or another service."""
+
+import itertools
+import os
+import time
+
+from .categories import CategoryIndex
+from .engine import OrganizeEngine, DEFAULT_JOBS
+from .metrics import get_metrics, item_path
+from .plan import build_plan, prepare_plan, execute_job
+from .prune import ScanFilter
+from .rules import RULES, DEFAULT_TYPES, target_dir_for
+from .scanner import scan_folder
+from .sniff import with_content_types
+from .throttle import IOBudget
+
+
+def plan_moves(folder, rule="category", types=None, records=None, duplicates="rename",
+               jobs=DEFAULT_JOBS, hash_cache=None, layout=None, exclude=(), prune=True,
+               sniff=False, sniff_cache=None, pack=None):
+    """Scan ``folder`` and return the :class:`MovePlan` for ``rule``.
+
+    ``rule`` is one of :data:`~file_organizer.rules.RULES` or a rule spec
+    such as ``"category/{year}/{size_bucket}"``. ``layout`` is an optional
+    :class:`~file_organizer.sharding.ShardLayout`. The scan skips folders
+    earlier runs created unless ``prune`` is off, and paths matching
+    ``exclude`` (see :mod:`~file_organizer.prune`). With ``sniff``, files
+    the extension cannot place are classified by their first bytes (see
+    :mod:`~file_organizer.sniff`). ``pack`` is an optional
+    :class:`~file_organizer.packing.PackLayout` for small files.
+    """
+    folder = os.path.abspath(folder)
+    types = types or DEFAULT_TYPES
+    nested_dates = layout is not None and layout.nested_dates
+    index = CategoryIndex(types)
+    target_dir = target_dir_for(folder, rule, index, nested_dates)
+    if records is None:
+        scan_filter = ScanFilter(folder, types, exclude, prune, RULES + (rule,))
+        metrics = get_metrics()
+        with metrics.timer("phase_seconds", phase="scan"):
+            records = scan_folder(folder, skip_dir=scan_filter.skip_dir, skip_file=scan_filter.skip_file,
+                                  on_error=lambda e: metrics.error("scan", e, e.filename))
+        metrics.inc("files_total", len(records), phase="scan")
+    if sniff:
+        with get_metrics().timer("phase_seconds", phase="sniff"):
+            target_dir = with_content_types(target_dir, records, index, jobs, sniff_cache)
+    return build_plan(records, target_dir, rule, folder, duplicates, jobs, hash_cache, layout, pack)
+
+
+def _device(item):
+    # A planned move, or a chunk of files packed into one archive
+    return getattr(item, "rec", item).dev
+
+
+def _interleave_devices(moves):
+    """Round-robin ``moves`` over their source devices, keeping each device's order."""
+    queues = {}
+    for m in moves:
+        queues.setdefault(_device(m), []).append(m)
+    if len(queues) < 2:
+        return moves
+    lanes = list(queues.values())
+    return [m for row in itertools.zip_longest(*lanes) for m in row if m is not None]
+
+
+def execute_plan(plan, jobs=DEFAULT_JOBS, journal=None, undo_log=None, on_event=None,
+                 device_jobs=None):
+    """Apply a :class:`MovePlan` on the worker pool; return ``{src: dst}``.
+
+    Blocks until done. Failed moves are counted and logged in the active
+    :class:`~file_organizer.metrics.Metrics`; engine events (progress,
+    errors) are also passed to ``on_event`` as they arrive. ``device_jobs`` caps the moves in flight
+    per source device; moves are then interleaved across devices so every
+    device keeps some workers.
+    """
+    batch = undo_log.begin(root=plan.root, rule=plan.rule) if undo_log is not None else None
+    execute = execute_job(batch)
+    devices = IOBudget(in_flight=device_jobs) if device_jobs else None
+
+    def work(move):
+        if devices is not None:
+            with devices.op(_device(move)):
+                moved = execute(move)
+        else:
+            moved = execute(move)
+        if journal is not None:
+            journal.record_result(moved)
+        return moved
+
+    def prepare():
+        with get_metrics().timer("phase_seconds", phase="prepare"):
+            moves = prepare_plan(plan)
+        return _interleave_devices(moves) if devices is not None else moves
+
+    metrics = get_metrics()
+    engine = OrganizeEngine(jobs)
+    start = time.perf_counter()
+    engine.start(prepare, work)
+    while True:
+        event = engine.events.get()
+        if event[0] == "error":
+            metrics.error("move", event[2], item_path(event[1]))
+        if on_event is not None:
+            on_event(event)
+        if event[0] == "done":
+            break
+    metrics.observe("phase_seconds", time.perf_counter() - start, phase="execute")
+    moved = event[1]
+    if journal is not None:
+        journal.flush()
+    if batch is not None:
+        if moved:
+            batch.commit()
+        else:
+            batch.discard()
+    return moved
+
+
+def organize_folder(folder, rule="category", types=None, jobs=DEFAULT_JOBS,
+                    journal=None, undo_log=None, on_event=None, duplicates="rename", layout=None,
+                    exclude=(), prune=True, sniff=False, pack=None):
+    """Scan ``folder``, plan and move its files by ``rule``; return ``{src: dst}``."""
+    plan = plan_moves(folder, rule, types, duplicates=duplicates, jobs=jobs, layout=layout,
+                      exclude=exclude, prune=prune, sniff=sniff, pack=pack)
+    return execute_plan(plan, jobs, journal, undo_log, on_event)
@@ -0,0 +1,538 @@
+# ================================
+# Small-File Packing
+# ================================
+"""Pack small files into one archive per target folder instead of moving them.
+
+For millions of tiny files the cost of an organize is metadata, not bytes:
+every rename is a directory update on both ends. With a :class:`PackLayout`
+files below ``max_size`` are appended to ``packed.tar`` (or ``packed.zip``)
+inside their target folder (a category, date or size folder), then
+removed. Members are collected in memory and written with large sequential
+writes straight into the archive; nothing is copied to a temp file first.
+
+Next to each archive a sidecar index (``packed.tar.idx``, JSON lines)
+records every member's data offset and size, so a single file can be read
+back with one ``pread`` (:func:`read_member`) without walking the archive.
+The index is written after the archive data is on disk and before the
+sources are removed; a tar archive is only ever appended to from the end the
+index records, so a crash in between leaves nothing the index points at.
+
+Undo extracts members back to their original paths and marks them removed
+in the index, one append per archive; an archive whose members have all been
+extracted is deleted.
+"""
+
+import errno
+import json
+import os
+import tarfile
+import threading
+import time
+import zipfile
+from collections import namedtuple
+
+from .metrics import get_metrics
+from .throttle import get_budget
+
+PACK_FORMATS = ("tar", "zip")
+PACK_NAME = "packed"
+PACK_FILES = frozenset(f"{PACK_NAME}.{fmt}{idx}" for fmt in PACK_FORMATS for idx in ("", ".idx"))
+PACK_MAX_SIZE = 64 * 1024          # files smaller than this are packed
+PACK_CHUNK_FILES = 1024            # members per work item
+PACK_CHUNK_BYTES = 16 * 1024 * 1024
+PACK_WRITE = 1024 * 1024           # archive writes are at least this large, but for the last
+
+_BLOCK = tarfile.BLOCKSIZE
+_TAR_END = bytes(2 * _BLOCK)
+# A ustar header with every field but name, mode, size, mtime and checksum filled in
+_USTAR = bytearray(tarfile.TarInfo("x").tobuf(tarfile.USTAR_FORMAT))
+_USTAR[0:100] = bytes(100)
+_USTAR[148:156] = b" " * 8
+
+
+def index_path(archive):
+    return archive + ".idx"
+
+
+def pack_files(names):
+    """The names among ``names`` that belong to a packed archive.
+
+    ``packed.tar`` only counts as ours with its index next to it, and the
+    index only with its archive; anything else is an ordinary user file.
+    """
+    names = set(names)
+    return {n for n in names & PACK_FILES
+            if (n[:-len(".idx")] if n.endswith(".idx") else index_path(n)) in names}
+
+
+def member_path(archive, member):
+    """The path a packed file is reported at: ``Docs/packed.tar/notes.txt``."""
+    return os.path.join(archive, member)
+
+
+# --------------------------
+# Sidecar index
+# --------------------------
+class PackIndex:
+    """``member -> {"offset", "size", "mtime"}`` of one archive, plus the end
+    of its tar data."""
+
+    def __init__(self, archive):
+        self.archive = archive
+        self.members = {}
+        self.end = 0
+        self._stamp = None
+        self._removed = []  # extracted members not yet marked in the file
+        self._fd = None     # kept open for reads while extracting
+        self.lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        path = index_path(self.archive)
+        try:
+            f = open(path, encoding="utf-8")
+        except FileNotFoundError:
+            return
+        with f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue  # torn last line
+                if record.get("removed"):
+                    self.members.pop(record["name"], None)
+                else:
+                    self.members[record["name"]] = record
+                    self.end = max(self.end, record.get("end", 0))
+        self._stamp = _stamp(path)
+
+    def current(self):
+        """Whether the index file is unchanged since this object last saw it."""
+        return self._stamp == _stamp(index_path(self.archive))
+
+    def _append(self, records):
+        path = index_path(self.archive)
+        with open(path, "a", encoding="utf-8") as f:
+            f.write("".join(json.dumps(r, ensure_ascii=False) + "\n" for r in records))
+            f.flush()
+            os.fsync(f.fileno())
+        self._stamp = _stamp(path)
+
+    def add(self, records):
+        self._append(records)
+        for record in records:
+            self.members[record["name"]] = record
+            self.end = max(self.end, record.get("end", 0))
+
+    def remove(self, name):
+        """Forget a member; written out by :meth:`flush`."""
+        if self.members.pop(name, None) is not None:
+            self._removed.append(name)
+
+    def read(self, record):
+        """The bytes of one member, with a single ``pread``."""
+        if self._fd is None:
+            with self.lock:
+                if self._fd is None:
+                    self._fd = os.open(self.archive, os.O_RDONLY | getattr(os, "O_BINARY", 0))
+        if not hasattr(os, "pread"):
+            # Seek and read share the file position: one reader at a time
+            with self.lock:
+                return _pread(self._fd, record["size"], record["offset"])
+        return os.pread(self._fd, record["size"], record["offset"])
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def flush(self):
+        if self._removed:
+            self._append([{"name": n, "removed": True} for n in self._removed])
+            self._removed = []
+
+
+def _pread(fd, size, offset):
+    """``os.pread``, or a seek and read where it is missing (Windows)."""
+    if hasattr(os, "pread"):
+        return os.pread(fd, size, offset)
+    os.lseek(fd, offset, os.SEEK_SET)
+    parts = []
+    while size > 0:
+        part = os.read(fd, size)
+        if not part:
+            break
+        parts.append(part)
+        size -= len(part)
+    return b"".join(parts)
+
+
+def _stamp(path):
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return st.st_size, st.st_mtime_ns
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def open_index(archive):
+    """The (cached) :class:`PackIndex` of ``archive``."""
+    with _indexes_lock:
+        index = _indexes.get(archive)
+        if index is not None:
+            # Changed by another process? Our own appends happen under the lock
+            with index.lock:
+                if index.current():
+                    return index
+                index.close()
+        index = _indexes[archive] = PackIndex(archive)
+        return index
+
+
+def read_member(archive, member):
+    """Return the bytes of one packed file, or ``None`` if it is not in the index."""
+    index = open_index(archive)
+    record = index.members.get(member)
+    return None if record is None else index.read(record)
+
+
+# --------------------------
+# Planning
+# --------------------------
+class PackChunk(namedtuple("PackChunk", "archive moves")):
+    """Engine work item: up to :data:`PACK_CHUNK_FILES` moves into one archive."""
+    __slots__ = ()
+
+    @property
+    def path(self):
+        return self.archive
+
+    @property
+    def dev(self):
+        return self.moves[0].rec.dev
+
+    @property
+    def files(self):
+        return len(self.moves)
+
+    @property
+    def size(self):
+        return sum(m.rec.size for m in self.moves)
+
+
+class PackLayout:
+    """Which planned moves are packed, and into which archive.
+
+    ``only`` limits packing to target folders whose first folder below the
+    root is in it, e.g. ``("Docs", "Code")``; empty packs every folder.
+    """
+
+    def __init__(self, fmt="tar", max_size=PACK_MAX_SIZE, only=()):
+        if fmt not in PACK_FORMATS:
+            raise ValueError(f"Unknown pack format {fmt!r}, expected one of {PACK_FORMATS}")
+        self.fmt = fmt
+        self.max_size = max_size
+        self.only = {os.path.normcase(name) for name in only or ()}
+
+    def archive_for(self, target_dir):
+        return os.path.join(target_dir, f"{PACK_NAME}.{self.fmt}")
+
+    def _wanted(self, target_dir, root):
+        if not self.only:
+            return True
+        rel = os.path.relpath(target_dir, root) if root else os.path.basename(target_dir)
+        return os.path.normcase(rel.split(os.sep)[0]) in self.only
+
+    def pack_moves(self, moves, root=None):
+        """Turn small plain moves into ``"pack"`` moves.
+
+        A packed move's ``dst`` is :func:`member_path` and ``keep`` the
+        archive. Files another move links to stay ordinary files.
+        """
+        kept = {m.keep for m in moves if m.keep_planned}
+        members = {}  # archive -> names taken, from its index and this plan
+        result = []
+        for m in moves:
+            target_dir = os.path.dirname(m.dst)
+            if (m.action != "move" or m.rec.size >= self.max_size or m.dst in kept
+                    or not self._wanted(target_dir, root)):
+                result.append(m)
+                continue
+            archive = self.archive_for(target_dir)
+            names = members.get(archive)
+            if names is None:
+                names = members[archive] = {os.path.normcase(n) for n in open_index(archive).members}
+            name = _claim(names, os.path.basename(m.dst))
+            result.append(m._replace(dst=member_path(archive, name), action="pack", keep=archive,
+                                     conflict=m.conflict or name != m.rec.name))
+        return result
+
+
+def _claim(names, name):
+    base, extn = os.path.splitext(name)
+    candidate, i = name, 1
+    while os.path.normcase(candidate) in names:
+        candidate = f"{base}_{i}{extn}"
+        i += 1
+    names.add(os.path.normcase(candidate))
+    return candidate
+
+
+def pack_chunks(moves):
+    """Split the pack moves into one archive into :class:`PackChunk` work items."""
+    chunks, chunk, nbytes = [], [], 0
+    for m in moves:
+        if chunk and (len(chunk) >= PACK_CHUNK_FILES or nbytes + m.rec.size > PACK_CHUNK_BYTES):
+            chunks.append(PackChunk(m.keep, chunk))
+            chunk, nbytes = [], 0
+        chunk.append(m)
+        nbytes += m.rec.size
+    if chunk:
+        chunks.append(PackChunk(chunk[0].keep, chunk))
+    return chunks
+
+
+# --------------------------
+# Packing
+# --------------------------
+def _read_source(rec):
+    """``(data, stat)`` of a file to pack, or ``None`` if it changed since planning."""
+    fd = os.open(rec.path, os.O_RDONLY | getattr(os, "O_BINARY", 0))
+    try:
+        st = os.fstat(fd)
+        if st.st_size != rec.size or st.st_mtime != rec.mtime:
+            return None
+        parts, left = [], st.st_size
+        while left > 0:
+            part = os.read(fd, left)
+            if not part:
+                break
+            parts.append(part)
+            left -= len(part)
+        return b"".join(parts), st
+    finally:
+        os.close(fd)
+
+
+def _member_name(move):
+    return os.path.basename(move.dst)
+
+
+def _read_sources(chunk, on_error):
+    """Read every file of ``chunk``; ``[(move, data, stat)]``."""
+    budget = get_budget()
+    sources = []
+    for move in chunk.moves:
+        try:
+            with budget.op(move.rec.dev, move.rec.size):
+                source = _read_source(move.rec)
+        except OSError as e:
+            on_error(e, move)
+            continue
+        if source is not None:
+            sources.append((move, source[0], source[1]))
+    return sources
+
+
+def _ustar_header(name, size, mtime, mode):
+    """A plain ustar header, or ``None`` when the name needs a pax header."""
+    try:
+        raw = name.encode("ascii")
+    except UnicodeEncodeError:
+        return None
+    if len(raw) > 100 or size >= 8 ** 11:
+        return None
+    header = bytearray(_USTAR)
+    header[0:len(raw)] = raw
+    header[100:108] = b"%07o\0" % mode
+    header[124:136] = b"%011o\0" % size
+    header[136:148] = b"%011o\0" % max(0, min(int(mtime), 8 ** 11 - 1))
+    header[148:156] = b"%06o\0 " % sum(header)
+    return header
+
+
+def _tar_header(name, size, mtime, mode):
+    header = _ustar_header(name, size, mtime, mode)
+    if header is not None:
+        return header
+    info = tarfile.TarInfo(name)
+    info.size, info.mtime, info.mode = size, int(mtime), mode
+    return info.tobuf(tarfile.PAX_FORMAT, "utf-8", "surrogateescape")
+
+
+def _write_tar(chunk, sources, index):
+    fd = os.open(chunk.archive, os.O_RDWR | os.O_CREAT | getattr(os, "O_BINARY", 0), 0o666)
+    try:
+        offset = index.end  # anything past the indexed end is from an interrupted run
+        buf, records = bytearray(), []
+        for move, data, st in sources:
+            name = _member_name(move)
+            header = _tar_header(name, len(data), st.st_mtime, st.st_mode & 0o7777)
+            start = offset + len(buf) + len(header)
+            buf += header
+            buf += data
+            buf += bytes(-len(data) % _BLOCK)
+            records.append({"name": name, "offset": start, "size": len(data),
+                            "mtime": st.st_mtime, "end": offset + len(buf)})
+            if len(buf) >= PACK_WRITE:
+                offset += _pwrite(fd, buf, offset, chunk)
+                buf = bytearray()
+        buf += _TAR_END
+        offset += _pwrite(fd, buf, offset, chunk)
+        os.ftruncate(fd, offset)
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+    return records
+
+
+def _pwrite(fd, buf, offset, chunk):
+    get_budget().take_bytes(chunk.moves[0].rec.dev, len(buf))
+    view = memoryview(buf)
+    if not hasattr(os, "pwrite"):
+        # The archive fd is only written under the index lock
+        os.lseek(fd, offset, os.SEEK_SET)
+    while view:
+        written = os.pwrite(fd, view, offset) if hasattr(os, "pwrite") else os.write(fd, view)
+        view, offset = view[written:], offset + written
+    return len(buf)
+
+
+def _write_zip(chunk, sources, index):
+    packed, records = [], []
+    mode = "a" if os.path.exists(chunk.archive) else "w"
+    with open(chunk.archive, "r+b" if mode == "a" else "w+b", buffering=PACK_WRITE) as f:
+        with zipfile.ZipFile(f, mode, zipfile.ZIP_STORED) as zf:
+            for move, data, st in sources:
+                stamp = time.localtime(max(st.st_mtime, 315532800))[:6]  # zip dates start in 1980
+                info = zipfile.ZipInfo(_member_name(move), stamp)
+                info.external_attr = (st.st_mode & 0xFFFF) << 16
+                zf.writestr(info, data)
+                packed.append((move, info, st))
+        f.flush()
+        os.fsync(f.fileno())
+    # The data follows the local header, whose length is only known once written
+    fd = os.open(chunk.archive, os.O_RDONLY | getattr(os, "O_BINARY", 0))
+    try:
+        for _, info, st in packed:
+            header = _pread(fd, 30, info.header_offset)
+            start = (info.header_offset + 30 + int.from_bytes(header[26:28], "little")
+                     + int.from_bytes(header[28:30], "little"))
+            records.append({"name": info.filename, "offset": start, "size": info.file_size,
+                            "mtime": st.st_mtime})
+    finally:
+        os.close(fd)
+    return records
+
+
+def pack_job(undo_batch=None):
+    """Engine work function for :class:`PackChunk` items.
+
+    Returns ``[(src, member path, "pack")]`` for the files packed. Files
+    that changed since planning are left where they are.
+    """
+    metrics = get_metrics()
+    budget = get_budget()
+
+    def on_error(e, move):
+        metrics.error("pack", e, move.rec.path)
+
+    def work(chunk):
+        start = time.perf_counter()
+        # Read outside the lock; only appending to the archive is serialized
+        sources = _read_sources(chunk, on_error)
+        if not sources:
+            return []
+        index = open_index(chunk.archive)
+        with index.lock:
+            if index._stamp is None and os.path.exists(chunk.archive):
+                # Not one of ours (no index): never write into it
+                raise FileExistsError(errno.EEXIST, "Archive without an index", chunk.archive)
+            write = _write_tar if chunk.archive.endswith(".tar") else _write_zip
+            index.add(write(chunk, sources, index))
+        packed = [move for move, _, _ in sources]
+        if undo_batch is not None:
+            # Only members really in the archive, and before any source is
+            # removed: a crash leaves the sources or the members
+            for move in packed:
+                undo_batch.intent(move.rec, chunk.archive, "pack", _member_name(move))
+        results = []
+        for move in packed:
+            try:
+                budget.take_ops(move.rec.dev)
+                os.unlink(move.rec.path)
+            except OSError as e:
+                on_error(e, move)
+                continue
+            results.append((move.rec.path, move.dst, "pack"))
+        metrics.observe("op_seconds", time.perf_counter() - start, op="pack")
+        metrics.inc("files_total", len(results), phase="move", op="pack")
+        metrics.inc("bytes_moved_total", sum(m.rec.size for m in packed), op="pack")
+        return results
+    return work
+
+
+# --------------------------
+# Undo
+# --------------------------
+def unpack_member(archive, member, dst, size, mtime):
+    """Extract one member to ``dst`` (never overwriting) and drop it from the index.
+
+    Returns False when the member is missing or not the file expected.
+    Call :func:`settle_archive` when done.
+    """
+    index = open_index(archive)
+    record = index.members.get(member)
+    if record is None or record["size"] != size:
+        return False
+    data = index.read(record)
+    fd = os.open(dst, os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, "O_BINARY", 0), 0o666)
+    try:
+        view = memoryview(data)
+        while view:
+            view = view[os.write(fd, view):]
+    finally:
+        os.close(fd)
+    os.utime(dst, (mtime, mtime))
+    with index.lock:
+        index.remove(member)
+    return True
+
+
+def has_member(archive, member):
+    """Whether ``archive``'s index lists ``member``."""
+    if not os.path.exists(index_path(archive)):
+        return False
+    return member in open_index(archive).members
+
+
+def forget_member(archive, member):
+    """Drop a member whose source was never removed (an interrupted pack)."""
+    if os.path.exists(index_path(archive)):
+        index = open_index(archive)
+        with index.lock:
+            index.remove(member)
+
+
+def settle_archive(archive):
+    """Write out the members extracted so far; delete the archive and its
+    index once none are left."""
+    if not os.path.exists(index_path(archive)):
+        return
+    index = open_index(archive)
+    with index.lock:
+        index.close()
+        if index.members:
+            index.flush()
+            return
+        for path in (archive, index_path(archive)):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+    with _indexes_lock:
+        _indexes.pop(archive, None)
@@ -0,0 +1,428 @@
+# ================================
+# Move Plans
+# ================================
+"""Two-phase organize: build the whole move plan, then apply it.
+
+:func:`build_plan` decides every destination up front from the scan records,
+including the ``_N`` names collisions will get, without touching the
+filesystem beyond listing each target folder once. The plan can be shown,
+saved and diffed (JSON lines) before anything moves.
+
+:func:`prepare_plan` then creates every target folder once and orders the
+moves for the engine: same-device renames grouped by folder first,
+cross-device copies after them.
+
+With a duplicates policy other than ``"rename"``, files whose content already
+exists in their target folder (on disk or earlier in the same plan) are
+skipped, hard-linked to the copy that is kept, or deleted, instead of
+landing next to it as ``name_1``. With a
+:class:`~file_organizer.packing.PackLayout`, small files are packed into an
+archive in their target folder instead of being moved.
+"""
+
+import errno
+import json
+import os
+import threading
+import time
+from collections import namedtuple, defaultdict, Counter
+
+from .duplicates import find_duplicates
+from .metrics import get_metrics
+from .mover import NameIndex, rename_noreplace, copy_noreplace, move_into
+from .packing import PackChunk, pack_chunks, pack_files, pack_job
+from .scanner import FileRecord, make_record
+from .sharding import SHARD_MARKER, write_markers
+from .throttle import get_budget
+
+# How long a duplicate waits for the copy it links to before it is moved normally
+KEEP_WAIT = 60
+
+
+class PlannedMove(namedtuple("PlannedMove", "rec dst rule conflict cross_device action keep keep_planned "
+                                            "keep_ino keep_dev keep_mtime",
+                             defaults=(False, "move", None, False, None, None, None))):
+    """One planned operation.
+
+    ``action`` is ``"move"``, or for a duplicate ``"link"`` (``dst`` becomes a
+    hard link to ``keep``, the source is removed) or ``"delete"`` (the source
+    is removed; ``dst`` is ``keep``). ``keep_planned`` means ``keep`` is itself
+    a destination of this plan, and ``keep_ino``/``keep_dev``/``keep_mtime``
+    identify the kept file as it was planned. ``"pack"`` appends the file to
+    the archive ``keep``; ``dst`` is its path inside the archive.
+    """
+    __slots__ = ()
+
+    @property
+    def path(self):
+        return self.rec.path
+
+
+class MovePlan:
+    def __init__(self, root, rule, moves, shards=None):
+        self.root = root
+        self.rule = rule
+        self.moves = moves
+        # Target folders sharded for the first time or deeper: {dir: (width, levels)}
+        self.shards = shards or {}
+
+    def __len__(self):
+        return len(self.moves)
+
+    def __iter__(self):
+        return iter(self.moves)
+
+    @property
+    def duplicates(self):
+        """Moves that link to or delete a file whose content is kept elsewhere."""
+        return [m for m in self.moves if m.action in ("link", "delete")]
+
+    @property
+    def packed(self):
+        """Moves that pack the file into an archive."""
+        return [m for m in self.moves if m.action == "pack"]
+
+    @property
+    def conflicts(self):
+        """Moves that will be renamed because the name is already taken."""
+        return [m for m in self.moves if m.conflict]
+
+    def target_dirs(self):
+        return {os.path.dirname(m.dst) for m in self.moves}
+
+    def by_target_dir(self):
+        groups = {}
+        for m in self.moves:
+            groups.setdefault(os.path.dirname(m.dst), []).append(m)
+        return groups
+
+    # --------------------------
+    # Save / load
+    # --------------------------
+    def save(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(json.dumps({"root": self.root, "rule": self.rule, "shards": self.shards},
+                               ensure_ascii=False) + "\n")
+            for m in self.moves:
+                f.write(json.dumps({"src": m.rec.path, "dst": m.dst, "rule": m.rule,
+                                    "conflict": m.conflict, "size": m.rec.size,
+                                    "mtime": m.rec.mtime, "ino": m.rec.ino,
+                                    "dev": m.rec.dev, "action": m.action, "keep": m.keep,
+                                    "keep_planned": m.keep_planned, "keep_ino": m.keep_ino,
+                                    "keep_dev": m.keep_dev, "keep_mtime": m.keep_mtime},
+                                   ensure_ascii=False) + "\n")
+
+    @classmethod
+    def load(cls, path):
+        with open(path, encoding="utf-8") as f:
+            header = json.loads(f.readline())
+            moves = []
+            for line in f:
+                d = json.loads(line)
+                src = d["src"]
+                name = os.path.basename(src)
+                rec = FileRecord(src, name, os.path.splitext(name)[1].lower(),
+                                 d["size"], d["mtime"], d["ino"], d["dev"])
+                moves.append(PlannedMove(rec, d["dst"], d["rule"], d["conflict"],
+                                         action=d.get("action", "move"), keep=d.get("keep"),
+                                         keep_planned=d.get("keep_planned", False),
+                                         keep_ino=d.get("keep_ino"), keep_dev=d.get("keep_dev"),
+                                         keep_mtime=d.get("keep_mtime")))
+        shards = {d: tuple(depth) for d, depth in header.get("shards", {}).items()}
+        return cls(header["root"], header["rule"], moves, shards)
+
+
+def _existing_records(target_dir, sizes, skip):
+    """Files directly in ``target_dir`` whose size matches a planned file."""
+    found = []
+    try:
+        with os.scandir(target_dir) as it:
+            for entry in it:
+                try:
+                    if not entry.is_file(follow_symlinks=False) or entry.path in skip:
+                        continue
+                    st = entry.stat(follow_symlinks=False)
+                except OSError:
+                    continue
+                if st.st_size in sizes:
+                    found.append(make_record(entry.path, st))
+    except (FileNotFoundError, NotADirectoryError):
+        pass
+    return found
+
+
+def _find_keepers(targets, jobs, hash_cache):
+    """Map the path of every redundant planned file to the record kept instead.
+
+    Only files that end up in the same target folder are compared. A file
+    already in that folder is kept in preference to a planned one.
+    """
+    dir_of = {rec.path: target_dir for rec, target_dir in targets}
+    sizes = defaultdict(set)
+    for rec, target_dir in targets:
+        sizes[target_dir].add(rec.size)
+    existing = []
+    for target_dir, dir_sizes in sizes.items():
+        for rec in _existing_records(target_dir, dir_sizes, dir_of):
+            dir_of[rec.path] = target_dir
+            existing.append(rec)
+    order = {rec.path: i for i, (rec, _) in enumerate(targets)}
+    keepers = {}
+    for group in find_duplicates([rec for rec, _ in targets] + existing, jobs, hash_cache,
+                                 key=lambda rec: dir_of[rec.path]):
+        # Existing files first, then planned ones in plan order
+        group.sort(key=lambda rec: order.get(rec.path, -1))
+        for rec in group[1:]:
+            if rec.path in order:
+                keepers[rec.path] = group[0]
+    return keepers, order
+
+
+def _duplicate_moves(targets, keepers, order, planned_dst, names, duplicates, rule):
+    moves = []
+    for rec, target_dir in targets:
+        keeper = keepers.get(rec.path)
+        if keeper is None:
+            continue
+        keep_planned = keeper.path in order
+        keep = planned_dst[keeper.path] if keep_planned else keeper.path
+        kept = dict(keep=keep, keep_planned=keep_planned, keep_ino=keeper.ino,
+                    keep_dev=keeper.dev, keep_mtime=keeper.mtime)
+        if duplicates == "delete":
+            moves.append(PlannedMove(rec, keep, rule, False, action="delete", **kept))
+        else:
+            dst = names.claim(target_dir, rec.name)
+            moves.append(PlannedMove(rec, dst, rule, os.path.basename(dst) != rec.name,
+                                     action="link", **kept))
+    return moves
+
+
+def _rebalance_moves(layout, names, rule, planned):
+    """Move the files already in a folder sharded for the first time, or
+    deeper than before, into their new shards, so none are left behind."""
+    moves = []
+    for base_dir in layout.new_markers:
+        old_levels = layout.old_levels.get(base_dir, 0)
+        stack = [(base_dir, 0)]
+        while stack:
+            directory, depth = stack.pop()
+            try:
+                with os.scandir(directory) as it:
+                    found = list(it)
+            except (FileNotFoundError, NotADirectoryError):
+                continue
+            if depth < old_levels:
+                stack.extend((e.path, depth + 1) for e in found if e.is_dir(follow_symlinks=False))
+            entries = [e for e in found if e.is_file(follow_symlinks=False)
+                       and e.name != SHARD_MARKER and e.path not in planned]
+            # An archive and its index must stay side by side
+            packed = pack_files(e.name for e in entries)
+            for entry in entries:
+                if entry.name in packed:
+                    continue
+                target_dir = layout.place(base_dir, entry.name)
+                if target_dir == directory:
+                    continue
+                try:
+                    rec = make_record(entry.path, entry.stat(follow_symlinks=False))
+                except OSError:
+                    continue
+                dst = names.claim(target_dir, rec.name)
+                moves.append(PlannedMove(rec, dst, rule, os.path.basename(dst) != rec.name))
+    return moves
+
+
+def build_plan(records, target_dir_for, rule, root=None, duplicates="rename", jobs=8,
+               hash_cache=None, layout=None, pack=None):
+    """Compute every move for ``records`` without moving anything.
+
+    ``duplicates`` is one of ``rename`` (keep both as ``name_1``), ``skip``
+    (leave the duplicate where it is), ``hardlink`` or ``delete``. With a
+    :class:`~file_organizer.sharding.ShardLayout`, target folders that would
+    grow past its cap are fanned out into shard sub folders. With a
+    :class:`~file_organizer.packing.PackLayout`, small files are packed.
+    """
+    metrics = get_metrics()
+    start = time.perf_counter()
+    names = NameIndex(create_dirs=False)
+    targets = [(rec, target_dir_for(rec)) for rec in records]
+    if layout is not None:
+        incoming = Counter(target_dir for _, target_dir in targets)
+        targets = [(rec, target_dir if target_dir is None else
+                    layout.place(target_dir, rec.name, incoming[target_dir]))
+                   for rec, target_dir in targets]
+    # Files already sitting in their target folder stay where they are
+    targets = [(rec, target_dir) for rec, target_dir in targets
+               if target_dir is not None and target_dir != os.path.dirname(rec.path)]
+
+    keepers, order = {}, {}
+    if duplicates != "rename" and targets:
+        with metrics.timer("phase_seconds", phase="duplicates"):
+            keepers, order = _find_keepers(targets, jobs, hash_cache)
+
+    shards = dict(layout.new_markers) if layout is not None else None
+    moves, planned_dst = [], {}
+    for rec, target_dir in targets:
+        if rec.path in keepers:
+            continue
+        dst = names.claim(target_dir, rec.name)
+        planned_dst[rec.path] = dst
+        moves.append(PlannedMove(rec, dst, rule, os.path.basename(dst) != rec.name))
+    if duplicates != "skip":
+        moves.extend(_duplicate_moves(targets, keepers, order, planned_dst, names, duplicates, rule))
+    if shards:
+        moves.extend(_rebalance_moves(layout, names, rule, {rec.path for rec, _ in targets}))
+    if pack is not None:
+        moves = pack.pack_moves(moves, root)
+    plan = MovePlan(root, rule, moves, shards)
+    metrics.observe("phase_seconds", time.perf_counter() - start, phase="plan")
+    metrics.inc("files_total", len(plan), phase="plan")
+    metrics.inc("conflicts_total", len(plan.conflicts))
+    return plan
+
+
+def prepare_plan(plan):
+    """Create all target folders once; return the moves in execution order.
+
+    The device of each target folder is looked up once. Same-device moves
+    (plain renames) come first, grouped by folder; moves to another device
+    are flagged ``cross_device`` and scheduled after them. Files packed into
+    an archive follow as :class:`~file_organizer.packing.PackChunk` items.
+    Duplicates come last, after the files they link to.
+    """
+    metrics = get_metrics()
+    budget = get_budget()
+    write_markers(plan.shards)
+    renames, copies, packs, duplicates = [], [], [], []
+    for target_dir, moves in plan.by_target_dir().items():
+        budget.take_ops(moves[0].rec.dev, 2)  # mkdir and stat
+        if moves[0].action == "pack":
+            # target_dir is the archive: every move in it is a pack
+            with metrics.timer("mkdir_seconds"):
+                os.makedirs(os.path.dirname(target_dir), exist_ok=True)
+            packs.extend(pack_chunks(moves))
+            continue
+        with metrics.timer("mkdir_seconds"):
+            os.makedirs(target_dir, exist_ok=True)
+        dev = os.stat(target_dir).st_dev
+        for m in moves:
+            if m.action != "move":
+                duplicates.append(m)
+            elif m.rec.dev == dev:
+                renames.append(m)
+            else:
+                copies.append(m._replace(cross_device=True))
+    return renames + copies + packs + duplicates
+
+
+def execute_job(undo_batch=None):
+    """Engine work function that applies one :class:`PlannedMove`.
+
+    If the planned name was taken after planning, the file falls back to the
+    next free name in that folder. A duplicate is only linked or deleted
+    while both files are still the ones hashed at plan time; one whose kept
+    copy is missing or changed, that changed itself, or that cannot be
+    hard-linked is moved like any other file.
+
+    Returns ``(src, dst, action)``; the action is what really happened.
+    A :class:`~file_organizer.packing.PackChunk` returns a list of those.
+    """
+    names = NameIndex()
+    landed = {}  # planned dst -> moved successfully
+    settled = threading.Condition()
+
+    def intent(move, dst):
+        if undo_batch is not None:
+            undo_batch.intent(move.rec, dst, move.action, move.keep)
+
+    def move_file(move):
+        src = move.rec.path
+        intent(move, move.dst)
+        try:
+            if move.cross_device:
+                # Known to need a copy: skip the rename that would fail with EXDEV
+                copy_noreplace(src, move.dst)
+            else:
+                rename_noreplace(src, move.dst)
+            return src, move.dst, "move"
+        except FileExistsError:
+            before_move = None
+            if undo_batch is not None:
+                before_move = lambda target_path: undo_batch.intent(move.rec, target_path)
+            return src, move_into(src, os.path.dirname(move.dst), move.rec.name, names, before_move), "move"
+
+    def keep_ready(move):
+        if move.keep_planned:
+            with settled:
+                settled.wait_for(lambda: move.keep in landed, KEEP_WAIT)
+                if not landed.get(move.keep):
+                    return False
+        rec = move.rec
+        try:
+            st = os.stat(move.keep)
+            src = os.lstat(rec.path)
+        except OSError:
+            return False
+        if (src.st_dev, src.st_ino, src.st_size, src.st_mtime) != (rec.dev, rec.ino, rec.size, rec.mtime):
+            return False
+        if st.st_size != rec.size or (move.keep_mtime is not None and st.st_mtime != move.keep_mtime):
+            return False
+        # A copy to another device has a new inode; a rename keeps it
+        return move.keep_ino is None or st.st_dev != move.keep_dev or st.st_ino == move.keep_ino
+
+    def dedupe(move):
+        src = move.rec.path
+        if move.action == "delete":
+            intent(move, move.keep)
+            os.unlink(src)
+            return src, move.keep, "delete"
+        dst = move.dst
+        while True:
+            intent(move, dst)
+            try:
+                os.link(move.keep, dst)
+                break
+            except FileExistsError:
+                dst = names.claim(os.path.dirname(dst), move.rec.name)
+        os.unlink(src)
+        return src, dst, "link"
+
+    metrics = get_metrics()
+    budget = get_budget()
+    pack = pack_job(undo_batch)
+
+    def work(move):
+        if isinstance(move, PackChunk):
+            return pack(move)
+        start = time.perf_counter()
+        with budget.op(move.rec.dev):
+            result = apply(move)
+        op = result[2] if result[2] != "move" else ("copy" if move.cross_device else "rename")
+        metrics.observe("op_seconds", time.perf_counter() - start, op=op)
+        metrics.inc("files_total", phase="move", op=op)
+        if op in ("rename", "copy"):
+            metrics.inc("bytes_moved_total", move.rec.size, op=op)
+        return result
+
+    def apply(move):
+        if move.action == "move":
+            ok = False
+            try:
+                result = move_file(move)
+                ok = result[1] == move.dst
+                return result
+            finally:
+                with settled:
+                    landed[move.dst] = ok
+                    settled.notify_all()
+        if keep_ready(move):
+            try:
+                return dedupe(move)
+            except OSError as e:
+                # No hard links here (or across devices): fall back to a move
+                if move.action == "delete" or e.errno not in (errno.EXDEV, errno.EPERM, errno.EMLINK,
+                                                              errno.ENOTSUP, errno.EOPNOTSUPP):
+                    raise
+        return move_file(move._replace(action="move", keep=None, keep_planned=False,
+                                       keep_ino=None, keep_dev=None, keep_mtime=None))
+    return work
@@ -0,0 +1,111 @@
+# ================================
+# Progress Reporting
+# ================================
+"""Throttled progress: counts, bytes, throughput and ETA for a running job.
+
+Workers finish files far faster than a window can redraw, so the engine
+does not report every file. It adds each one to a :class:`ProgressMeter`
+and only emits a :class:`Progress` snapshot when ``1 / hz`` seconds have
+passed (15 times a second by default), plus once at the end. Front ends
+just render the latest snapshot: the Tk scripts set their progress bar and
+status line, the command line redraws one :class:`ProgressLine`.
+"""
+
+import collections
+import sys
+import threading
+import time
+
+PROGRESS_HZ = 15
+RATE_WINDOW = 3.0  # seconds of history behind files/s, MB/s and the ETA
+
+Progress = collections.namedtuple(
+    "Progress", "done total bytes elapsed files_per_s bytes_per_s eta")
+
+
+def item_size(item):
+    """Bytes a work item moves: a record, a planned move or an undo entry."""
+    size = getattr(getattr(item, "rec", item), "size", None)
+    return size if isinstance(size, int) else 0
+
+
+class ProgressMeter:
+    """Thread-safe counters with a rate limit on reporting."""
+
+    def __init__(self, total=0, hz=PROGRESS_HZ, clock=time.monotonic):
+        self.total = total
+        self.interval = 1.0 / hz if hz else 0.0
+        self._clock = clock
+        self._lock = threading.Lock()
+        self.done = self.bytes = 0
+        self._start = self._last_report = clock()
+        self._samples = collections.deque([(self._start, 0, 0)])
+
+    def add(self, files=1, nbytes=0):
+        """Count finished work; return True when a report is due."""
+        with self._lock:
+            self.done += files
+            self.bytes += nbytes
+            now = self._clock()
+            if now - self._last_report < self.interval:
+                return False
+            self._last_report = now
+            return True
+
+    def snapshot(self):
+        with self._lock:
+            now = self._clock()
+            done, nbytes = self.done, self.bytes
+            samples = self._samples
+            samples.append((now, done, nbytes))
+            while len(samples) > 2 and now - samples[1][0] >= RATE_WINDOW:
+                samples.popleft()
+        since, done_then, bytes_then = samples[0]
+        span = now - since
+        files_per_s = (done - done_then) / span if span > 0 else 0.0
+        bytes_per_s = (nbytes - bytes_then) / span if span > 0 else 0.0
+        eta = None
+        if files_per_s > 0 and self.total >= done:
+            eta = (self.total - done) / files_per_s
+        return Progress(done, self.total, nbytes, now - self._start, files_per_s, bytes_per_s, eta)
+
+
+def _duration(seconds):
+    minutes, seconds = divmod(int(seconds + 0.5), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02}:{seconds:02}" if hours else f"{minutes}:{seconds:02}"
+
+
+def format_progress(progress):
+    """One status line, e.g. ``1200/5000 files | 850 files/s | 12.4 MB/s | ETA 0:04``."""
+    parts = [f"{progress.done}/{progress.total} files", f"{progress.files_per_s:.0f} files/s"]
+    if progress.bytes:
+        parts.append(f"{progress.bytes_per_s / 1e6:.1f} MB/s")
+    if progress.eta is not None and progress.done < progress.total:
+        parts.append(f"ETA {_duration(progress.eta)}")
+    else:
+        parts.append(f"{_duration(progress.elapsed)} elapsed")
+    return " | ".join(parts)
+
+
+class ProgressLine:
+    """Redraw a single progress line on a terminal; silent when not a tty."""
+
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stderr
+        self.enabled = hasattr(self.stream, "isatty") and self.stream.isatty()
+        self._width = 0
+
+    def update(self, progress):
+        if not self.enabled:
+            return
+        text = format_progress(progress)
+        self.stream.write("\r" + text.ljust(self._width))
+        self.stream.flush()
+        self._width = len(text)
+
+    def finish(self):
+        if self.enabled and self._width:
+            self.stream.write("\n")
+            self.stream.flush()
+            self._width = 0
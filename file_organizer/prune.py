@@ -0,0 +1,104 @@
+# ================================
+# Scan Pruning
+# ================================
+"""Keep scans out of folders earlier organize runs produced.
+
+Re-running an organize used to walk every ``Images/``, ``Docs/``,
+``Small (<1MB)/`` and date folder again, so each run cost as much as the
+whole archive. :class:`ScanFilter` tells the scanner which sub folders of
+the organized root are rule outputs (category names, size folders,
+``YYYY-MM-DD`` and nested ``YYYY`` date folders; shards live inside those)
+and which paths match the user's exclude patterns. Downloads still in
+progress (``.crdownload``, ``.part``, ...) are skipped too unless asked for:
+moving one would break the download, or file half a file.
+
+Exclude patterns are globs (``*.part``, ``node_modules``, ``build/*``) or,
+with an ``re:`` prefix, regular expressions. All of them are compiled into
+one regex, matched against the name and the path relative to the root.
+"""
+
+import fnmatch
+import os
+import re
+
+from .rules import RULES, SIZE_FOLDERS, top_folders
+
+_DATE_FOLDER = re.compile(r"\d{4}(-\d{2}-\d{2})?\Z")
+
+# Files (and Safari's ``.download`` folders) a browser is still writing
+PARTIAL_EXTS = frozenset({".crdownload", ".download", ".part", ".partial", ".tmp"})
+
+
+def compile_patterns(patterns):
+    """Compile globs and ``re:`` regexes into one regex, or ``None``."""
+    parts = []
+    for pattern in patterns or ():
+        if pattern.startswith("re:"):
+            parts.append(f"(?:{pattern[3:]})\\Z")
+        else:
+            parts.append(fnmatch.translate(pattern))
+    if not parts:
+        return None
+    return re.compile("|".join(f"(?:{p})" for p in parts), re.IGNORECASE if os.name == "nt" else 0)
+
+
+def _partial(path):
+    return os.path.splitext(path)[1].lower() in PARTIAL_EXTS
+
+
+class ScanFilter:
+    """``skip_dir(path)`` / ``skip_file(path)`` predicates for one root.
+
+    ``rules`` lists the rules whose output folders are pruned; scripts that
+    only sort by category pass ``("category",)``. A rule spec in ``rules``
+    also prunes the literal folders it creates under the root. Partial
+    downloads are skipped unless ``skip_partial`` is off. ``skip_file`` is
+    ``None`` when there is nothing to skip per file, so plain scans pay
+    nothing for it.
+    """
+
+    def __init__(self, root, types=None, exclude=(), prune_outputs=True, rules=RULES,
+                 skip_partial=True):
+        self.root = os.path.abspath(root)
+        self.prune_outputs = prune_outputs
+        self.skip_partial = skip_partial
+        outputs = list(types or ()) if "category" in rules else []
+        if "size" in rules:
+            outputs.extend(SIZE_FOLDERS)
+        for rule in rules:
+            outputs.extend(top_folders(rule))
+        self._outputs = {os.path.normcase(name) for name in outputs}
+        self._dates = "date" in rules
+        self._exclude = compile_patterns(exclude)
+        self._prefix = len(self.root.rstrip(os.sep)) + 1
+        if self._exclude is None:
+            # Only the extension to look at: no path work per file
+            self.skip_file = _partial if skip_partial else None
+
+    def _excluded(self, path):
+        name = os.path.basename(path)
+        rel = path[self._prefix:].replace(os.sep, "/")
+        return bool(self._exclude.match(name) or self._exclude.match(rel))
+
+    def skip_dir(self, path):
+        path = os.path.abspath(path)
+        if self.prune_outputs and os.path.dirname(path) == self.root:
+            name = os.path.basename(path)
+            if os.path.normcase(name) in self._outputs or (self._dates and _DATE_FOLDER.match(name)):
+                return True
+        if self.skip_partial and _partial(path):
+            return True
+        return self._exclude is not None and self._excluded(path)
+
+    def skip_file(self, path):
+        if self.skip_partial and _partial(path):
+            return True
+        return self._excluded(os.path.abspath(path))
+
+    def skip_tree(self, directory):
+        """Whether ``directory`` or a folder above it (below the root) is skipped."""
+        while len(directory) >= self._prefix:
+            if self.skip_dir(directory):
+                return True
+            directory = os.path.dirname(directory)
+        return False
@@ -0,0 +1,253 @@
+# ================================
+# Organize Rules
+# ================================
+"""The category / date / size rules of File Organizer Ultimate Pro v3,
+and rule specs combining them.
+
+A rule spec is a folder template, optionally guarded by predicates, e.g.::
+
+    category/{year}/{size_bucket}
+    ext:.jpg,.png size>10MB => Photos/Large/{year}; age>365d => Archive/{year}; category
+
+Rules are separated by ``;`` and the first one whose predicates hold (and
+whose fields all resolve, i.e. the category is known) decides the folder;
+files no rule matches stay where they are. Template fields are
+``{category}``, ``{year}``, ``{month}``, ``{day}``, ``{date}``
+(``YYYY-MM-DD``), ``{size_bucket}`` and ``{ext}``; a bare ``category``,
+``date`` or ``size`` segment is the classic rule of that name. Predicates
+are ``ext:.a,.b``, ``glob:PATTERN``, ``category:A,B``, ``size<N`` /
+``size>N`` (``k``, ``MB``, ``G``... suffixes) and ``age<N`` / ``age>N``
+(``s``, ``m``, ``h``, ``d``, ``w``, ``y``).
+
+:func:`compile_rules` turns a rule spec into one plain function of a scan
+record, so the per-file cost is a few lookups whatever the spec. Date
+fields are worked out once per quarter hour of mtime, never with a
+``strftime`` per file.
+"""
+
+import datetime
+import fnmatch
+import os
+import re
+import string
+import time
+
+RULES = ("category", "date", "size")
+
+DEFAULT_TYPES = {
+    "Images": [".jpg", ".jpeg", ".png", ".gif", ".tiff", ".bmp"],
+    "Docs": [".pdf", ".docx", ".txt", ".pages", ".xlsx", ".pptx"],
+    "Videos": [".mp4", ".mov", ".avi", ".flv", ".mkv"],
+    "Audio": [".mp3", ".wav", ".aac"],
+    "Code": [".py", ".md", ".html", ".js", ".css", ".java"]
+}
+
+SIZE_FOLDERS = ("Small (<1MB)", "Medium (1-10MB)", "Large (>10MB)")
+
+FIELDS = ("category", "year", "month", "day", "date", "size_bucket", "ext")
+
+# A bare segment naming a classic rule stands for its field(s)
+_RULE_SEGMENTS = {"category": "{category}", "date": "{date}", "size": "{size_bucket}"}
+
+_SIZE_UNITS = {"": 1, "b": 1, "k": 1 << 10, "kb": 1 << 10, "m": 1 << 20, "mb": 1 << 20,
+               "g": 1 << 30, "gb": 1 << 30, "t": 1 << 40, "tb": 1 << 40}
+_AGE_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400, "w": 7 * 86400, "y": 365 * 86400}
+_COMPARISON = re.compile(r"(size|age)(<=|>=|<|>)(\d+(?:\.\d+)?)([a-z]*)\Z", re.IGNORECASE)
+
+# Every UTC offset is a whole number of quarter hours, so all mtimes in one
+# quarter hour fall on the same local day
+_DAY_BUCKET = 900
+_DAY_CACHE_MAX = 1 << 16
+
+
+class RuleError(ValueError):
+    """A rule spec that cannot be parsed."""
+
+
+def size_folder(size):
+    if size < 1024*1024:
+        return SIZE_FOLDERS[0]
+    elif size < 10*1024*1024:
+        return SIZE_FOLDERS[1]
+    return SIZE_FOLDERS[2]
+
+
+# --------------------------
+# Parsing
+# --------------------------
+def parse_rules(spec, nested_dates=False):
+    """Split a rule spec into ``[(predicate tokens, template segments)]``."""
+    rules = []
+    for text in spec.split(";"):
+        text = text.strip()
+        if not text:
+            continue
+        conditions, arrow, template = text.rpartition("=>")
+        if not arrow:
+            conditions, template = "", text
+        segments = []
+        for segment in template.strip().strip("/").split("/"):
+            segment = segment.strip()
+            if segment == "date" and nested_dates:
+                segments.extend(("{year}", "{month}", "{day}"))
+                continue
+            segment = _RULE_SEGMENTS.get(segment, segment)
+            if segment in ("", ".", ".."):
+                raise RuleError(f"Bad folder {segment!r} in rule {text!r}")
+            try:
+                fields = [f for _, f, _, _ in string.Formatter().parse(segment) if f is not None]
+            except ValueError as e:
+                raise RuleError(f"Bad folder {segment!r} in rule {text!r}: {e}") from None
+            for field in fields:
+                if field not in FIELDS:
+                    raise RuleError(f"Unknown field {{{field}}} in rule {text!r}, expected one of {FIELDS}")
+            segments.append(segment)
+        if not segments:
+            raise RuleError(f"Empty folder template in rule {text!r}")
+        rules.append((conditions.split(), segments))
+    if not rules:
+        raise RuleError("Empty rule spec")
+    return rules
+
+
+def top_folders(spec):
+    """Literal folder names a rule spec creates directly under the root."""
+    if spec in RULES:
+        return []
+    return sorted({segments[0] for _, segments in parse_rules(spec) if "{" not in segments[0]})
+
+
+# --------------------------
+# Compiling
+# --------------------------
+def _day_fields():
+    days = {}
+
+    def fields(mtime):
+        key = int(mtime // _DAY_BUCKET)
+        value = days.get(key)
+        if value is None:
+            if len(days) >= _DAY_CACHE_MAX:
+                days.clear()
+            d = datetime.date.fromtimestamp(mtime)
+            value = days[key] = (f"{d.year:04}", f"{d.month:02}", f"{d.day:02}", d.isoformat())
+        return value
+    return fields
+
+
+def _predicate(token, index, now):
+    kind, colon, arg = token.partition(":")
+    kind = kind.lower()
+    if colon and kind == "ext":
+        exts = frozenset(e if e.startswith(".") else "." + e for e in arg.lower().split(",") if e)
+        return lambda rec: rec.ext in exts
+    if colon and kind == "glob":
+        match = re.compile(fnmatch.translate(arg), re.IGNORECASE if os.name == "nt" else 0).match
+        return lambda rec: match(rec.name) is not None
+    if colon and kind == "category":
+        categories = frozenset(arg.split(","))
+        classify = index.classify
+        return lambda rec: classify(rec.name, rec.ext) in categories
+    m = _COMPARISON.match(token)
+    if m is None:
+        raise RuleError(f"Unknown condition {token!r}")
+    key, op, number, unit = m.group(1).lower(), m.group(2), float(m.group(3)), m.group(4).lower()
+    units = _SIZE_UNITS if key == "size" else _AGE_UNITS
+    if unit not in units:
+        raise RuleError(f"Unknown unit {unit!r} in {token!r}")
+    limit = number * units[unit]
+    if key == "size":
+        return {"<": lambda rec: rec.size < limit, "<=": lambda rec: rec.size <= limit,
+                ">": lambda rec: rec.size > limit, ">=": lambda rec: rec.size >= limit}[op]
+    # An age limit is an mtime threshold, fixed once at compile time
+    cutoff = now - limit
+    return {"<": lambda rec: rec.mtime > cutoff, "<=": lambda rec: rec.mtime >= cutoff,
+            ">": lambda rec: rec.mtime < cutoff, ">=": lambda rec: rec.mtime <= cutoff}[op]
+
+
+def _template(folder, segments, index, day):
+    """Return ``rec -> path or None`` for one template."""
+    # Positional format string, so each file costs one str.format call
+    prefix = os.path.join(folder, "").replace("{", "{{").replace("}", "}}")
+    parts, used = [prefix], []
+    for literal, field, spec, conversion in string.Formatter().parse(os.path.join(*segments)):
+        parts.append(literal.replace("{", "{{").replace("}", "}}"))
+        if field is not None:
+            if field not in used:
+                used.append(field)
+            parts.append("{%d%s%s}" % (used.index(field), "!" + conversion if conversion else "",
+                                       ":" + spec if spec else ""))
+    fmt = "".join(parts).format
+    if not used:
+        path = fmt()
+        return lambda rec: path
+    classify = index.classify
+    date_at = {"year": 0, "month": 1, "day": 2, "date": 3}
+    getters = []
+    for field in used:
+        if field == "category":
+            getters.append(lambda rec: classify(rec.name, rec.ext))
+        elif field in date_at:
+            getters.append(lambda rec, i=date_at[field]: day(rec.mtime)[i])
+        elif field == "size_bucket":
+            getters.append(lambda rec: size_folder(rec.size))
+        else:
+            getters.append(lambda rec: rec.ext[1:] or "no_ext")
+
+    if len(getters) == 1:
+        get = getters[0]
+
+        def single(rec):
+            value = get(rec)
+            return None if value is None else fmt(value)
+        return single
+
+    def target(rec):
+        values = [get(rec) for get in getters]
+        return None if None in values else fmt(*values)
+    return target
+
+
+def compile_rules(folder, spec, index, nested_dates=False, default=None, now=None):
+    """Compile a rule spec into ``rec -> target folder``; ``default`` when no rule matches."""
+    day = _day_fields()
+    now = time.time() if now is None else now
+    compiled = [([_predicate(t, index, now) for t in conditions], _template(folder, segments, index, day))
+                for conditions, segments in parse_rules(spec, nested_dates)]
+    if len(compiled) == 1 and not compiled[0][0]:
+        template = compiled[0][1]
+        if default is None:
+            return template
+
+        def target_dir(rec):
+            target = template(rec)
+            return default if target is None else target
+        return target_dir
+
+    def target_dir(rec):
+        for predicates, template in compiled:
+            for predicate in predicates:
+                if not predicate(rec):
+                    break
+            else:
+                target = template(rec)
+                if target is not None:
+                    return target
+        return default
+    return target_dir
+
+
+def target_dir_for(folder, rule, index, nested_dates=False):
+    """Return a function mapping a scan record to its target folder.
+
+    ``rule`` is one of :data:`RULES` or a rule spec (see the module docs).
+    Under the plain category rule, files with an unknown extension go to
+    ``folder`` itself, as they always have in v3; under a rule spec they stay
+    where they are. ``nested_dates`` makes the date rule use ``YYYY/MM/DD``
+    instead of ``YYYY-MM-DD``.
+    """
+    if rule in RULES:
+        return compile_rules(folder, rule, index, nested_dates, default=folder)
+    if not isinstance(rule, str):
+        raise ValueError(f"Unknown rule {rule!r}, expected one of {RULES} or a rule spec")
+    return compile_rules(folder, rule, index, nested_dates)
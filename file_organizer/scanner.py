@@ -0,0 +1,206 @@
+# ================================
+# Scanner
+# ================================
+"""Single-pass directory scanner.
+
+Every file is stat'ed exactly once through ``os.scandir``; the result is kept
+in a compact :class:`FileRecord` that preview and all organize rules read from,
+so nothing downstream needs ``os.path.getmtime``/``getsize`` again.
+"""
+
+import os
+import queue
+import threading
+import time
+from collections import namedtuple
+
+from .packing import PACK_FILES, pack_files
+from .sharding import SHARD_MARKER
+from .throttle import get_budget
+
+# --------------------------
+# Records
+# --------------------------
+FileRecord = namedtuple("FileRecord", "path name ext size mtime ino dev")
+
+
+def make_record(path, st):
+    """Build a record from a path and an ``os.stat_result``."""
+    name = os.path.basename(path)
+    ext = os.path.splitext(name)[1].lower()
+    return FileRecord(path, name, ext, st.st_size, st.st_mtime, st.st_ino, st.st_dev)
+
+
+def stat_record(path):
+    """Stat a single path (used for paths that did not come from a scan)."""
+    return make_record(path, os.lstat(path))
+
+
+# --------------------------
+# Scanning
+# --------------------------
+def iter_dirs(folder, on_error=None, skip_dir=None, skip_file=None):
+    """Yield one list of :class:`FileRecord` per directory below ``folder``.
+
+    Directories are walked iteratively with ``os.scandir``; symlinked
+    directories are not followed, matching ``os.walk``'s default. Sub
+    folders for which ``skip_dir(path)`` is true are not entered at all
+    (see :class:`~file_organizer.prune.ScanFilter`).
+    """
+    budget = get_budget()
+    dev = None  # device of the last files seen, for the I/O budget
+    stack = [folder]
+    while stack:
+        current = stack.pop()
+        try:
+            it = os.scandir(current)
+        except OSError as e:
+            if on_error is not None:
+                on_error(e)
+            continue
+        subdirs = []
+        records = []
+        pack_names = []
+        with it:
+            for entry in it:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if skip_dir is None or not skip_dir(entry.path):
+                            subdirs.append(entry.path)
+                        continue
+                    if not entry.is_file() or entry.name == SHARD_MARKER:
+                        continue
+                    if entry.name in PACK_FILES:
+                        pack_names.append(entry.name)
+                    if skip_file is not None and skip_file(entry.path):
+                        continue
+                    # The entry's own identity: a symlink is moved, not its target
+                    st = entry.stat(follow_symlinks=False)
+                except OSError as e:
+                    if on_error is not None:
+                        on_error(e)
+                    continue
+                name = entry.name
+                records.append(FileRecord(entry.path, name, os.path.splitext(name)[1].lower(),
+                                          st.st_size, st.st_mtime, st.st_ino, st.st_dev))
+        if pack_names:
+            records = _without_pack_files(records, pack_names)
+        if records:
+            dev = records[0].dev
+        # One listing plus one stat per file
+        budget.take_ops(dev, 1 + len(records))
+        yield records
+        # Reverse so directories come off the stack in listing order
+        stack.extend(reversed(subdirs))
+
+
+def _without_pack_files(records, names):
+    # Archives made by packing are not files to organize
+    packed = pack_files(names)
+    return [r for r in records if r.name not in packed] if packed else records
+
+
+def iter_scan(folder, on_error=None, skip_dir=None, skip_file=None):
+    """Yield a :class:`FileRecord` for every regular file below ``folder``."""
+    for records in iter_dirs(folder, on_error, skip_dir, skip_file):
+        yield from records
+
+
+def scan_folder(folder, on_error=None, skip_dir=None, skip_file=None):
+    """Return every file below ``folder`` as a list of records."""
+    return list(iter_scan(folder, on_error, skip_dir, skip_file))
+
+
+# --------------------------
+# Streaming
+# --------------------------
+class ScanStream:
+    """Scan on a background thread and hand records over in batches.
+
+    The first directory is delivered as soon as it has been read, later ones
+    are grouped until ``batch_size`` records or ``latency`` seconds have
+    piled up. ``discovered`` counts files found so far, so the GUI can show
+    found versus listed while the walk is still running. ``source(folder)``
+    yields one list of records per directory and defaults to
+    :func:`iter_dirs`. If it raises, the walk ends early and the exception
+    is kept in ``error``.
+    """
+
+    def __init__(self, folder, latency=0.05, batch_size=2000, source=None):
+        self.folder = folder
+        self.source = source or iter_dirs
+        self.latency = latency
+        self.batch_size = batch_size
+        self.discovered = 0
+        self.dirs = 0
+        self.finished = False
+        self.error = None
+        self._batches = queue.Queue()
+        self._cancel = threading.Event()
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    def start(self):
+        threading.Thread(target=self._run, daemon=True).start()
+        return self
+
+    def cancel(self):
+        self._cancel.set()
+
+    def _run(self):
+        pending = []
+        last = None
+        try:
+            for records in self.source(self.folder):
+                if self._cancel.is_set():
+                    return
+                self.dirs += 1
+                self.discovered += len(records)
+                pending.extend(records)
+                now = time.monotonic()
+                if pending and (last is None or len(pending) >= self.batch_size
+                                or now - last >= self.latency):
+                    self._batches.put(pending)
+                    pending = []
+                    last = now
+        except Exception as e:
+            self.error = e
+        finally:
+            # The poller waits for None, even after an error
+            if pending:
+                self._batches.put(pending)
+            self._batches.put(None)
+
+    def poll(self, widget, on_batch, on_done, interval=30):
+        """Deliver batches on the Tk thread via ``widget.after``.
+
+        Everything that arrived since the last tick is merged into one
+        ``on_batch`` call; ``on_done()`` runs once the walk is complete or
+        has failed (see ``error``).
+        Polling stops silently when the stream is cancelled.
+        """
+        def tick():
+            if self._cancel.is_set():
+                return
+            merged = []
+            done = False
+            try:
+                while True:
+                    batch = self._batches.get_nowait()
+                    if batch is None:
+                        done = True
+                        break
+                    merged.extend(batch)
+            except queue.Empty:
+                pass
+            if merged:
+                on_batch(merged)
+            if done:
+                self.finished = True
+                on_done()
+            else:
+                widget.after(interval, tick)
+
+        widget.after(1, tick)
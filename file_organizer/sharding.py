@@ -0,0 +1,221 @@
+# ================================
+# Sharded Destination Layout
+# ================================
+"""Keep destination folders small by fanning files out into sub folders.
+
+A target folder (``Images``, a date folder, ...) that would hold more than
+``max_entries`` files gets hash-prefix shards: ``Images/3f/photo.jpg``, with
+as many two-character levels as the count needs. The prefix comes from the
+file name, so a file always maps to the same shard and a re-organize finds
+it already in place.
+
+The chosen depth is written to a small marker file in the target folder the
+first time it is sharded and read back by later runs. It only changes when
+a folder outgrows it: the folder is then sharded one level deeper or more.
+Either way the files already there are moved into their new shards by the
+same plan, and an undo that empties the shards drops the marker again.
+Scans skip the marker.
+"""
+
+import hashlib
+import json
+import math
+import os
+import threading
+
+SHARD_MARKER = ".file_organizer_shards"
+SHARD_MODES = ("none", "hash", "date")
+DEFAULT_MAX_ENTRIES = 10000
+# Shards counted to estimate how full a sharded folder is
+SAMPLE_SHARDS = 8
+
+
+def shard_prefix(name, width, levels):
+    """Return the shard sub folders for ``name``, e.g. ``("3f", "a0")``."""
+    digest = hashlib.md5(os.path.normcase(name).encode("utf-8", "surrogateescape")).hexdigest()
+    return tuple(digest[i * width:(i + 1) * width] for i in range(levels))
+
+
+def read_marker(base_dir):
+    """Return ``(width, levels)`` stored in ``base_dir`` or ``None``."""
+    try:
+        with open(os.path.join(base_dir, SHARD_MARKER), encoding="utf-8") as f:
+            info = json.load(f)
+        return int(info["width"]), int(info["levels"])
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+
+def write_marker(base_dir, width, levels):
+    current = read_marker(base_dir)
+    if current is not None and current[1] >= levels:
+        return  # another run sharded it as deep first; its layout wins
+    _store_marker(base_dir, width, levels)
+
+
+def _store_marker(base_dir, width, levels):
+    path = os.path.join(base_dir, SHARD_MARKER)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"width": width, "levels": levels}, f)
+    # Readers see the old depth or the new one, never a torn file
+    os.replace(tmp, path)
+
+
+def _is_shard(name, width):
+    return len(name) == width and all(c in "0123456789abcdef" for c in name)
+
+
+def shard_depth(base_dir, width, levels):
+    """How many shard levels below ``base_dir`` still exist, at most ``levels``."""
+    deepest = 0
+    stack = [(base_dir, 0)]
+    while stack and deepest < levels:
+        directory, depth = stack.pop()
+        deepest = max(deepest, depth)
+        if depth == levels:
+            break
+        try:
+            with os.scandir(directory) as it:
+                stack.extend((e.path, depth + 1) for e in it
+                             if _is_shard(e.name, width) and e.is_dir(follow_symlinks=False))
+        except OSError:
+            continue
+    return deepest
+
+
+def settle_marker(base_dir):
+    """Fit the marker of ``base_dir`` to the shards an undo left behind.
+
+    With no shards left the folder is unsharded (or empty) again and the
+    marker goes; shards left only as deep as before a deepening get the
+    old depth back.
+    """
+    marker = read_marker(base_dir)
+    if marker is None:
+        return
+    width, levels = marker
+    depth = shard_depth(base_dir, width, levels)
+    if depth == levels:
+        return
+    if depth:
+        _store_marker(base_dir, width, depth)
+        return
+    try:
+        os.remove(os.path.join(base_dir, SHARD_MARKER))
+    except FileNotFoundError:
+        pass
+
+
+def shard_root(path):
+    """Return the sharded target folder ``path`` lies in, or ``None``."""
+    parent = os.path.dirname(path)
+    for _ in range(8):
+        if read_marker(parent) is not None:
+            return parent
+        up = os.path.dirname(parent)
+        if up == parent:
+            break
+        parent = up
+    return None
+
+
+def remove_empty_shards(directory):
+    """Remove ``directory`` and its empty shard parents, up to the target folder.
+
+    Returns the target folder ``directory`` is sharded in, or ``None``.
+    """
+    base = shard_root(os.path.join(directory, "x"))
+    if base is None:
+        return None
+    # Only folders strictly inside base: "/x/Images2" is not in "/x/Images"
+    inside = os.path.join(base, "")
+    while directory.startswith(inside):
+        try:
+            os.rmdir(directory)
+        except OSError:
+            break
+        directory = os.path.dirname(directory)
+    return base
+
+
+class ShardLayout:
+    """Decides the shard depth of each target folder for one organize run.
+
+    ``mode`` is ``"hash"`` (fan out by name hash) or ``"date"`` (the date rule
+    nests ``YYYY/MM/DD``; over-full day folders are hash sharded too).
+    ``width`` hex characters per level give ``16 ** width`` shards per level.
+    """
+
+    def __init__(self, mode="hash", max_entries=DEFAULT_MAX_ENTRIES, width=2):
+        if mode not in SHARD_MODES[1:]:
+            raise ValueError(f"Unknown shard mode {mode!r}, expected one of {SHARD_MODES[1:]}")
+        self.mode = mode
+        self.max_entries = max(1, int(max_entries))
+        self.width = width
+        self._depth = {}
+        self.new_markers = {}  # base dir -> (width, levels) still to be written
+        self.old_levels = {}   # base dir -> levels before it was sharded deeper
+        self._lock = threading.Lock()
+
+    @property
+    def nested_dates(self):
+        return self.mode == "date"
+
+    def _count(self, base_dir):
+        try:
+            with os.scandir(base_dir) as it:
+                return sum(1 for _ in it)
+        except OSError:
+            return 0
+
+    def _estimate(self, base_dir, width, levels):
+        """Files in a sharded folder, from a few shards: names hash evenly."""
+        shards = 16 ** (width * levels)
+        sample = {shard_prefix(str(i), width, levels) for i in range(SAMPLE_SHARDS)}
+        found = sum(self._count(os.path.join(base_dir, *prefix)) for prefix in sample)
+        return found * shards // len(sample)
+
+    def _levels(self, total):
+        if total <= self.max_entries:
+            return 0
+        return math.ceil(math.log(total / self.max_entries, 16 ** self.width))
+
+    def depth(self, base_dir, incoming=0):
+        """Return ``(width, levels)`` for ``base_dir`` given ``incoming`` new files."""
+        with self._lock:
+            cached = self._depth.get(base_dir)
+            if cached is not None:
+                return cached
+            depth = read_marker(base_dir)
+            if depth is None:
+                levels = self._levels(self._count(base_dir) + incoming)
+                if levels:
+                    self.new_markers[base_dir] = (self.width, levels)
+                depth = (self.width, levels)
+            else:
+                # A sharded folder keeps its layout until it outgrows it
+                width, levels = depth
+                total = self._estimate(base_dir, width, levels) + incoming
+                if total > 16 ** (width * levels) * self.max_entries:
+                    deeper = max(levels + 1, math.ceil(
+                        math.log(total / self.max_entries, 16 ** width)))
+                    self.new_markers[base_dir] = depth = (width, deeper)
+                    self.old_levels[base_dir] = levels
+            self._depth[base_dir] = depth
+            return depth
+
+    def place(self, base_dir, name, incoming=0):
+        """Return the folder ``name`` goes to inside ``base_dir``."""
+        width, levels = self.depth(base_dir, incoming)
+        if not levels:
+            return base_dir
+        return os.path.join(base_dir, *shard_prefix(name, width, levels))
+
+
+def write_markers(markers):
+    """Persist ``{base_dir: (width, levels)}`` for folders sharded for the first
+    time or deeper than before."""
+    for base_dir, (width, levels) in markers.items():
+        os.makedirs(base_dir, exist_ok=True)
+        write_marker(base_dir, width, levels)
@@ -0,0 +1,219 @@
+# ================================
+# Content Sniffing
+# ================================
+"""Recognise files by their first bytes when the extension says nothing.
+
+Extension lookup stays the fast path. Only files whose extension is
+unknown to the categories (including files without one) or in
+:data:`AMBIGUOUS_EXTS` are sniffed: at most :data:`SNIFF_BYTES` are read,
+in batches on a thread pool, each thread reusing one buffer. Results are
+cached by ``(dev, inode, size, mtime)`` like content hashes, so with a
+database path a re-run never reads an unchanged file again.
+
+A sniffed type is an extension (``".jpg"``); classification then treats
+the file as if it had that extension. File names are never changed.
+"""
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from .throttle import get_budget
+
+SNIFF_BYTES = 512
+SNIFF_BATCH = 256  # files per pool task, so tiny reads do not drown in task overhead
+
+# Extensions that say little about the content. Partial downloads are not
+# here: their head already looks like the finished file, and they are not
+# organized at all (see ``prune.PARTIAL_EXTS``)
+AMBIGUOUS_EXTS = frozenset({".bin", ".dat"})
+
+# (offset, signature, extension), checked in order
+MAGIC = (
+    (0, b"\xff\xd8\xff", ".jpg"),
+    (0, b"\x89PNG\r\n\x1a\n", ".png"),
+    (0, b"GIF87a", ".gif"),
+    (0, b"GIF89a", ".gif"),
+    (0, b"II*\x00", ".tiff"),
+    (0, b"MM\x00*", ".tiff"),
+    (0, b"BM", ".bmp"),
+    (0, b"%PDF-", ".pdf"),
+    (0, b"ID3", ".mp3"),
+    (0, b"FLV\x01", ".flv"),
+    (0, b"\x1a\x45\xdf\xa3", ".mkv"),
+    (8, b"WAVE", ".wav"),
+    (8, b"AVI ", ".avi"),
+    (4, b"ftypqt  ", ".mov"),
+    (4, b"ftyp", ".mp4"),
+)
+
+_ZIP = b"PK\x03\x04"
+_OFFICE = ((b"word/", ".docx"), (b"xl/", ".xlsx"), (b"ppt/", ".pptx"))
+
+
+def sniff_bytes(head):
+    """Return the extension matching a file's first bytes, or ``None``."""
+    head = bytes(head)
+    for offset, signature, ext in MAGIC:
+        if head.startswith(signature, offset):
+            return ext
+    if head.startswith(_ZIP):
+        # Office files are zips; the first member's name usually gives them away
+        for marker, ext in _OFFICE:
+            if marker in head:
+                return ext
+        return None
+    if len(head) >= 2 and head[0] == 0xFF:
+        if head[1] & 0xF6 == 0xF0:
+            return ".aac"   # ADTS frame
+        if head[1] & 0xE6 == 0xE2:
+            return ".mp3"   # MPEG audio layer III frame
+    text = head.lstrip(b"\xef\xbb\xbf \t\r\n").lower()
+    if text.startswith(b"#!"):
+        if b"python" in text.split(b"\n", 1)[0]:
+            return ".py"
+        return None
+    if text.startswith((b"<!doctype html", b"<html")):
+        return ".html"
+    return None
+
+
+_buffers = threading.local()
+
+
+def sniff_file(path):
+    """Read at most ``SNIFF_BYTES`` of ``path`` and sniff them."""
+    buf = getattr(_buffers, "buf", None)
+    if buf is None:
+        buf = _buffers.buf = bytearray(SNIFF_BYTES)
+    fd = os.open(path, os.O_RDONLY | getattr(os, "O_BINARY", 0))
+    try:
+        if hasattr(os, "readv"):
+            n = os.readv(fd, [buf])
+            return sniff_bytes(memoryview(buf)[:n])
+        return sniff_bytes(os.read(fd, SNIFF_BYTES))
+    finally:
+        os.close(fd)
+
+
+# --------------------------
+# Cache
+# --------------------------
+class SniffCache:
+    """``(dev, ino, size, mtime) -> extension`` (``""``: nothing matched),
+    optionally in SQLite next to the content hashes."""
+
+    def __init__(self, db_path=None):
+        self.db_path = db_path
+        self._mem = {}
+        self._dirty = set()
+        self._db = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(rec):
+        return (rec.dev, rec.ino, rec.size, rec.mtime)
+
+    def _conn(self):
+        if self._db is None and self.db_path:
+            import sqlite3  # only when a persistent cache is used
+            self._db = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS sniffed (dev INTEGER, ino INTEGER, size INTEGER, "
+                "mtime REAL, ext TEXT, PRIMARY KEY (dev, ino, size, mtime)) WITHOUT ROWID")
+        return self._db
+
+    def get(self, rec):
+        """The cached extension, ``""`` for a known miss, ``None`` if never sniffed."""
+        key = self.key(rec)
+        with self._lock:
+            if key in self._mem:
+                return self._mem[key]
+            if not self.db_path:
+                return None
+            row = self._conn().execute(
+                "SELECT ext FROM sniffed WHERE dev = ? AND ino = ? AND size = ? AND mtime = ?",
+                key).fetchone()
+            if row is not None:
+                self._mem[key] = row[0]
+                return row[0]
+            return None
+
+    def put(self, rec, ext):
+        key = self.key(rec)
+        with self._lock:
+            self._mem[key] = ext or ""
+            self._dirty.add(key)
+
+    def flush(self):
+        with self._lock:
+            if not self._dirty or not self.db_path:
+                self._dirty.clear()
+                return
+            db = self._conn()
+            db.executemany("INSERT OR REPLACE INTO sniffed VALUES (?, ?, ?, ?, ?)",
+                           [k + (self._mem[k],) for k in self._dirty])
+            db.commit()
+            self._dirty.clear()
+
+    def close(self):
+        self.flush()
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+
+# --------------------------
+# Classification
+# --------------------------
+def needs_sniffing(rec, index):
+    return rec.ext in AMBIGUOUS_EXTS or index.classify(rec.name, rec.ext) is None
+
+
+def sniff_records(records, jobs=8, cache=None):
+    """Return ``{path: extension}`` for the records whose content was recognised."""
+    if cache is None:
+        cache = SniffCache()
+    result, missing = {}, []
+    for rec in records:
+        cached = cache.get(rec)
+        if cached is None:
+            missing.append(rec)
+        elif cached:
+            result[rec.path] = cached
+
+    budget = get_budget()
+
+    def run(batch):
+        found = []
+        for rec in batch:
+            try:
+                with budget.op(rec.dev, min(rec.size, SNIFF_BYTES)):
+                    found.append((rec, sniff_file(rec.path)))
+            except OSError:
+                continue
+        return found
+
+    batches = [missing[i:i + SNIFF_BATCH] for i in range(0, len(missing), SNIFF_BATCH)]
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as pool:
+        for found in pool.map(run, batches):
+            for rec, ext in found:
+                cache.put(rec, ext)
+                if ext:
+                    result[rec.path] = ext
+    cache.flush()
+    return result
+
+
+def with_content_types(target_dir_for, records, index, jobs=8, cache=None):
+    """Wrap ``target_dir_for(rec)`` so records the extension cannot place are
+    classified by their sniffed type instead.
+    """
+    sniffed = sniff_records([rec for rec in records if needs_sniffing(rec, index)], jobs, cache)
+    if not sniffed:
+        return target_dir_for
+
+    def target_dir(rec):
+        ext = sniffed.get(rec.path)
+        return target_dir_for(rec if ext is None else rec._replace(ext=ext))
+    return target_dir
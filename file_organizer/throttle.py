@@ -0,0 +1,191 @@
+# ================================
+# I/O Budget
+# ================================
+"""Keep organize runs from starving other users of a shared disk.
+
+An :class:`IOBudget` holds token buckets per device (``st_dev``): one for
+operations per second (renames, folder listings, stats, ``mkdir``), one for
+bytes per second (cross-device copies, hashing and sniffing reads), and a
+cap on operations in flight at once. Workers take tokens before touching a
+device and sleep when the bucket is empty, so a large reorganization runs
+at a steady, predictable rate instead of as fast as the disk allows.
+
+The active budget is unlimited, so every check is a no-op, until a front
+end installs one with :func:`set_budget`. :func:`lower_priority`
+additionally drops CPU (``nice``) and, on Linux, I/O (``ioprio``) priority.
+"""
+
+import contextlib
+import ctypes
+import ctypes.util
+import os
+import platform
+import re
+import sys
+import threading
+import time
+
+from .metrics import get_metrics
+
+BYTES_CHUNK = 4 * 1024 * 1024  # copy granularity while a bytes/s limit is set
+_UNITS = {"": 1, "k": 1 << 10, "m": 1 << 20, "g": 1 << 30, "t": 1 << 40}
+_RATE = re.compile(r"(\d+(?:\.\d+)?)\s*([kmgt]?)(?:i?b)?(?:/s)?\Z", re.IGNORECASE)
+
+
+def parse_bytes(text):
+    """``"50M"``, ``"1.5GiB"``, ``"200k/s"`` -> bytes."""
+    m = _RATE.match(str(text).strip())
+    if m is None:
+        raise ValueError(f"Not a byte count: {text!r}")
+    return int(float(m.group(1)) * _UNITS[m.group(2).lower()])
+
+
+class TokenBucket:
+    """``rate`` tokens per second, holding at most ``capacity`` (one second's worth).
+
+    ``take`` reserves its tokens right away and sleeps off any debt, so
+    concurrent callers are served in arrival order and a request bigger
+    than the bucket is still allowed, just paid for afterwards.
+    """
+
+    def __init__(self, rate, capacity=None, clock=time.monotonic, sleep=time.sleep):
+        self.rate = float(rate)
+        self.capacity = float(capacity or rate)
+        self.tokens = self.capacity
+        self._clock = clock
+        self._sleep = sleep
+        self._stamp = clock()
+        self._lock = threading.Lock()
+
+    def take(self, n=1):
+        """Take ``n`` tokens; return the seconds slept."""
+        with self._lock:
+            now = self._clock()
+            self.tokens = min(self.capacity, self.tokens + (now - self._stamp) * self.rate)
+            self._stamp = now
+            self.tokens -= n
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+        if wait > 0:
+            self._sleep(wait)
+        return wait
+
+
+class _Device:
+    __slots__ = ("ops", "bytes", "slots")
+
+    def __init__(self, budget):
+        self.ops = TokenBucket(budget.ops_per_s) if budget.ops_per_s else None
+        self.bytes = TokenBucket(budget.bytes_per_s) if budget.bytes_per_s else None
+        self.slots = threading.BoundedSemaphore(budget.in_flight) if budget.in_flight else None
+
+
+class IOBudget:
+    """Per-device limits on bytes/s, operations/s and operations in flight.
+
+    ``None`` (or 0) leaves a limit off. ``dev`` may be ``None`` when the
+    device is not known; those operations share one set of buckets.
+    """
+
+    def __init__(self, bytes_per_s=None, ops_per_s=None, in_flight=None):
+        self.bytes_per_s = bytes_per_s or None
+        self.ops_per_s = ops_per_s or None
+        self.in_flight = in_flight or None
+        self.limited = bool(self.bytes_per_s or self.ops_per_s or self.in_flight)
+        self._devices = {}
+        self._lock = threading.Lock()
+
+    def _device(self, dev):
+        device = self._devices.get(dev)
+        if device is None:
+            with self._lock:
+                device = self._devices.get(dev)
+                if device is None:
+                    device = self._devices[dev] = _Device(self)
+        return device
+
+    def _waited(self, kind, seconds):
+        if seconds > 0:
+            get_metrics().observe("throttle_wait_seconds", seconds, kind=kind)
+
+    def take_ops(self, dev, n=1):
+        if self.ops_per_s:
+            self._waited("ops", self._device(dev).ops.take(n))
+
+    def take_bytes(self, dev, n):
+        if self.bytes_per_s and n > 0:
+            self._waited("bytes", self._device(dev).bytes.take(n))
+
+    def op(self, dev, nbytes=0):
+        """Context manager around one operation on ``dev``."""
+        if not self.limited:
+            return contextlib.nullcontext()
+        return self._op(dev, nbytes)
+
+    @contextlib.contextmanager
+    def _op(self, dev, nbytes):
+        slots = self._device(dev).slots
+        if slots is not None and not slots.acquire(blocking=False):
+            start = time.perf_counter()
+            slots.acquire()
+            self._waited("in_flight", time.perf_counter() - start)
+        try:
+            self.take_ops(dev)
+            self.take_bytes(dev, nbytes)
+            yield
+        finally:
+            if slots is not None:
+                slots.release()
+
+
+# --------------------------
+# Active budget
+# --------------------------
+_active = IOBudget()
+
+
+def get_budget():
+    return _active
+
+
+def set_budget(budget):
+    global _active
+    _active = budget if budget is not None else IOBudget()
+
+
+# --------------------------
+# Process priority
+# --------------------------
+_IOPRIO_WHO_PROCESS = 1
+_IOPRIO_CLASS_SHIFT = 13
+_IOPRIO_CLASS_BE, _IOPRIO_CLASS_IDLE = 2, 3
+_SYS_IOPRIO_SET = {"x86_64": 251, "i386": 289, "i686": 289, "aarch64": 30, "riscv64": 30,
+                   "armv7l": 314, "ppc64le": 273, "s390x": 282}
+
+
+def lower_priority(idle=False, niceness=10):
+    """Lower CPU and I/O priority; return what could be changed.
+
+    Call it before starting worker threads: on Linux both settings are per
+    thread and are inherited by threads started afterwards. ``idle`` uses
+    the idle I/O class (only served when the disk is otherwise unused)
+    instead of the lowest best-effort level. The I/O class only has an
+    effect with an I/O scheduler that honours it (BFQ, CFQ).
+    """
+    changed = []
+    if hasattr(os, "nice"):
+        try:
+            os.nice(niceness)
+            changed.append("nice")
+        except OSError:
+            pass
+    nr = _SYS_IOPRIO_SET.get(platform.machine())
+    if sys.platform.startswith("linux") and nr is not None:
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+            value = (_IOPRIO_CLASS_IDLE << _IOPRIO_CLASS_SHIFT if idle
+                     else _IOPRIO_CLASS_BE << _IOPRIO_CLASS_SHIFT | 7)
+            if libc.syscall(nr, _IOPRIO_WHO_PROCESS, 0, value) == 0:
+                changed.append("ioprio")
+        except (OSError, AttributeError):
+            pass
+    return changed
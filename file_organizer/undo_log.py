@@ -0,0 +1,361 @@
+# ================================
+# Persistent Undo Log
+# ================================
+"""Append-only, on-disk undo batches that survive a crash.
+
+Every organize run is one batch file of JSON lines::
+
+    {"t": "begin", ...info}
+    {"t": "intent", "src": ..., "dst": ..., "ino": ..., "dev": ..., "size": ..., "mtime": ...}
+    ...
+    {"t": "commit"}
+
+An ``intent`` is written *before* its rename (write-ahead), so a batch that
+has no ``commit`` after a crash still lists every move that may have
+happened. Whether a move really happened is decided at rollback time from
+the file at ``dst``: same device -> same inode, other device (a copy) ->
+same size and mtime. Partial rollbacks append ``restored`` records; a
+fully rolled back batch file is deleted.
+
+Duplicates removed by a ``hardlink`` or ``delete`` organize are intents with
+an ``action`` and the ``keep`` path; undoing them copies the kept content
+back to ``src``. Packed files are ``pack`` intents whose ``dst`` is the
+archive and ``keep`` the member name; undoing them extracts the member.
+"""
+
+import errno
+import json
+import os
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from .metrics import get_metrics
+from .mover import rename_noreplace, copy_noreplace
+from .packing import unpack_member, has_member, forget_member, settle_archive
+from .sharding import remove_empty_shards, settle_marker
+from .throttle import get_budget
+
+
+class UndoEntry(namedtuple("UndoEntry", "src dst ino dev size mtime action keep keep_src",
+                           defaults=("move", None, None))):
+    """``keep_src`` is filled in on read: where the kept file came from when
+    it was moved by the same batch, so a delete can still be undone after
+    that move was rolled back."""
+    __slots__ = ()
+
+    @property
+    def key(self):
+        """Unique per batch: deletes all share ``dst`` (the kept file), packed
+        files their archive."""
+        return self.src if self.action in ("delete", "pack") else self.dst
+
+
+def _same_file(st, entry):
+    """Whether ``st`` is the file an intent was written for.
+
+    Inode numbers are reused as soon as a file is unlinked, so size and
+    mtime must match as well.
+    """
+    return ((st.st_dev, st.st_ino, st.st_size, st.st_mtime)
+            == (entry.dev, entry.ino, entry.size, entry.mtime))
+
+
+def _source_unmoved(entry):
+    """Whether the source of ``entry`` is still where it was (never moved)."""
+    try:
+        return _same_file(os.lstat(entry.src), entry)
+    except FileNotFoundError:
+        return False
+
+
+def _writer_running(batch_id):
+    """Whether the process that began a batch (the pid in its id) still runs."""
+    try:
+        pid = int(batch_id.rsplit("-", 1)[1])
+    except (IndexError, ValueError):
+        return False
+    if os.name == "nt":
+        # os.kill(pid, 0) would terminate the process on Windows
+        import ctypes
+        kernel32 = ctypes.WinDLL("kernel32", use_last_error=True)
+        handle = kernel32.OpenProcess(0x1000, False, pid)  # PROCESS_QUERY_LIMITED_INFORMATION
+        if not handle:
+            return ctypes.get_last_error() == 5  # ERROR_ACCESS_DENIED: it exists
+        code = ctypes.c_ulong()
+        try:
+            return bool(kernel32.GetExitCodeProcess(handle, ctypes.byref(code))) and code.value == 259
+        finally:
+            kernel32.CloseHandle(handle)
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True  # someone else's process
+    return True
+
+
+class UndoBatch:
+    def __init__(self, path, fsync=False):
+        self.path = path
+        self.id = os.path.splitext(os.path.basename(path))[0]
+        self.fsync = fsync
+        self._lock = threading.Lock()
+        self._file = open(path, "a", encoding="utf-8")
+
+    def _write(self, record):
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with self._lock:
+            self._file.write(line)
+            # Reach the OS before the rename; fsync only when asked to
+            self._file.flush()
+            if self.fsync:
+                os.fsync(self._file.fileno())
+
+    def intent(self, rec, dst, action="move", keep=None):
+        """Record that ``rec`` is about to be moved to ``dst``."""
+        record = {"t": "intent", "src": rec.path, "dst": dst, "ino": rec.ino,
+                  "dev": rec.dev, "size": rec.size, "mtime": rec.mtime}
+        if action != "move":
+            record.update(action=action, keep=keep)
+        self._write(record)
+
+    def commit(self):
+        self._write({"t": "commit"})
+        self.close()
+
+    def discard(self):
+        """Drop a batch in which nothing was moved."""
+        self.close()
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+    def close(self):
+        with self._lock:
+            if not self._file.closed:
+                self._file.close()
+
+
+class UndoLog:
+    def __init__(self, directory, fsync=False):
+        self.directory = directory
+        self.fsync = fsync
+
+    # --------------------------
+    # Writing
+    # --------------------------
+    def begin(self, **info):
+        """Start a new batch; ``info`` (root folder, rule, ...) goes in the header."""
+        os.makedirs(self.directory, exist_ok=True)
+        name = f"{time.time_ns():020d}-{os.getpid()}.jsonl"
+        batch = UndoBatch(os.path.join(self.directory, name), self.fsync)
+        batch._write(dict(info, t="begin", ts=time.time()))
+        return batch
+
+    def commit(self, batch_id):
+        """Accept an interrupted batch as is; it stays available for undo."""
+        self._append(batch_id, [{"t": "commit"}])
+
+    def _append(self, batch_id, records):
+        with open(self._path(batch_id), "a", encoding="utf-8") as f:
+            f.write("".join(json.dumps(r, ensure_ascii=False) + "\n" for r in records))
+            if self.fsync:
+                f.flush()
+                os.fsync(f.fileno())
+
+    # --------------------------
+    # Reading
+    # --------------------------
+    def _path(self, batch_id):
+        return os.path.join(self.directory, batch_id + ".jsonl")
+
+    def _ids(self):
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        return sorted(n[:-6] for n in names if n.endswith(".jsonl"))
+
+    def read(self, batch_id):
+        """Return ``(info, entries, committed)`` for a batch.
+
+        ``entries`` are the moves not yet restored, oldest first. A torn last
+        line from a crash is ignored.
+        """
+        info, intents, restored, committed = {}, [], set(), False
+        with open(self._path(batch_id), encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                kind = record.pop("t", None)
+                if kind == "intent":
+                    intents.append(UndoEntry(**record))
+                elif kind == "restored":
+                    restored.add(record["dst"])
+                elif kind == "commit":
+                    committed = True
+                elif kind == "begin":
+                    info = record
+        # A move retried under another name supersedes its first intent
+        last = {(e.src, e.ino): e.dst for e in intents if e.action == "move"}
+        intents = [e for e in intents if e.action != "move" or last[(e.src, e.ino)] == e.dst]
+        moved_from = {e.dst: e.src for e in intents if e.action == "move"}
+        intents = [e._replace(keep_src=moved_from.get(e.keep)) if e.action == "delete" else e
+                   for e in intents]
+        return info, [e for e in intents if e.key not in restored], committed
+
+    def committed(self):
+        """Ids of finished batches that can be undone, oldest first."""
+        return [b for b in self._ids() if self.read(b)[2]]
+
+    def interrupted(self):
+        """Ids of batches whose run never reached ``commit``.
+
+        Batches of a process that is still running (another window, a
+        ``watch``) are not interrupted, just not finished yet, and are left
+        out.
+        """
+        return [b for b in self._ids() if not self.read(b)[2] and not _writer_running(b)]
+
+    # --------------------------
+    # Rollback
+    # --------------------------
+    @staticmethod
+    def prepare(entries):
+        """Create every original folder once, before the concurrent renames."""
+        for parent in {os.path.dirname(e.src) for e in entries}:
+            os.makedirs(parent, exist_ok=True)
+
+    @staticmethod
+    def restore(entry):
+        """Move one file back if ``dst`` still holds the file we moved.
+
+        Returns ``(key, src)`` or ``None`` when there is nothing to restore.
+        """
+        with get_budget().op(entry.dev):
+            return UndoLog._restore(entry)
+
+    @staticmethod
+    def _restore(entry):
+        if entry.action == "pack":
+            return UndoLog._restore_packed(entry)
+        if entry.action != "move":
+            return UndoLog._restore_duplicate(entry)
+        try:
+            st = os.lstat(entry.dst)
+        except FileNotFoundError:
+            return None
+        # A copy to another device has a new inode; a rename keeps it
+        if not (_same_file(st, entry) if st.st_dev == entry.dev
+                else (st.st_size, st.st_mtime) == (entry.size, entry.mtime)):
+            if _source_unmoved(entry):
+                return None  # interrupted before the rename
+            raise FileExistsError(errno.EEXIST, "Changed since it was moved", entry.dst)
+        # Same device: a plain rename; never clobbers a file created since
+        rename_noreplace(entry.dst, entry.src)
+        return entry.dst, entry.src
+
+    @staticmethod
+    def _restore_duplicate(entry):
+        """Recreate a linked or deleted duplicate from the content kept."""
+        if os.path.lexists(entry.src):
+            # Never removed (interrupted); drop a link made before the crash
+            if entry.action == "link":
+                try:
+                    if os.lstat(entry.dst).st_ino == os.stat(entry.keep).st_ino:
+                        os.unlink(entry.dst)
+                except FileNotFoundError:
+                    pass
+            return None
+        # The kept file may be rolled back at the same time: try both places
+        for source in (entry.dst, entry.keep_src):
+            if source is None:
+                continue
+            try:
+                if os.stat(source).st_size != entry.size:
+                    continue
+                # A link goes away with the restore; a kept file stays
+                copy_noreplace(source, entry.src, remove_source=entry.action == "link")
+            except FileNotFoundError:
+                continue
+            os.utime(entry.src, (entry.mtime, entry.mtime))
+            return entry.key, entry.src
+        return None
+
+    @staticmethod
+    def _restore_packed(entry):
+        """Extract a packed file back to ``src``."""
+        try:
+            st = os.lstat(entry.src)
+        except FileNotFoundError:
+            st = None
+        if st is not None:
+            if not has_member(entry.dst, entry.keep):
+                return None  # never packed: nothing of ours to restore
+            if not _same_file(st, entry):
+                # Something else took the name: keep the member for a retry
+                raise FileExistsError(errno.EEXIST, "Original path is taken", entry.src)
+            # Never removed (interrupted): the archive copy is not needed
+            forget_member(entry.dst, entry.keep)
+            return None
+        if not unpack_member(entry.dst, entry.keep, entry.src, entry.size, entry.mtime):
+            return None
+        return entry.key, entry.src
+
+    def finish_rollback(self, batch_id, done_keys):
+        """Record which moves of a batch no longer need undoing.
+
+        ``done_keys`` holds the :attr:`UndoEntry.key` of entries that were
+        restored or found to have nothing to restore. The batch file goes
+        away once it is empty, and shard folders emptied by the undo are
+        removed.
+        """
+        _, entries, _ = self.read(batch_id)
+        done_keys = set(done_keys)
+        sharded = {remove_empty_shards(directory)
+                   for directory in {os.path.dirname(e.dst) for e in entries if e.key in done_keys}}
+        for base_dir in sharded - {None}:
+            settle_marker(base_dir)
+        for archive in {e.dst for e in entries if e.action == "pack" and e.key in done_keys}:
+            settle_archive(archive)
+        if all(e.key in done_keys for e in entries):
+            os.remove(self._path(batch_id))
+        elif done_keys:
+            self._append(batch_id, [{"t": "restored", "dst": k} for k in done_keys])
+
+    def rollback(self, batch_id, jobs=8):
+        """Restore a whole batch with concurrent renames; return ``{key: src}``.
+
+        Entries that fail stay in the batch, which is then kept as an
+        ordinary committed batch so the undo can be retried.
+        """
+        _, entries, committed = self.read(batch_id)
+        self.prepare(entries)
+        restored, failed = {}, set()
+
+        metrics = get_metrics()
+
+        def restore(entry):
+            try:
+                with metrics.timer("op_seconds", op="restore"):
+                    return entry, self.restore(entry)
+            except OSError as e:
+                metrics.error("undo", e, entry.dst)
+                return entry, False
+
+        with ThreadPoolExecutor(max_workers=max(1, jobs)) as pool:
+            for entry, result in pool.map(restore, entries):
+                if result is False:
+                    failed.add(entry.key)
+                elif result is not None:
+                    restored[result[0]] = result[1]
+        self.finish_rollback(batch_id, {e.key for e in entries} - failed)
+        if not committed and os.path.exists(self._path(batch_id)):
+            self.commit(batch_id)
+        return restored
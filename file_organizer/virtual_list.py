@@ -0,0 +1,151 @@
+# ================================
+# Virtual List Widget
+# ================================
+"""A Listbox look-alike that only formats and inserts the rows on screen.
+
+The backing sequence (e.g. scan records) is never copied into Tk. Scrolling
+re-fills a fixed ``height``-row Listbox, and selection lives in a bytearray
+bitmap, so ``curselection()`` no longer walks Tk's selection for the whole
+list. This module imports tkinter, so it is not re-exported from the
+package.
+"""
+
+import tkinter as tk
+from itertools import compress
+
+
+class VirtualList(tk.Frame):
+    def __init__(self, master, formatter=str, height=15, width=80, **kw):
+        super().__init__(master)
+        self.formatter = formatter
+        self.height = height
+        self._items = []
+        self._selected = bytearray()
+        self._top = 0
+        self._shown = 0
+
+        self.listbox = tk.Listbox(self, height=height, width=width, selectmode=tk.MULTIPLE,
+                                  activestyle="none", exportselection=False, **kw)
+        self.scrollbar = tk.Scrollbar(self, orient=tk.VERTICAL, command=self._on_scrollbar)
+        self.listbox.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+
+        self.listbox.bind("<Button-1>", self._on_click)
+        self.listbox.bind("<B1-Motion>", lambda e: "break")
+        self.listbox.bind("<MouseWheel>", self._on_wheel)
+        self.listbox.bind("<Button-4>", lambda e: self.scroll(-3))
+        self.listbox.bind("<Button-5>", lambda e: self.scroll(3))
+
+    # --------------------------
+    # Data
+    # --------------------------
+    def set_items(self, items):
+        """Show ``items`` (kept by reference) and clear the selection."""
+        self._items = items
+        self._selected = bytearray(len(items))
+        self._top = 0
+        self._render()
+
+    def items_added(self):
+        """Call after the backing sequence has grown."""
+        self._selected.extend(bytes(len(self._items) - len(self._selected)))
+        if self._shown < self.height:
+            self._render()
+        else:
+            self._update_scrollbar()
+
+    def size(self):
+        return len(self._items)
+
+    def delete(self, first=0, last=None):
+        """Listbox-compatible clear; only clearing everything is supported."""
+        self.set_items([])
+
+    # --------------------------
+    # Selection
+    # --------------------------
+    def curselection(self):
+        return tuple(compress(range(len(self._selected)), self._selected))
+
+    def selected_items(self):
+        # Index first, so a lazy sequence only builds the selected rows
+        items = self._items
+        return [items[i] for i in compress(range(len(self._selected)), self._selected)]
+
+    def selection_count(self):
+        return len(self._selected) - self._selected.count(0)
+
+    def select_all(self):
+        self._selected = bytearray(b"\x01") * len(self._items)
+        self._render()
+
+    def clear_selection(self):
+        self._selected = bytearray(len(self._items))
+        self._render()
+
+    def selection_set(self, index):
+        self._selected[index] = 1
+        self._render()
+
+    # --------------------------
+    # Scrolling & drawing
+    # --------------------------
+    def scroll(self, rows):
+        self._top += rows
+        self._render()
+
+    def _render(self):
+        n = len(self._items)
+        self._top = top = max(0, min(self._top, n - self.height))
+        end = min(n, top + self.height)
+        fmt = self.formatter
+        lb = self.listbox
+        lb.delete(0, tk.END)
+        if end > top:
+            lb.insert(tk.END, *[fmt(self._items[i]) for i in range(top, end)])
+        self._shown = end - top
+        selected = self._selected
+        for i in range(top, end):
+            if selected[i]:
+                lb.selection_set(i - top)
+        self._update_scrollbar()
+
+    def _update_scrollbar(self):
+        n = len(self._items)
+        if n:
+            self.scrollbar.set(self._top / n, min(n, self._top + self.height) / n)
+        else:
+            self.scrollbar.set(0, 1)
+
+    def _on_scrollbar(self, *args):
+        if args[0] == "moveto":
+            self._top = int(float(args[1]) * len(self._items))
+            self._render()
+        elif args[0] == "scroll":
+            step = self.height if args[2] == "pages" else 1
+            self.scroll(int(args[1]) * step)
+
+    def _on_wheel(self, event):
+        self.scroll(-3 if event.delta > 0 else 3)
+        return "break"
+
+    def _on_click(self, event):
+        index = self._top + self.listbox.nearest(event.y)
+        if index < len(self._items):
+            self._selected[index] ^= 1
+            if self._selected[index]:
+                self.listbox.selection_set(index - self._top)
+            else:
+                self.listbox.selection_clear(index - self._top)
+        return "break"
+
+    # Theme changes are routed to the inner Listbox
+    def configure(self, cnf=None, **kw):
+        kw = dict(cnf or {}, **kw)
+        frame_kw = {k: kw[k] for k in ("bg", "background") if k in kw}
+        if frame_kw:
+            super().configure(**frame_kw)
+        if kw:
+            self.listbox.configure(**kw)
+
+    config = configure
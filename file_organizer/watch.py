@@ -0,0 +1,269 @@
+# ================================
+# Watch Mode (Linux inotify)
+# ================================
+"""Organize files as they arrive instead of re-scanning on a timer.
+
+:class:`FolderWatcher` reads inotify events through ctypes (no extra
+package, Linux only). A path becomes ready when the writer closes it
+(``IN_CLOSE_WRITE``) or when it is moved in complete (``IN_MOVED_TO``); a
+later write makes it pending again. Ready paths are handed over once they
+have been quiet for ``settle`` seconds, so the cost of a batch depends on
+the new files only, never on how big the folder already is.
+"""
+
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import struct
+import sys
+import threading
+import time
+
+from .engine import DEFAULT_JOBS
+from .metrics import get_metrics
+from .organize import plan_moves, execute_plan
+from .prune import ScanFilter
+from .rules import RULES, DEFAULT_TYPES
+from .scanner import stat_record, iter_scan
+from .sniff import SniffCache
+
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF
+_EVENT = struct.Struct("iIII")
+
+_libc = None
+
+
+def _inotify():
+    global _libc
+    if not sys.platform.startswith("linux"):
+        raise NotImplementedError("Watch mode needs Linux inotify")
+    if _libc is None:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        libc.inotify_init1.argtypes = [ctypes.c_int]
+        libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        libc.inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+        _libc = libc
+    return _libc
+
+
+def _check(result):
+    if result < 0:
+        err = ctypes.get_errno()
+        raise OSError(err, os.strerror(err))
+    return result
+
+
+class FolderWatcher:
+    """Call ``on_paths(paths)`` on a background thread with settled new files.
+
+    With ``recursive`` every sub folder is watched too, except those for
+    which ``skip_dir(path)`` is true. ``on_paths(None)`` means events were
+    lost (queue overflow) and the caller should fall back to a full scan.
+    """
+
+    def __init__(self, folder, on_paths, settle=0.2, max_delay=2.0, recursive=False,
+                 skip_dir=None):
+        self.folder = os.path.abspath(folder)
+        self.on_paths = on_paths
+        self.settle = settle
+        self.max_delay = max_delay
+        self.recursive = recursive
+        self.skip_dir = skip_dir
+        self._libc = _inotify()
+        self._fd = None
+        self._wds = {}
+        self._wake_r = self._wake_w = None
+        self._thread = None
+        self._stop = threading.Event()
+
+    # --------------------------
+    # Control
+    # --------------------------
+    def start(self):
+        self._fd = _check(self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC))
+        self._wake_r, self._wake_w = os.pipe()
+        self._add(self.folder)
+        if self.recursive:
+            for dirpath, dirnames, _ in os.walk(self.folder):
+                dirnames[:] = [d for d in dirnames if not self._skipped(os.path.join(dirpath, d))]
+                for d in dirnames:
+                    self._add(os.path.join(dirpath, d))
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self._wake_w is not None:
+            os.write(self._wake_w, b"x")
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    # --------------------------
+    # Watches
+    # --------------------------
+    def _skipped(self, path):
+        return self.skip_dir is not None and self.skip_dir(path)
+
+    def _add(self, path):
+        try:
+            wd = _check(self._libc.inotify_add_watch(self._fd, os.fsencode(path), WATCH_MASK | IN_ONLYDIR))
+        except OSError as e:
+            if e.errno in (errno.ENOENT, errno.ENOTDIR):
+                return
+            raise
+        self._wds[wd] = path
+
+    def _read_events(self):
+        try:
+            data = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return
+        offset, size = 0, len(data)
+        while offset + _EVENT.size <= size:
+            wd, mask, _, length = _EVENT.unpack_from(data, offset)
+            offset += _EVENT.size
+            name = data[offset:offset + length].rstrip(b"\0")
+            offset += length
+            yield wd, mask, os.fsdecode(name)
+
+    # --------------------------
+    # Event loop
+    # --------------------------
+    def _deliver(self, paths):
+        try:
+            self.on_paths(paths)
+        except Exception as e:
+            # Keep watching; one bad batch must not end the watch
+            get_metrics().error("watch", e, self.folder)
+
+    def _run(self):
+        ready = {}       # paths waiting to settle, in arrival order
+        first_ready = last_ready = None
+        try:
+            while not self._stop.is_set():
+                timeout = None
+                if ready:
+                    now = time.monotonic()
+                    timeout = max(0.0, min(last_ready + self.settle, first_ready + self.max_delay) - now)
+                readable, _, _ = select.select([self._fd, self._wake_r], [], [], timeout)
+                if self._fd in readable:
+                    overflow = False
+                    now = time.monotonic()
+                    for wd, mask, name in self._read_events():
+                        if mask & IN_Q_OVERFLOW:
+                            overflow = True
+                            continue
+                        if mask & IN_IGNORED:
+                            self._wds.pop(wd, None)
+                            continue
+                        parent = self._wds.get(wd)
+                        if parent is None or not name:
+                            continue
+                        path = os.path.join(parent, name)
+                        if mask & IN_ISDIR:
+                            if self.recursive and mask & (IN_CREATE | IN_MOVED_TO) and not self._skipped(path):
+                                self._add(path)
+                                # Files written before the watch existed
+                                for rec in iter_scan(path, skip_dir=self.skip_dir):
+                                    ready[rec.path] = None
+                                    last_ready = now
+                            continue
+                        if mask & (IN_CLOSE_WRITE | IN_MOVED_TO):
+                            ready[path] = None
+                            last_ready = now
+                        elif mask & (IN_MODIFY | IN_MOVED_FROM | IN_DELETE):
+                            # Being written again, or gone
+                            ready.pop(path, None)
+                    if overflow:
+                        ready.clear()
+                        first_ready = None
+                        self._deliver(None)
+                        continue
+                    if not ready:
+                        first_ready = None
+                    elif first_ready is None:
+                        first_ready = now
+                if ready:
+                    now = time.monotonic()
+                    if now - last_ready >= self.settle or now - first_ready >= self.max_delay:
+                        paths = list(ready)
+                        ready.clear()
+                        first_ready = None
+                        self._deliver(paths)
+        finally:
+            os.close(self._fd)
+            os.close(self._wake_r)
+            os.close(self._wake_w)
+            self._fd = self._wake_r = self._wake_w = None
+
+
+def settled_records(paths):
+    """Stat ready paths; files moved or deleted since are dropped."""
+    records = []
+    for path in paths:
+        try:
+            if os.path.isfile(path):
+                records.append(stat_record(path))
+        except OSError:
+            continue
+    return records
+
+
+def watch_folder(folder, rule="category", types=None, jobs=DEFAULT_JOBS, journal=None,
+                 undo_log=None, on_moved=None, duplicates="rename", layout=None,
+                 recursive=False, settle=0.2, exclude=(), sniff=False):
+    """Start organizing ``folder`` continuously; return the running watcher.
+
+    Each settled batch is planned from the new paths alone and applied as
+    its own undo batch. ``on_moved(moved)`` gets the ``{src: dst}`` of every
+    batch. Folders earlier runs created and paths matching ``exclude`` are
+    neither watched nor organized. With ``sniff``, new files the extension
+    cannot place are classified by content. Stop with ``watcher.stop()``.
+    """
+    folder = os.path.abspath(folder)
+    sniff_cache = SniffCache() if sniff else None
+    scan_filter = ScanFilter(folder, types or DEFAULT_TYPES, exclude, rules=RULES + (rule,))
+
+    def wanted(path):
+        if scan_filter.skip_file is not None and scan_filter.skip_file(path):
+            return False
+        return not scan_filter.skip_tree(os.path.dirname(path))
+
+    def on_paths(paths):
+        # None: events were lost, so look at the whole folder once
+        records = None
+        if paths is not None:
+            records = settled_records([p for p in paths if wanted(p)])
+            if not records:
+                return
+        plan = plan_moves(folder, rule, types, records, duplicates, jobs, layout=layout,
+                          exclude=exclude, sniff=sniff, sniff_cache=sniff_cache)
+        if not len(plan):
+            return
+        moved = execute_plan(plan, jobs, journal, undo_log)
+        if on_moved is not None:
+            on_moved(moved)
+
+    return FolderWatcher(folder, on_paths, settle, recursive=recursive,
+                         skip_dir=scan_filter.skip_dir).start()
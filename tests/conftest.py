@@ -0,0 +1,56 @@
+import os
+
+import pytest
+
+from file_organizer import Metrics, UndoLog, set_metrics
+
+
+@pytest.fixture(autouse=True)
+def metrics():
+    """A fresh, quiet set of metrics per test."""
+    m = Metrics()
+    set_metrics(m)
+    return m
+
+
+@pytest.fixture
+def root(tmp_path):
+    """The folder a test organizes."""
+    path = tmp_path / "root"
+    path.mkdir()
+    return str(path)
+
+
+@pytest.fixture
+def undo_log(tmp_path):
+    return UndoLog(str(tmp_path / "undo"))
+
+
+def _write(root, files):
+    for rel, content in files.items():
+        path = os.path.join(root, rel)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(content)
+
+
+def _snapshot(root):
+    found = {}
+    for folder, _, names in os.walk(root):
+        for name in names:
+            path = os.path.join(folder, name)
+            with open(path, encoding="utf-8") as f:
+                found[os.path.relpath(path, root)] = f.read()
+    return found
+
+
+@pytest.fixture
+def write():
+    """``write(root, {relative path: content})`` creates the files."""
+    return _write
+
+
+@pytest.fixture
+def snapshot():
+    """``snapshot(root)`` is ``{relative path: content}`` of every file below root."""
+    return _snapshot
@@ -0,0 +1,24 @@
+import os
+
+from file_organizer.bench import make_tree
+
+
+def contents(root):
+    found = {}
+    for folder, _, names in os.walk(root):
+        for name in names:
+            path = os.path.join(folder, name)
+            with open(path, "rb") as f:
+                found[os.path.relpath(path, root)] = f.read()
+    return found
+
+
+def test_same_seed_same_tree(tmp_path):
+    one, two, other = (str(tmp_path / n) for n in ("one", "two", "other"))
+    make_tree(one, files=200, depth=2, fanout=3, max_size=4096, seed=7)
+    make_tree(two, files=200, depth=2, fanout=3, max_size=4096, seed=7)
+    make_tree(other, files=200, depth=2, fanout=3, max_size=4096, seed=8)
+    tree = contents(one)
+    assert len(tree) == 200
+    assert tree == contents(two)
+    assert tree != contents(other)
@@ -0,0 +1,22 @@
+from file_organizer import CategoryIndex
+
+TYPES = {"Archives": [".tar.gz", ".gz", ".zip"], "Docs": [".PDF", ".txt"],
+         "Backups": [".bak.tar.gz", ".txt"]}
+
+
+def test_lookup_by_extension():
+    index = CategoryIndex(TYPES)
+    assert index.classify("paper.PDF", ".pdf") == "Docs"
+    assert index.classify("notes.txt", ".txt") == "Docs"  # first category wins
+    assert index.classify("song.mp3", ".mp3") is None
+    assert ".pdf" in index and ".mp3" not in index
+
+
+def test_compound_extensions():
+    index = CategoryIndex(TYPES)
+    assert index.classify("src.tar.gz", ".gz") == "Archives"
+    assert index.classify("SRC.TAR.GZ", ".gz") == "Archives"
+    assert index.classify("db.bak.tar.gz", ".gz") == "Backups"  # longest match
+    assert index.classify("plain.gz", ".gz") == "Archives"
+    # The whole name is not a suffix of itself
+    assert CategoryIndex({"Archives": [".tar.gz"]}).classify(".tar.gz", ".gz") is None
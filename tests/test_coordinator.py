@@ -0,0 +1,43 @@
+import os
+
+import pytest
+
+from file_organizer import check_roots, organize_roots, plan_moves, plan_roots, split_roots
+
+
+def test_process_pool_plans_like_one_scan(root, write):
+    write(root, {"a.jpg": "1", "s1/a.jpg": "2", "s2/a.jpg": "3", "s2/deep/b.txt": "4"})
+    serial = plan_moves(root)
+    pooled = plan_roots([root], split=True, processes=2)
+    assert [(m.rec.path, m.dst) for m in pooled] == [(m.rec.path, m.dst) for m in serial]
+
+
+def test_overlapping_roots_are_refused(tmp_path):
+    (tmp_path / "a" / "b").mkdir(parents=True)
+    (tmp_path / "ab").mkdir()
+    a, b = str(tmp_path / "a"), str(tmp_path / "a" / "b")
+    assert check_roots([a, a, str(tmp_path / "ab")]) == [a, str(tmp_path / "ab")]
+    with pytest.raises(ValueError):
+        check_roots([b, a])
+    with pytest.raises(ValueError):
+        check_roots([str(tmp_path / "missing")])
+
+
+def test_split_units(root, write):
+    write(root, {"a.txt": "", "s1/b.txt": "", "s2/c.txt": ""})
+    assert split_roots([root]) == [(root, root, True)]
+    assert sorted(split_roots([root], split=True)) == sorted([
+        (root, root, False), (root, os.path.join(root, "s1"), True),
+        (root, os.path.join(root, "s2"), True)])
+
+
+def test_several_roots_are_one_batch(tmp_path, undo_log, write, snapshot):
+    roots = [str(tmp_path / "one"), str(tmp_path / "two")]
+    for i, root in enumerate(roots):
+        write(root, {"a.jpg": str(i), "b.txt": str(i)})
+    moved = organize_roots(roots, processes=0, undo_log=undo_log)
+    assert len(moved) == 4
+    assert snapshot(roots[1]) == {os.path.join("Images", "a.jpg"): "1", os.path.join("Docs", "b.txt"): "1"}
+    [batch] = undo_log.committed()
+    undo_log.rollback(batch)
+    assert [snapshot(root) for root in roots] == [{"a.jpg": "0", "b.txt": "0"}, {"a.jpg": "1", "b.txt": "1"}]
@@ -0,0 +1,88 @@
+import os
+
+import pytest
+
+from file_organizer import HashCache, execute_plan, find_duplicates, organize_folder, plan_moves, scan_folder
+from file_organizer import duplicates as duplicates_module
+
+
+def undo_last(undo_log):
+    return undo_log.rollback(undo_log.committed()[-1])
+
+
+def groups(root, **kwargs):
+    found = find_duplicates(scan_folder(root), **kwargs)
+    return sorted(sorted(os.path.relpath(r.path, root) for r in group) for group in found)
+
+
+def test_groups_identical_content(root, write):
+    write(root, {"a": "same", "b": "same", "c": "diff", "d": "longer", "e": "", "f": ""})
+    # Empty files are never duplicates
+    assert groups(root) == [["a", "b"]]
+
+
+def test_large_files_compare_every_byte(root, write, monkeypatch):
+    monkeypatch.setattr(duplicates_module, "MMAP_MIN", 1)
+    edge = duplicates_module.EDGE
+    head, tail = "h" * edge, "t" * edge
+    write(root, {"a": head + "x" + tail, "b": head + "x" + tail, "c": head + "y" + tail})
+    assert groups(root) == [["a", "b"]]
+
+
+def test_file_emptied_after_the_scan_is_dropped(root, write, monkeypatch):
+    monkeypatch.setattr(duplicates_module, "MMAP_MIN", 1)
+    body = "x" * (3 * duplicates_module.EDGE)
+    write(root, {"a": body, "b": body, "c": body})
+    partial_hash = duplicates_module.partial_hash
+
+    def truncate_a(path, size):
+        digest = partial_hash(path, size)
+        if os.path.basename(path) == "a":
+            open(path, "w").close()
+        return digest
+
+    monkeypatch.setattr(duplicates_module, "partial_hash", truncate_a)
+    assert groups(root) == [["b", "c"]]
+
+
+def test_key_narrows_the_groups(root, write):
+    write(root, {"x/a": "same", "x/b": "same", "y/c": "same"})
+    assert groups(root, key=lambda rec: os.path.dirname(rec.path)) == [
+        [os.path.join("x", "a"), os.path.join("x", "b")]]
+
+
+def test_cache_survives_between_runs(root, tmp_path, write, monkeypatch):
+    write(root, {"a": "same", "b": "same"})
+    cache = HashCache(str(tmp_path / "hashes.db"))
+    assert len(find_duplicates(scan_folder(root), cache=cache)) == 1
+    cache.close()
+
+    def no_reads(path, size):
+        raise AssertionError("hashed again")
+    monkeypatch.setattr(duplicates_module, "partial_hash", no_reads)
+    assert len(find_duplicates(scan_folder(root), cache=HashCache(str(tmp_path / "hashes.db")))) == 1
+
+
+@pytest.mark.parametrize("policy", ["delete", "hardlink"])
+def test_duplicates_round_trip(root, undo_log, write, snapshot, policy):
+    write(root, {"a.txt": "same", "b.txt": "same", "Docs/kept.txt": "same"})
+    organize_folder(root, undo_log=undo_log, duplicates=policy)
+    after = snapshot(root)
+    assert "a.txt" not in after and "b.txt" not in after
+    if policy == "delete":
+        assert after == {os.path.join("Docs", "kept.txt"): "same"}
+    else:
+        link = os.path.join(root, "Docs", "a.txt")
+        assert os.stat(link).st_ino == os.stat(os.path.join(root, "Docs", "kept.txt")).st_ino
+    undo_last(undo_log)
+    assert snapshot(root) == {"a.txt": "same", "b.txt": "same", os.path.join("Docs", "kept.txt"): "same"}
+
+
+def test_changed_keeper_is_not_deleted(root, write, snapshot):
+    write(root, {"a.txt": "same", "Docs/kept.txt": "same"})
+    plan = plan_moves(root, duplicates="delete")
+    assert [m.action for m in plan] == ["delete"]
+    kept = os.path.join(root, "Docs", "kept.txt")
+    os.utime(kept, (1, 1))
+    execute_plan(plan)
+    assert snapshot(root) == {os.path.join("Docs", "a.txt"): "same", os.path.join("Docs", "kept.txt"): "same"}
@@ -0,0 +1,75 @@
+import datetime
+import os
+import time
+
+from file_organizer import FileIndex, ScanFilter
+from file_organizer.rules import DEFAULT_TYPES
+
+
+def paths(index, folder, **kwargs):
+    return sorted(r.path for records in index.iter_dirs(folder, **kwargs) for r in records)
+
+
+# Directories changed within RACY_SECONDS are always listed again
+PAST = time.time() - 60
+
+
+def age(*folders):
+    for folder in folders:
+        os.utime(folder, (PAST, PAST))
+
+
+def test_incremental_rescan(root, tmp_path, write):
+    write(root, {"a.txt": "a", "sub/b.jpg": "b"})
+    sub = os.path.join(root, "sub")
+    age(root, sub)
+    index = FileIndex(str(tmp_path / "index.db"))
+    assert paths(index, root) == [os.path.join(root, "a.txt"), os.path.join(sub, "b.jpg")]
+
+    write(root, {"sub/c.png": "c"})
+    os.remove(os.path.join(root, "a.txt"))
+    assert paths(index, root) == [os.path.join(sub, "b.jpg"), os.path.join(sub, "c.png")]
+    # Same answer from a new connection, i.e. from what was stored
+    index.close()
+    assert paths(FileIndex(str(tmp_path / "index.db")), root) == [os.path.join(sub, "b.jpg"),
+                                                                  os.path.join(sub, "c.png")]
+
+
+def test_unchanged_folder_comes_from_the_index(root, tmp_path, write):
+    write(root, {"a.txt": "a"})
+    age(root)
+    index = FileIndex(str(tmp_path / "index.db"))
+    paths(index, root)
+    # A file rewritten in place does not change its folder: the cached row stays
+    write(root, {"a.txt": "longer content"})
+    age(root)
+    assert [r.size for rs in index.iter_dirs(root) for r in rs] == [1]
+    assert [r.size for rs in index.iter_dirs(root, full=True) for r in rs] == [14]
+
+
+def test_folder_skipped_below_is_found_from_above(root, tmp_path, write):
+    write(root, {"b/Images/p.jpg": "p", "b/q.jpg": "q"})
+    inner = os.path.join(root, "b")
+    age(root, inner, os.path.join(inner, "Images"))
+    index = FileIndex(str(tmp_path / "index.db"))
+    below = ScanFilter(inner, DEFAULT_TYPES)
+    assert paths(index, inner, skip_dir=below.skip_dir) == [os.path.join(inner, "q.jpg")]
+    above = ScanFilter(root, DEFAULT_TYPES)
+    assert paths(index, root, skip_dir=above.skip_dir) == [os.path.join(inner, "Images", "p.jpg"),
+                                                            os.path.join(inner, "q.jpg")]
+
+
+def test_query_filters(root, tmp_path, write):
+    from file_organizer import CategoryIndex
+    write(root, {"a.txt": "a", "b.jpg": "b", "sub/c.jpg": "c", "sub2/d.jpg": "d"})
+    os.utime(os.path.join(root, "b.jpg"), (PAST, PAST))
+    index = FileIndex(str(tmp_path / "index.db"), CategoryIndex(DEFAULT_TYPES))
+    index.refresh(root)
+
+    def names(**kwargs):
+        return sorted(r.name for rs in index.query(root, **kwargs) for r in rs)
+
+    assert names(exts=[".jpg"]) == ["b.jpg", "c.jpg", "d.jpg"]
+    assert names(category="Images", date_to=datetime.datetime.fromtimestamp(PAST + 1)) == ["b.jpg"]
+    # A sibling folder whose name starts with the root's is not below it
+    assert [r.name for rs in index.query(os.path.join(root, "sub")) for r in rs] == ["c.jpg"]
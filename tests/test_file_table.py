@@ -0,0 +1,61 @@
+import datetime
+import os
+
+import pytest
+
+from file_organizer import CategoryIndex, FileTable, TableView, scan_folder
+from file_organizer import file_table as file_table_module
+from file_organizer.rules import DEFAULT_TYPES
+
+
+@pytest.fixture(params=["numpy", "arrays"])
+def table(request, monkeypatch):
+    if request.param == "arrays":
+        monkeypatch.setattr(file_table_module, "numpy", None)
+    elif file_table_module.numpy is None:
+        pytest.skip("NumPy is not installed")
+    return FileTable(CategoryIndex(dict(DEFAULT_TYPES, Archives=[".tar.gz"])))
+
+
+def test_rows_read_back_as_records(root, write, table):
+    write(root, {"a.jpg": "1", "sub/b.tar.gz": "22", "sub/ünï.txt": "333"})
+    records = sorted(scan_folder(root))
+    assert table.extend(records) == range(3)
+    assert sorted(table) == records
+    assert table[-1] == table[2]
+    assert {table.category_of(r) for r in range(3)} == {"Images", "Archives", "Docs"}
+
+
+def test_select(root, write, table):
+    write(root, {"a.jpg": "1", "b.png": "2", "c.txt": "3", "d.jpg": "4"})
+    old = datetime.datetime(2001, 1, 1).timestamp()
+    os.utime(os.path.join(root, "d.jpg"), (old, old))
+    table.extend(sorted(scan_folder(root)))
+
+    def names(**kwargs):
+        return [table.name(r) for r in table.select(**kwargs)]
+
+    assert names(exts=[".jpg"]) == ["a.jpg", "d.jpg"]
+    assert names(category="Images", date_from=datetime.datetime(2002, 1, 1)) == ["a.jpg", "b.png"]
+    assert names(date_to=datetime.datetime(2002, 1, 1)) == ["d.jpg"]
+    assert names(exts=[".mp3"]) == [] and names(category="Videos") == []
+    assert names(exts=[".jpg"], rows=range(1, 4)) == ["d.jpg"]
+    assert [r.name for r in TableView(table, table.select(category="Images"))[1:]] == ["b.png", "d.jpg"]
+
+
+def test_relocate(root, write, table):
+    write(root, {"a.jpg": "1", "b.jpg": "2", "c.jpg": "3"})
+    table.extend(sorted(scan_folder(root)))
+    images = os.path.join(root, "Images")
+    os.mkdir(images)
+    moves = {os.path.join(root, n): os.path.join(images, n) for n in ("a.jpg", "b.jpg")}
+    moves[os.path.join(root, "c.jpg")] = os.path.join(images, "packed.tar", "c.jpg")
+    for old, new in list(moves.items())[:2]:
+        os.rename(old, new)
+    actions = {os.path.join(root, "c.jpg"): "pack"}
+    assert table.relocate(moves, actions) == 2
+    assert [table.path(r) for r in table.select()] == [os.path.join(images, "a.jpg"),
+                                                       os.path.join(images, "b.jpg")]
+    # Moved again, under a new name
+    assert table.relocate({os.path.join(images, "a.jpg"): os.path.join(root, "a_1.jpg")}) == 1
+    assert table.name(0) == "a_1.jpg"
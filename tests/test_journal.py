@@ -0,0 +1,123 @@
+import datetime
+import json
+import os
+
+import pytest
+
+from file_organizer import Journal, organize_folder
+from file_organizer import journal as journal_module
+
+
+class Clock:
+    """Replaces the journal's ``time`` module; moves only when told to."""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(journal_module, "time", clock)
+    return clock
+
+
+@pytest.fixture
+def fsyncs(monkeypatch):
+    calls = []
+    monkeypatch.setattr(os, "fsync", calls.append)
+    return calls
+
+
+def lines(path):
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding="utf-8") as f:
+        return f.read().splitlines()
+
+
+def test_flushes_on_batch_size(tmp_path, clock):
+    path = str(tmp_path / "log.txt")
+    journal = Journal(path, batch_size=3, flush_interval=60)
+    journal.record("move", "a", "b")
+    journal.record("move", "c", "d")
+    assert lines(path) == []
+    journal.record("move", "e", "f")
+    assert len(lines(path)) == 3
+    journal.close()
+
+
+def test_flushes_on_interval(tmp_path, clock):
+    path = str(tmp_path / "log.txt")
+    journal = Journal(path, batch_size=100, flush_interval=0.5)
+    journal.record("move", "a", "b")
+    clock.now += 0.2
+    journal.record("move", "c", "d")
+    assert lines(path) == []
+    clock.now += 0.4
+    journal.record("move", "e", "f")
+    assert len(lines(path)) == 3
+    journal.close()
+
+
+@pytest.mark.parametrize("policy, expected", [("none", 0), ("batch", 3), ("interval", 2)])
+def test_fsync_policies(tmp_path, clock, fsyncs, policy, expected):
+    journal = Journal(str(tmp_path / "log.txt"), fsync=policy, batch_size=1,
+                      fsync_interval_ms=1000)
+    journal.record("move", "a", "b")   # interval: too soon after opening
+    clock.now += 1.5
+    journal.record("move", "c", "d")   # interval: due
+    journal.close()                    # every policy but "none" syncs on close
+    assert len(fsyncs) == expected
+
+
+def test_close_writes_what_is_pending(tmp_path, clock):
+    path = str(tmp_path / "log.txt")
+    with Journal(path, batch_size=100, flush_interval=60) as journal:
+        journal.record("move", "a", "b")
+        assert lines(path) == []
+    assert len(lines(path)) == 1
+
+
+def test_organize_flushes_at_the_end(root, tmp_path, write):
+    write(root, {"a.txt": "", "b.jpg": ""})
+    path = str(tmp_path / "log.txt")
+    journal = Journal(path, fmt="jsonl", batch_size=100, flush_interval=60)
+    organize_folder(root, journal=journal)
+    assert sorted(json.loads(line)["src"] for line in lines(path)) == \
+        [os.path.join(root, "a.txt"), os.path.join(root, "b.jpg")]
+    journal.close()
+
+
+def test_text_lines_are_unchanged(tmp_path, clock):
+    path = str(tmp_path / "log.txt")
+    with Journal(path) as journal:
+        journal.record("move", "/in/a.txt", "/in/Docs/a.txt")
+        journal.record("undo", "/in/Docs/a.txt", "/in/a.txt")
+    when = datetime.datetime.fromtimestamp(clock.now)
+    assert lines(path) == [f"{when} | /in/a.txt -> /in/Docs/a.txt",
+                           f"{when} | Undo: /in/Docs/a.txt -> /in/a.txt"]
+
+
+def test_jsonl_records(tmp_path, clock):
+    path = str(tmp_path / "log.jsonl")
+    with Journal(path, fmt="jsonl") as journal:
+        journal.record_result([("a", "Docs/packed.tar/a", "pack"), ("b", "Docs/packed.tar/b", "pack")])
+        journal.record_result(("c", "Docs/c", "move"))
+    assert [json.loads(line) for line in lines(path)] == [
+        {"ts": clock.now, "op": "pack", "src": "a", "dst": "Docs/packed.tar/a"},
+        {"ts": clock.now, "op": "pack", "src": "b", "dst": "Docs/packed.tar/b"},
+        {"ts": clock.now, "op": "move", "src": "c", "dst": "Docs/c"}]
+
+
+def test_rejects_unknown_settings(tmp_path):
+    with pytest.raises(ValueError):
+        Journal(str(tmp_path / "log"), fmt="xml")
+    with pytest.raises(ValueError):
+        Journal(str(tmp_path / "log"), fsync="always")
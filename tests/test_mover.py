@@ -0,0 +1,43 @@
+import os
+
+import pytest
+
+from file_organizer import NameIndex, move_into, rename_noreplace
+
+
+def test_claim_picks_the_next_free_suffix(root, write):
+    write(root, {"Docs/a.txt": "", "Docs/a_1.txt": "", "Docs/a_3.txt": ""})
+    docs = os.path.join(root, "Docs")
+    names = NameIndex()
+    assert [os.path.basename(names.claim(docs, "a.txt")) for _ in range(3)] == \
+        ["a_2.txt", "a_4.txt", "a_5.txt"]
+    assert names.claim(docs, "b.txt") == os.path.join(docs, "b.txt")
+
+
+def test_claim_creates_missing_folders_unless_planning(root):
+    target = os.path.join(root, "New")
+    NameIndex(create_dirs=False).claim(target, "a.txt")
+    assert not os.path.exists(target)
+    NameIndex().claim(target, "a.txt")
+    assert os.path.isdir(target)
+
+
+def test_rename_never_clobbers(root, write, snapshot):
+    write(root, {"a.txt": "mine", "b.txt": "theirs"})
+    with pytest.raises(FileExistsError):
+        rename_noreplace(os.path.join(root, "a.txt"), os.path.join(root, "b.txt"))
+    assert snapshot(root) == {"a.txt": "mine", "b.txt": "theirs"}
+
+
+def test_move_into_skips_names_created_after_listing(root, write, snapshot):
+    write(root, {"a.txt": "mine"})
+    docs = os.path.join(root, "Docs")
+    names = NameIndex()
+    names.claim(docs, "x.txt")  # lists Docs while it is still empty
+    write(root, {"Docs/a.txt": "created meanwhile"})
+    seen = []
+    dst = move_into(os.path.join(root, "a.txt"), docs, names=names, before_move=seen.append)
+    assert dst == os.path.join(docs, "a_1.txt")
+    assert seen == [os.path.join(docs, "a.txt"), dst]
+    assert snapshot(root) == {os.path.join("Docs", "a.txt"): "created meanwhile",
+                              os.path.join("Docs", "a_1.txt"): "mine"}
@@ -0,0 +1,96 @@
+import os
+import tarfile
+import zipfile
+
+import pytest
+
+from file_organizer import PackLayout, organize_folder, plan_moves, read_member, scan_folder
+
+FILES = {"a.jpg": "photo", "b.pdf": "paper", "sub/c.mp3": "song", "sub/a.jpg": "other photo",
+         "noext": "plain"}
+
+
+def undo_last(undo_log):
+    return undo_log.rollback(undo_log.committed()[-1])
+
+
+def test_user_archive_without_index_is_a_file(root, write):
+    write(root, {"x/packed.tar": "not ours", "y/packed.tar": "", "y/packed.tar.idx": ""})
+    assert [r.path for r in scan_folder(root)] == [os.path.join(root, "x", "packed.tar")]
+
+
+def test_pack_plan_counts(root, write):
+    write(root, {"a.txt": "a", "b.txt": "b", "c.jpg": "c"})
+    plan = plan_moves(root, pack=PackLayout(only=("Docs",)))
+    assert len(plan.packed) == 2 and len(plan.duplicates) == 0
+
+
+@pytest.mark.parametrize("fmt", ["tar", "zip"])
+def test_pack_round_trip(root, undo_log, write, snapshot, fmt):
+    write(root, FILES)
+    organize_folder(root, undo_log=undo_log, pack=PackLayout(fmt))
+    archive = os.path.join(root, "Images", f"packed.{fmt}")
+    assert read_member(archive, "a.jpg") == b"photo"
+    # Only the file no category takes is left to scan
+    assert [r.name for r in scan_folder(root)] == ["noext"]
+    undo_last(undo_log)
+    assert snapshot(root) == FILES
+    assert not os.path.exists(archive)
+
+
+def test_pack_undo_keeps_member_when_name_is_taken(root, undo_log, write, snapshot):
+    write(root, {"a.txt": "mine", "b.txt": "more"})
+    organize_folder(root, undo_log=undo_log, pack=PackLayout())
+    write(root, {"a.txt": "someone else's"})
+    restored = undo_last(undo_log)
+    assert list(restored) == [os.path.join(root, "b.txt")]
+    assert snapshot(root)["a.txt"] == "someone else's"
+    assert read_member(os.path.join(root, "Docs", "packed.tar"), "a.txt") == b"mine"
+
+    os.remove(os.path.join(root, "a.txt"))
+    undo_last(undo_log)
+    assert snapshot(root) == {"a.txt": "mine", "b.txt": "more"}
+
+
+def test_pack_skips_file_changed_since_planning(root, undo_log, write, snapshot):
+    from file_organizer import plan_moves, execute_plan
+    write(root, {"a.txt": "mine", "b.txt": "more"})
+    plan = plan_moves(root, pack=PackLayout())
+    os.utime(os.path.join(root, "a.txt"), (1, 1))
+    execute_plan(plan, undo_log=undo_log)
+    assert os.path.exists(os.path.join(root, "a.txt"))
+    assert not os.path.exists(os.path.join(root, "b.txt"))
+    assert list(undo_last(undo_log)) == [os.path.join(root, "b.txt")]
+    assert snapshot(root) == {"a.txt": "mine", "b.txt": "more"}
+    assert undo_log.committed() == []
+
+
+@pytest.mark.parametrize("fmt", ["tar", "zip"])
+def test_archives_are_standard_and_grow(root, write, fmt):
+    write(root, {"a.txt": "first"})
+    organize_folder(root, pack=PackLayout(fmt))
+    write(root, {"a.txt": "second", "b.txt": "third"})
+    organize_folder(root, pack=PackLayout(fmt))
+    archive = os.path.join(root, "Docs", f"packed.{fmt}")
+    if fmt == "tar":
+        with tarfile.open(archive) as tf:
+            found = {m.name: tf.extractfile(m).read() for m in tf.getmembers()}
+    else:
+        with zipfile.ZipFile(archive) as zf:
+            found = {name: zf.read(name) for name in zf.namelist()}
+    assert found == {"a.txt": b"first", "a_1.txt": b"second", "b.txt": b"third"}
+    assert read_member(archive, "a_1.txt") == b"second"
+
+
+def test_without_pread(root, undo_log, write, snapshot, monkeypatch):
+    # As on Windows
+    monkeypatch.delattr(os, "pread")
+    monkeypatch.delattr(os, "pwrite")
+    for fmt in ("tar", "zip"):
+        write(root, {"a.txt": "mine", "b.txt": "more"})
+        organize_folder(root, undo_log=undo_log, pack=PackLayout(fmt))
+        assert read_member(os.path.join(root, "Docs", f"packed.{fmt}"), "b.txt") == b"more"
+        undo_last(undo_log)
+        assert snapshot(root) == {"a.txt": "mine", "b.txt": "more"}
+        os.remove(os.path.join(root, "a.txt"))
+        os.remove(os.path.join(root, "b.txt"))
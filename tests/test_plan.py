@@ -0,0 +1,46 @@
+import os
+
+from file_organizer import MovePlan, execute_plan, plan_moves
+
+
+def test_save_load_apply(root, tmp_path, undo_log, write, snapshot):
+    write(root, {"a.jpg": "1", "sub/a.jpg": "2", "b.txt": "same", "c.txt": "same"})
+    plan = plan_moves(root, duplicates="delete")
+    saved = str(tmp_path / "plan.jsonl")
+    plan.save(saved)
+    loaded = MovePlan.load(saved)
+    assert (loaded.root, loaded.rule) == (plan.root, plan.rule)
+    assert list(loaded) == list(plan)
+    assert len(loaded.conflicts) == 1 and len(loaded.duplicates) == 1
+
+    moved = execute_plan(loaded, undo_log=undo_log)
+    assert len(moved) == 4
+    assert snapshot(root) == {os.path.join("Images", "a.jpg"): "1",
+                              os.path.join("Images", "a_1.jpg"): "2",
+                              os.path.join("Docs", "b.txt"): "same"}
+    undo_log.rollback(undo_log.committed()[-1])
+    assert snapshot(root) == {"a.jpg": "1", os.path.join("sub", "a.jpg"): "2", "b.txt": "same",
+                              "c.txt": "same"}
+
+
+def test_plan_moves_nothing(root, write, snapshot):
+    write(root, {"a.jpg": "1"})
+    plan = plan_moves(root)
+    assert [m.dst for m in plan] == [os.path.join(root, "Images", "a.jpg")]
+    assert snapshot(root) == {"a.jpg": "1"}
+
+
+def test_existing_names_are_conflicts(root, write, snapshot):
+    write(root, {"a.jpg": "new", "Images/a.jpg": "old"})
+    plan = plan_moves(root)
+    assert [(m.dst, m.conflict) for m in plan] == [(os.path.join(root, "Images", "a_1.jpg"), True)]
+
+
+def test_vanished_source_is_an_error(root, write, snapshot, metrics):
+    write(root, {"a.jpg": "1", "b.jpg": "2"})
+    plan = plan_moves(root)
+    os.remove(os.path.join(root, "a.jpg"))
+    moved = execute_plan(plan)
+    assert list(moved) == [os.path.join(root, "b.jpg")]
+    assert metrics.counter("errors_total", op="move", errno="ENOENT") == 1
+    assert snapshot(root) == {os.path.join("Images", "b.jpg"): "2"}
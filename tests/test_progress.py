@@ -0,0 +1,55 @@
+from file_organizer import OrganizeEngine, ProgressMeter, format_progress
+from file_organizer.progress import Progress
+
+
+class Clock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_reports_are_rate_limited():
+    clock = Clock()
+    meter = ProgressMeter(total=100, hz=10, clock=clock)
+    assert not meter.add()
+    clock.now += 0.05
+    assert not meter.add()
+    clock.now += 0.06
+    assert meter.add()
+    assert not meter.add()
+    assert meter.done == 4
+
+
+def test_rates_and_eta():
+    clock = Clock()
+    meter = ProgressMeter(total=100, clock=clock)
+    clock.now += 2
+    meter.add(20, 4_000_000)
+    progress = meter.snapshot()
+    assert (progress.done, progress.files_per_s, progress.bytes_per_s) == (20, 10.0, 2e6)
+    assert progress.eta == 8.0 and progress.elapsed == 2
+
+
+def test_format():
+    running = Progress(1200, 5000, 10**7, 2.0, 850.4, 12.4e6, 4.4)
+    assert format_progress(running) == "1200/5000 files | 850 files/s | 12.4 MB/s | ETA 0:04"
+    finished = Progress(5000, 5000, 0, 3725, 0.0, 0.0, None)
+    assert format_progress(finished) == "5000/5000 files | 0 files/s | 1:02:05 elapsed"
+
+
+def test_engine_coalesces_progress():
+    engine = OrganizeEngine(jobs=4, progress_hz=1)
+    engine.start(list(range(2000)), lambda item: (str(item), str(item), "move"))
+    progress = []
+    while True:
+        event = engine.events.get(timeout=10)
+        if event[0] == "progress":
+            progress.append(event)
+        if event[0] == "done":
+            break
+    # Far fewer reports than files, and the last one is complete
+    assert 1 <= len(progress) <= 5
+    assert progress[-1][1:3] == (2000, 2000)
+    assert len(event[1]) == 2000 and not event[2]
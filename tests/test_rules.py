@@ -0,0 +1,62 @@
+import datetime
+import os
+
+import pytest
+
+from file_organizer import CategoryIndex, FileRecord, RuleError, compile_rules, target_dir_for
+from file_organizer.rules import DEFAULT_TYPES, top_folders
+
+INDEX = CategoryIndex(DEFAULT_TYPES)
+NOW = datetime.datetime(2024, 6, 15, 12).timestamp()
+DAY = 86400
+
+
+def rec(name, size=10, age_days=0):
+    return FileRecord(os.path.join("/in", name), name, os.path.splitext(name)[1].lower(), size,
+                      NOW - age_days * DAY, 1, 1)
+
+
+def target(spec, record, **kwargs):
+    found = compile_rules("/in", spec, INDEX, now=NOW, **kwargs)(record)
+    return None if found is None else os.path.relpath(found, "/in")
+
+
+def test_classic_rules():
+    when = datetime.date.fromtimestamp(NOW).isoformat()
+    assert os.path.relpath(target_dir_for("/in", "category", INDEX)(rec("a.jpg")), "/in") == "Images"
+    assert target_dir_for("/in", "category", INDEX)(rec("a.xyz")) == "/in"
+    assert os.path.relpath(target_dir_for("/in", "date", INDEX)(rec("a.jpg")), "/in") == when
+    assert os.path.relpath(target_dir_for("/in", "size", INDEX)(rec("a", 20 << 20)), "/in") == "Large (>10MB)"
+    nested = target_dir_for("/in", "date", INDEX, nested_dates=True)(rec("a.jpg"))
+    assert os.path.relpath(nested, "/in") == os.path.join(*when.split("-"))
+
+
+def test_templates():
+    assert target("category/{year}/{size_bucket}", rec("a.pdf")) == \
+        os.path.join("Docs", "2024", "Small (<1MB)")
+    assert target("By type/{ext}", rec("noext")) == os.path.join("By type", "no_ext")
+    # An unknown category does not resolve, so the file stays put
+    assert target("category/{year}", rec("a.xyz")) is None
+
+
+def test_first_matching_rule_wins():
+    spec = "ext:.jpg,png size>1MB => Photos/Large; age>365d => Archive/{year}; category"
+    assert target(spec, rec("a.PNG", 2 << 20)) == os.path.join("Photos", "Large")
+    assert target(spec, rec("a.jpg", 10)) == "Images"
+    assert target(spec, rec("a.jpg", 10, age_days=400)) == os.path.join("Archive", "2023")
+    assert target(spec, rec("a.xyz")) is None
+    assert target("glob:report* category:Docs => Reports", rec("report-1.pdf")) == "Reports"
+    assert target("glob:report* category:Docs => Reports", rec("report-1.jpg")) is None
+    assert target("size>=1k size<=2k => Mid", rec("a", 1024)) == "Mid"
+
+
+@pytest.mark.parametrize("spec", ["", "{nope}", "a/../b", "ext:.a =>", "size>5parsecs => x",
+                                  "weird:token => x"])
+def test_bad_specs(spec):
+    with pytest.raises(RuleError):
+        compile_rules("/in", spec, INDEX)
+
+
+def test_top_folders():
+    assert top_folders("category") == []
+    assert top_folders("ext:.jpg => Photos/{year}; {category}/x; Archive") == ["Archive", "Photos"]
@@ -0,0 +1,83 @@
+import os
+import time
+
+from file_organizer import ScanStream, scan_folder
+
+
+class Ticker:
+    """Stands in for a Tk widget: ``after`` callbacks run from ``run()``."""
+
+    def __init__(self):
+        self.calls = []
+
+    def after(self, ms, func):
+        self.calls.append(func)
+
+    def run(self, timeout=5):
+        deadline = time.monotonic() + timeout
+        while self.calls and time.monotonic() < deadline:
+            self.calls.pop(0)()
+            time.sleep(0.001)
+
+
+def test_records_match_stat(root, write):
+    write(root, {"a.JPG": "photo", "sub/b.tar.gz": "archive", "sub/deeper/noext": "plain"})
+    records = {os.path.relpath(r.path, root): r for r in scan_folder(root)}
+    assert sorted(records) == ["a.JPG", os.path.join("sub", "b.tar.gz"),
+                               os.path.join("sub", "deeper", "noext")]
+    rec = records["a.JPG"]
+    st = os.stat(rec.path)
+    assert (rec.name, rec.ext) == ("a.JPG", ".jpg")
+    assert (rec.size, rec.mtime, rec.ino, rec.dev) == (st.st_size, st.st_mtime, st.st_ino, st.st_dev)
+    assert records[os.path.join("sub", "deeper", "noext")].ext == ""
+
+
+def test_skip_dir_and_skip_file(root, write):
+    write(root, {"a.txt": "", "skip/b.txt": "", "keep/c.log": "", "keep/d.txt": ""})
+    found = scan_folder(root, skip_dir=lambda p: p.endswith("skip"),
+                        skip_file=lambda p: p.endswith(".log"))
+    assert sorted(r.name for r in found) == ["a.txt", "d.txt"]
+
+
+def test_symlinks(root, tmp_path, write):
+    write(str(tmp_path), {"outside/x.txt": "x"})
+    write(root, {"a.txt": "a"})
+    os.symlink(str(tmp_path / "outside"), os.path.join(root, "linked_dir"))
+    os.symlink(str(tmp_path / "outside" / "x.txt"), os.path.join(root, "link.txt"))
+    os.symlink(str(tmp_path / "missing"), os.path.join(root, "dangling.txt"))
+    records = {r.name: r for r in scan_folder(root)}
+    # Linked folders are not entered; a linked file is recorded as the link
+    assert sorted(records) == ["a.txt", "link.txt"]
+    assert records["link.txt"].ino == os.lstat(os.path.join(root, "link.txt")).st_ino
+
+
+def test_unreadable_folder_is_reported(root, write):
+    errors = []
+    assert scan_folder(os.path.join(root, "missing"), on_error=errors.append) == []
+    assert [type(e) for e in errors] == [FileNotFoundError]
+
+
+def test_stream_delivers_every_record(root, write):
+    write(root, {f"d{i}/f{j}.txt": "" for i in range(5) for j in range(3)})
+    got, done = [], []
+    ticker = Ticker()
+    stream = ScanStream(root, batch_size=4).start()
+    stream.poll(ticker, got.extend, lambda: done.append(True), interval=1)
+    ticker.run()
+    assert done == [True] and stream.finished and stream.error is None
+    assert len(got) == stream.discovered == 15
+    assert stream.dirs == 6
+
+
+def test_stream_ends_after_an_error(root):
+    def source(folder):
+        yield ["first"]
+        raise PermissionError("denied")
+
+    got, done = [], []
+    ticker = Ticker()
+    stream = ScanStream(root, source=source).start()
+    stream.poll(ticker, got.extend, lambda: done.append(True), interval=1)
+    ticker.run()
+    assert got == ["first"] and done == [True]
+    assert isinstance(stream.error, PermissionError)
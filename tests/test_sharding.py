@@ -0,0 +1,56 @@
+import os
+
+from file_organizer import ShardLayout, organize_folder
+from file_organizer.sharding import SHARD_MARKER, read_marker, shard_prefix
+
+
+def files_below(folder):
+    """``{name: depth below folder}`` of every file but the marker."""
+    found = {}
+    for directory, _, names in os.walk(folder):
+        depth = 0 if directory == folder else os.path.relpath(directory, folder).count(os.sep) + 1
+        found.update((n, depth) for n in names if n != SHARD_MARKER)
+    return found
+
+
+def test_place_is_stable():
+    assert shard_prefix("Photo.JPG", 2, 2) == shard_prefix("Photo.JPG", 2, 2)
+    assert [len(p) for p in shard_prefix("a.jpg", 1, 3)] == [1, 1, 1]
+    layout = ShardLayout(max_entries=2)
+    assert layout.place("/nowhere/Images", "a.jpg", incoming=2) == "/nowhere/Images"
+    assert ShardLayout(max_entries=2).place("/nowhere/Images", "a.jpg", incoming=3) == \
+        os.path.join("/nowhere/Images", *shard_prefix("a.jpg", 2, 1))
+
+
+def test_first_shard_moves_existing_files(root, undo_log, write, snapshot):
+    write(root, {"Docs/old.txt": "old", "a.txt": "a", "b.txt": "b"})
+    before = snapshot(root)
+    docs = os.path.join(root, "Docs")
+    organize_folder(root, undo_log=undo_log, layout=ShardLayout(max_entries=2, width=1))
+    assert read_marker(docs) == (1, 1)
+    assert files_below(docs) == {"old.txt": 1, "a.txt": 1, "b.txt": 1}
+
+    undo_log.rollback(undo_log.committed()[-1])
+    assert snapshot(root) == before
+    # Unsharded again: no shards and no marker
+    assert os.listdir(docs) == ["old.txt"]
+
+
+def test_full_shards_are_deepened(root, undo_log, write, snapshot):
+    docs = os.path.join(root, "Docs")
+    layout = dict(max_entries=1, width=1)
+    write(root, {f"a{i}.txt": str(i) for i in range(10)})
+    organize_folder(root, layout=ShardLayout(**layout))
+    assert read_marker(docs) == (1, 1)
+    first = snapshot(root)
+
+    # 16 shards of one file each can take 16 files; 40 need a second level
+    write(root, {f"b{i}.txt": str(i) for i in range(30)})
+    organize_folder(root, undo_log=undo_log, layout=ShardLayout(**layout))
+    assert read_marker(docs) == (1, 2)
+    assert set(files_below(docs).values()) == {2}
+    assert len(files_below(docs)) == 40
+
+    undo_log.rollback(undo_log.committed()[-1])
+    assert read_marker(docs) == (1, 1)
+    assert {k: v for k, v in snapshot(root).items() if k.startswith("Docs")} == first
@@ -0,0 +1,59 @@
+import os
+
+import pytest
+
+from file_organizer import (CategoryIndex, SniffCache, organize_folder, sniff_file, sniff_records,
+                            scan_folder, with_content_types)
+from file_organizer import sniff as sniff_module
+from file_organizer.rules import DEFAULT_TYPES
+
+HEADS = {"photo": b"\xff\xd8\xff\xe0 jfif", "image": b"\x89PNG\r\n\x1a\n....", "paper": b"%PDF-1.7",
+         "clip": b"\x00\x00\x00\x18ftypisom", "sheet": b"PK\x03\x04....xl/workbook.xml",
+         "script": b"#!/usr/bin/env python3\nprint()", "page": b"\xef\xbb\xbf<!DOCTYPE html>",
+         "blob": b"\x00\x01\x02", "empty": b""}
+
+
+def write_bytes(root, files):
+    for name, data in files.items():
+        with open(os.path.join(root, name), "wb") as f:
+            f.write(data)
+
+
+def test_magic_bytes(root):
+    write_bytes(root, HEADS)
+    found = {name: sniff_file(os.path.join(root, name)) for name in HEADS}
+    assert found == {"photo": ".jpg", "image": ".png", "paper": ".pdf", "clip": ".mp4",
+                     "sheet": ".xlsx", "script": ".py", "page": ".html", "blob": None, "empty": None}
+
+
+def test_only_unplaced_files_are_read(root, monkeypatch):
+    write_bytes(root, {"a.jpg": HEADS["paper"], "b.dat": HEADS["paper"], "c": HEADS["photo"]})
+    records = scan_folder(root)
+    read = []
+    real = sniff_module.sniff_file
+    monkeypatch.setattr(sniff_module, "sniff_file", lambda path: read.append(path) or real(path))
+    target_dir = with_content_types(lambda rec: rec.ext, records, CategoryIndex(DEFAULT_TYPES))
+    assert {rec.name: target_dir(rec) for rec in records} == {"a.jpg": ".jpg", "b.dat": ".pdf", "c": ".jpg"}
+    assert sorted(os.path.basename(p) for p in read) == ["b.dat", "c"]
+
+
+def test_cache_survives_between_runs(root, tmp_path, monkeypatch):
+    write_bytes(root, {"a": HEADS["photo"], "b": HEADS["blob"]})
+    cache = SniffCache(str(tmp_path / "sniff.db"))
+    assert sniff_records(scan_folder(root), cache=cache) == {os.path.join(root, "a"): ".jpg"}
+    cache.close()
+
+    def no_reads(path):
+        raise AssertionError("sniffed again")
+    monkeypatch.setattr(sniff_module, "sniff_file", no_reads)
+    cache = SniffCache(str(tmp_path / "sniff.db"))
+    assert sniff_records(scan_folder(root), cache=cache) == {os.path.join(root, "a"): ".jpg"}
+
+
+@pytest.mark.parametrize("name", ["movie.mp4.crdownload", "song.mp3.part", "doc.pdf.download",
+                                  "x.tmp"])
+def test_partial_downloads_stay(root, name, snapshot):
+    write_bytes(root, {name: HEADS["paper"], "done.pdf": HEADS["paper"]})
+    moved = organize_folder(root, sniff=True)
+    assert list(moved) == [os.path.join(root, "done.pdf")]
+    assert name in snapshot(root)
@@ -0,0 +1,91 @@
+import threading
+import time
+
+import pytest
+
+from file_organizer import IOBudget, TokenBucket, get_budget, organize_folder, set_budget
+from file_organizer.throttle import parse_bytes
+
+
+class Clock:
+    """A clock that only moves when the bucket sleeps."""
+
+    def __init__(self):
+        self.now = 0.0
+        self.slept = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def budget():
+    """``budget(...)`` installs an :class:`IOBudget` for the test."""
+    def install(*args, **kwargs):
+        set_budget(IOBudget(*args, **kwargs))
+        return get_budget()
+    yield install
+    set_budget(None)
+
+
+def test_bucket_allows_a_burst_then_the_rate():
+    clock = Clock()
+    bucket = TokenBucket(10, clock=clock, sleep=clock.sleep)
+    for _ in range(10):
+        assert bucket.take() == 0
+    assert bucket.take() == pytest.approx(0.1)
+    # Bigger than the bucket: allowed, paid for afterwards
+    assert bucket.take(20) == pytest.approx(2.0)
+    clock.now += 5
+    assert bucket.tokens < 0 and bucket.take() == 0
+
+
+def test_parse_bytes():
+    assert parse_bytes("50M") == 50 << 20
+    assert parse_bytes("1.5GiB") == 3 << 29
+    assert parse_bytes("200k/s") == 200 << 10
+    assert parse_bytes(4096) == 4096
+    with pytest.raises(ValueError):
+        parse_bytes("fast")
+
+
+def test_unlimited_budget_costs_nothing():
+    budget = IOBudget()
+    assert not budget.limited
+    with budget.op(1, 1 << 30):
+        pass
+
+
+def test_in_flight_cap(budget):
+    budget = budget(in_flight=2)
+    running, peak, lock = [0], [0], threading.Lock()
+
+    def work():
+        with budget.op(7):
+            with lock:
+                running[0] += 1
+                peak[0] = max(peak[0], running[0])
+            time.sleep(0.02)
+            with lock:
+                running[0] -= 1
+
+    threads = [threading.Thread(target=work) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert peak[0] == 2
+
+
+def test_ops_limit_slows_organize(root, write, metrics, budget):
+    write(root, {f"f{i}.txt": "" for i in range(60)})
+    budget(ops_per_s=100)
+    start = time.monotonic()
+    organize_folder(root)
+    # At least a stat and a rename per file: 120 operations, 100 of them free
+    assert time.monotonic() - start >= 0.19
+    assert metrics.counter("files_total", phase="move", op="rename") == 60
@@ -0,0 +1,80 @@
+import os
+
+from file_organizer import organize_folder, scan_folder
+
+FILES = {"a.jpg": "photo", "b.pdf": "paper", "sub/c.mp3": "song", "sub/a.jpg": "other photo",
+         "noext": "plain"}
+
+
+def undo_last(undo_log):
+    return undo_log.rollback(undo_log.committed()[-1])
+
+
+def test_move_round_trip(root, undo_log, write, snapshot):
+    write(root, FILES)
+    moved = organize_folder(root, undo_log=undo_log)
+    assert moved[os.path.join(root, "a.jpg")] == os.path.join(root, "Images", "a.jpg")
+    assert snapshot(root)[os.path.join("Images", "a_1.jpg")] == "other photo"
+    assert len(undo_last(undo_log)) == len(moved)
+    assert snapshot(root) == FILES
+    assert undo_log.committed() == []
+
+
+def test_symlink_round_trip(root, tmp_path, undo_log, write):
+    write(str(tmp_path), {"target.pdf": "paper"})
+    os.symlink(str(tmp_path / "target.pdf"), os.path.join(root, "link.pdf"))
+    organize_folder(root, undo_log=undo_log)
+    assert os.path.islink(os.path.join(root, "Docs", "link.pdf"))
+    assert list(undo_last(undo_log)) == [os.path.join(root, "Docs", "link.pdf")]
+    assert os.path.islink(os.path.join(root, "link.pdf"))
+    assert not os.path.lexists(os.path.join(root, "Docs", "link.pdf"))
+
+
+def test_replaced_file_keeps_the_batch(root, undo_log, write, snapshot):
+    write(root, {"a.txt": "mine"})
+    organize_folder(root, undo_log=undo_log)
+    moved = os.path.join(root, "Docs", "a.txt")
+    os.remove(moved)
+    write(root, {os.path.join("Docs", "a.txt"): "someone else's"})
+    assert undo_last(undo_log) == {}
+    assert snapshot(root) == {os.path.join("Docs", "a.txt"): "someone else's"}
+    assert len(undo_log.committed()) == 1
+
+
+def test_retried_move_restores_once(root, undo_log, write, snapshot):
+    from file_organizer import plan_moves, execute_plan
+    write(root, {"a.txt": "mine"})
+    plan = plan_moves(root)
+    write(root, {os.path.join("Docs", "a.txt"): "taken meanwhile"})
+    execute_plan(plan, undo_log=undo_log)
+    assert snapshot(root)[os.path.join("Docs", "a_1.txt")] == "mine"
+    undo_last(undo_log)
+    assert snapshot(root) == {"a.txt": "mine", os.path.join("Docs", "a.txt"): "taken meanwhile"}
+    assert undo_log.committed() == []
+
+
+def test_interrupted_batch(root, undo_log, write, snapshot):
+    write(root, FILES)
+    records = sorted(scan_folder(root))
+    batch = undo_log.begin(root=root)
+    os.mkdir(os.path.join(root, "Moved"))
+    # Crash after two renames and a third intent: no commit
+    for rec in records[:3]:
+        dst = os.path.join(root, "Moved", rec.name + ".x")
+        batch.intent(rec, dst)
+        if rec is not records[2]:
+            os.rename(rec.path, dst)
+    batch.close()
+    os.rename(undo_log._path(batch.id), undo_log._path(batch.id.rsplit("-", 1)[0] + "-999999999"))
+
+    assert undo_log.committed() == []
+    [batch_id] = undo_log.interrupted()
+    assert len(undo_log.rollback(batch_id)) == 2
+    assert snapshot(root) == FILES
+    assert undo_log.interrupted() == [] and undo_log.committed() == []
+
+
+def test_running_batch_is_not_interrupted(undo_log):
+    batch = undo_log.begin(root="x")
+    assert undo_log.interrupted() == []
+    batch.close()
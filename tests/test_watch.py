@@ -0,0 +1,55 @@
+import os
+import queue
+import sys
+
+import pytest
+
+from file_organizer import FolderWatcher, watch_folder
+
+pytestmark = pytest.mark.skipif(not sys.platform.startswith("linux"), reason="inotify is Linux only")
+
+
+@pytest.fixture
+def watching():
+    """``watching(watcher)`` stops the watcher when the test ends."""
+    watchers = []
+    yield watchers.append
+    for watcher in watchers:
+        watcher.stop(5)
+
+
+def test_closed_files_are_delivered_once_settled(root, write, watching):
+    batches = queue.Queue()
+    watching(FolderWatcher(root, batches.put, settle=0.05).start())
+    write(root, {"a.txt": "a", "b.txt": "b"})
+    os.mkdir(os.path.join(root, "sub"))  # folders are not files
+    paths = batches.get(timeout=5)
+    assert sorted(paths) == [os.path.join(root, "a.txt"), os.path.join(root, "b.txt")]
+
+
+def test_recursive_watch_finds_new_folders(root, write, watching):
+    batches = queue.Queue()
+    watching(FolderWatcher(root, batches.put, settle=0.2, recursive=True).start())
+    write(root, {"new/deep/a.txt": "a"})
+    found = set()
+    while os.path.join(root, "new", "deep", "a.txt") not in found:
+        found.update(batches.get(timeout=5))
+
+
+def test_watch_folder_organizes_arrivals(root, undo_log, write, snapshot, watching):
+    moved = queue.Queue()
+    watching(watch_folder(root, undo_log=undo_log, on_moved=moved.put, settle=0.05))
+    write(root, {"a.txt": "a"})
+    assert moved.get(timeout=5) == {os.path.join(root, "a.txt"): os.path.join(root, "Docs", "a.txt")}
+    undo_log.rollback(undo_log.committed()[-1])
+    assert snapshot(root) == {"a.txt": "a"}
+
+
+def test_partial_downloads_wait_for_their_final_name(root, write, watching):
+    moved = queue.Queue()
+    watching(watch_folder(root, on_moved=moved.put, settle=0.05))
+    write(root, {"paper.pdf.crdownload": "half"})
+    with pytest.raises(queue.Empty):
+        moved.get(timeout=0.5)
+    os.rename(os.path.join(root, "paper.pdf.crdownload"), os.path.join(root, "paper.pdf"))
+    assert moved.get(timeout=5) == {os.path.join(root, "paper.pdf"): os.path.join(root, "Docs", "paper.pdf")}